@@ -1,5 +1,10 @@
-import sys, os, json, re
-from PyQt5.QtCore import QSize, Qt, QRegularExpression
+import sys, os, re
+
+# Started before anything else is imported, so the import timings are complete
+from startup_profile import PROFILE_FILE, profile
+profile.start()
+
+from PyQt5.QtCore import QSize, Qt, QRegularExpression, QFileSystemWatcher, QTimer, pyqtSignal
 from PyQt5.QtGui import QIcon, QIntValidator, QRegularExpressionValidator
 from PyQt5.QtWidgets import (
     QApplication, 
@@ -19,7 +24,12 @@ from PyQt5.QtWidgets import (
     QScrollArea
 )
 
-from cpu_memory_utilization_config_final import CpuMemoryConfig
+from console_widget import ConsoleWidget
+from config_service import ConfigService
+from kpi_engine import Bench, EcuTarget, configured_report_name, save_bench_config
+from kpi_engine_qt import QtKpiEngine
+from result_cache import ResultCache, describe_hit
+from stall_watchdog import StallOverlay, StallWatchdog, watchdog_threshold
 
 common_groupbox_style = """
 QGroupBox {
@@ -41,6 +51,15 @@ common_enabled_style_green = "QPushButton:enabled {background-color: #60A917; bo
 common_enabled_style_red = "QPushButton:enabled {background-color: red; border: 1.5px solid #0078D7;}"
 common_hover_style = "QPushButton:enabled:hover {background-color: #DAE8FC; border: 0.5px solid #0078D7;}"
 
+# Status label colors, matching the legend in the Test Status group
+status_not_tested_style = "background-color: #D0CEE2;"
+status_in_progress_style = "background-color: #FFFF88;"
+status_pass_style = "background-color: #60A917;"
+status_fail_style = "background-color: red;"
+
+# Handlers timed by the stall watchdog when it is switched on
+watchdog_slots = ['update_checkbox_states', 'update_button_states', 'check_KPIs_config', 'toggle_buttons']
+
 # Create a regular expression pattern for IP address validation
 ip_address_pattern = r"^((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$"
 
@@ -49,6 +68,9 @@ ip_address_validator = QRegularExpressionValidator(QRegularExpression(ip_address
 
 
 class MainWindow(QMainWindow):
+    # Emitted from the relay's I/O thread with each finished RelaySwitch
+    relay_switched = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
 
@@ -60,12 +82,52 @@ class MainWindow(QMainWindow):
         self.tab1 = QWidget()
         self.tab2 = QWidget()
         self.tab3 = QWidget()
+        self.tab4 = QWidget()
 
         self.tab_widget.addTab(self.tab1, "Tester")
         self.tab_widget.addTab(self.tab2, "Console")
+        self.tab_widget.addTab(self.tab4, "Live Chart")
         self.tab_widget.addTab(self.tab3, "About")
 
-        self.create_tester_tab()       
+        # KPI label -> (checkbox, status_label), filled in by create_kpi_row
+        self.kpi_rows = {}
+
+        # KPI label -> edit button, to recolour it when its configuration changes
+        self.kpi_edit_buttons = {}
+
+        # KPI label -> {ECU name: state text} for the status label tooltips
+        self.kpi_ecu_states = {}
+
+        # Tabs built the first time they are shown (or needed), see build_lazy_tab
+        self.utilization_chart = None
+        self.lazy_tabs = {self.tab4: self.create_chart_tab}
+        self.tab_widget.currentChanged.connect(self.build_lazy_tab)
+
+        # Relay driver of the IG buttons, opened on first use; a KPI run opens its own
+        self.relay = None
+        self.relay_switched.connect(self.on_relay_switched)
+
+        # Opt-in, see stall_watchdog.py; the slots are wrapped before any widget connects them
+        self.stall_watchdog = None
+        threshold = watchdog_threshold()
+        if threshold is not None:
+            self.stall_watchdog = StallWatchdog(threshold, parent=self)
+            self.stall_watchdog.slot_timings.instrument(self, watchdog_slots)
+
+        with profile.phase('create_config_service'):
+            self.create_config_service()
+
+        with profile.phase('create_console_tab'):
+            self.create_console_tab()
+
+        with profile.phase('create_tester_tab'):
+            self.create_tester_tab()       
+
+        with profile.phase('create_kpi_engine'):
+            self.create_kpi_engine()
+
+        if self.stall_watchdog is not None:
+            self.start_stall_watchdog()
 
 
     def set_window_properties(self):
@@ -97,10 +159,118 @@ class MainWindow(QMainWindow):
         self.setWindowFlags(self.windowFlags() & ~Qt.WindowMaximizeButtonHint)   
     
 
+    def create_console_tab(self):
+        self.console = ConsoleWidget()
+
+        tab2_layout = QVBoxLayout()
+        tab2_layout.addWidget(self.console)
+        self.tab2.setLayout(tab2_layout)
+
+
+    def build_lazy_tab(self, index):
+        self.ensure_tab(self.tab_widget.widget(index))
+
+
+    def ensure_tab(self, tab):
+        builder = self.lazy_tabs.pop(tab, None)
+        if builder is not None:
+            with profile.phase(builder.__name__):
+                builder()
+
+
+    def create_chart_tab(self):
+        # numpy and the chart code are only loaded once the chart is needed
+        from utilization_chart import UtilizationChart
+
+        self.utilization_chart = UtilizationChart()
+
+        tab4_layout = QVBoxLayout()
+        tab4_layout.addWidget(self.utilization_chart)
+        self.tab4.setLayout(tab4_layout)
+
+
+    def on_samples(self, label, ecu_name, rows):
+        # Called from the KPI worker threads
+        if label == "CPU and Memory Utilization" and self.utilization_chart is not None:
+            self.utilization_chart.add_samples(ecu_name, rows)
+
+
+    def start_stall_watchdog(self):
+        self.stall_overlay = StallOverlay(self.console.log_view)
+        self.stall_watchdog.stall_detected.connect(self.on_stall_detected)
+        self.stall_watchdog.start()
+        self.log(f"Stall watchdog on, stalls over {self.stall_watchdog.threshold * 1000:.0f} ms are traced to "
+                 f"{self.stall_watchdog.trace_file}")
+
+
+    def on_stall_detected(self, report):
+        self.stall_overlay.show_stall(report, self.stall_watchdog.stall_count, self.stall_watchdog.worst,
+                                      self.stall_watchdog.trace_file)
+
+
+    def log(self, message, ecu='', kpi=''):
+        # Safe to call from any thread, the console batches the inserts
+        self.console.append(message, ecu, kpi)
+
+
+    def create_config_service(self):
+        # KPI configurations are parsed once and re-read only when a file changes
+        self.config_service = ConfigService()
+
+        self.config_watcher = QFileSystemWatcher(self)
+        self.config_watcher.fileChanged.connect(self.on_config_file_changed)
+        self.config_watcher.directoryChanged.connect(self.on_config_file_changed)
+        self.config_watcher.addPath(os.path.abspath(self.config_service.directory))
+        self.watch_config_files()
+
+
+    def watch_config_files(self):
+        # Editors that save by replacing the file drop it from the watcher, and a
+        # file created later has to be added, so the list is refreshed on every change
+        paths = [os.path.abspath(path) for path in self.config_service.paths().values() if os.path.exists(path)]
+        missing = set(paths) - set(self.config_watcher.files())
+        if missing:
+            self.config_watcher.addPaths(sorted(missing))
+
+
+    def on_config_file_changed(self, path):
+        self.watch_config_files()
+
+        for label in self.config_service.paths():
+            if self.config_service.reload_if_changed(label):
+                self.log(f"Configuration reloaded, {'complete' if self.config_service.is_valid(label) else 'incomplete'}", kpi=label)
+                checkbox, status_label = self.kpi_rows.get(label, (None, None))
+                if checkbox is not None and checkbox.isChecked():
+                    self.check_KPIs_config(label, self.kpi_edit_buttons[label])
+
+
+    def create_kpi_engine(self):
+        self.kpi_engine = QtKpiEngine(self, log_sink=self.log, sample_sink=self.on_samples, config_service=self.config_service,
+                                      result_cache=ResultCache())
+        self.kpi_engine.kpi_started.connect(self.on_kpi_started)
+        self.kpi_engine.kpi_progress.connect(self.on_kpi_progress)
+        self.kpi_engine.ecu_finished.connect(self.on_ecu_finished)
+        self.kpi_engine.kpi_finished.connect(self.on_kpi_finished)
+        self.kpi_engine.run_finished.connect(self.on_run_finished)
+        self.kpi_engine.ignition_switched.connect(self.show_ignition_state)
+        self.kpi_engine.cached_results_found.connect(self.on_cached_results_found)
+
+
+    def closeEvent(self, event):
+        if self.kpi_engine.is_running():
+            self.kpi_engine.stop()
+            self.kpi_engine.wait(5)
+        self.close_relay()
+        if self.stall_watchdog is not None:
+            self.stall_watchdog.stop()
+        super().closeEvent(event)
+
+
     def create_tester_tab(self):
         layout = QVBoxLayout()
 
-        layout.addWidget(self.create_kpis_group())
+        self.kpis_group = self.create_kpis_group()
+        layout.addWidget(self.kpis_group)
         
         background_colors = ["#D0CEE2", "#FFFF88", "#60A917", "red"]
         label_names = ["Not Tested", "In Progress", "PASS / Configuration Done", "FAIL / Configuration Not Done"]
@@ -220,7 +390,7 @@ class MainWindow(QMainWindow):
 
         status_label = QLabel()
         status_label.setFixedSize(25, 25)
-        status_label.setStyleSheet("background-color: #D0CEE2;")
+        status_label.setStyleSheet(status_not_tested_style)
 
         row_layout.addWidget(status_label)
 
@@ -252,6 +422,9 @@ class MainWindow(QMainWindow):
         if checkbox_list is not None:
             checkbox_list.append(checkbox)
 
+        self.kpi_rows[label] = (checkbox, status_label)
+        self.kpi_edit_buttons[label] = edit_button
+
         return row_widget   
     
 
@@ -739,6 +912,7 @@ class MainWindow(QMainWindow):
         self.run_button.setFixedSize(250, 50)
         self.run_button.setStyleSheet("QPushButton:enabled {font-size: 25px;} " + common_enabled_style + common_hover_style)
         self.run_button.setEnabled(True)
+        self.run_button.clicked.connect(self.run_KPIs)
 
         run_button_layout.addStretch()
         run_button_layout.addWidget(self.run_button)
@@ -746,10 +920,160 @@ class MainWindow(QMainWindow):
         return run_button_layout
 
 
+    def run_KPIs(self):
+        if self.kpi_engine.is_running():
+            self.log("Stopping KPI run")
+            self.run_button.setEnabled(False)
+            self.kpi_engine.stop()
+            return
+
+        selected_KPIs = [label for label, (checkbox, status_label) in self.kpi_rows.items() if checkbox.isChecked()]
+
+        if not selected_KPIs:
+            QMessageBox.warning(self, "No KPI Selected", "Select at least one KPI to run.")
+            return
+
+        if not self.configuration_section_input_fields():
+            QMessageBox.warning(self, "Configuration Not Done", "Select the ECUs and fill in all the configuration fields before running.")
+            return
+
+        incomplete = [label for label in selected_KPIs
+                      if self.config_service.has_config(label) and not self.config_service.is_valid(label)]
+        if incomplete:
+            QMessageBox.warning(self, "Configuration Not Done", "Complete the configuration of: " + ", ".join(incomplete))
+            return
+
+        selected_ECUs = self.selected_ECUs()
+        bench = Bench("Bench", selected_ECUs, self.relay_port_input.text(), self.relay_baudrate_input.text())
+
+        for label in selected_KPIs:
+            checkbox, status_label = self.kpi_rows[label]
+            status_label.setStyleSheet(status_not_tested_style)
+            self.kpi_ecu_states[label] = {ecu.name: "Waiting" for ecu in selected_ECUs}
+
+        # The same selection can then be rerun headless with kpi_runner.py
+        try:
+            save_bench_config(selected_KPIs, bench)
+        except OSError as e:
+            self.log(f"Bench configuration could not be saved: {e}")
+
+        # The engine opens the relay port itself for the KPIs that switch the ignition
+        self.close_relay()
+
+        self.kpis_group.setEnabled(False)
+        self.run_button.setText('STOP')
+
+        self.log(f"Running KPIs: {', '.join(selected_KPIs)} on {', '.join(ecu.name for ecu in selected_ECUs)}")
+        self.kpi_engine.start(selected_KPIs, selected_ECUs, self.test_report_name(), bench)
+
+
+    def test_report_name(self):
+        # The report name is entered in the CPU and Memory Utilization configuration
+        return configured_report_name(self.config_service)
+
+
+    def selected_ECUs(self):
+        ecus = []
+
+        if self.padas_checkbox.isChecked() or self.RCar_checkbox.isChecked():
+            ecus.append(EcuTarget(
+                self.padas_checkbox.text() if self.padas_checkbox.isChecked() else self.RCar_checkbox.text(),
+                self.Rcar_IP_input.text(),
+                self.Rcar_telnet_username_input.text(),
+                self.Rcar_telnet_password_input.text(),
+                self.Rcar_FTP_username_input.text(),
+                self.Rcar_FTP_password_input.text()
+            ))
+
+        if self.SoC0_checkbox.isChecked():
+            ecus.append(EcuTarget(
+                self.SoC0_checkbox.text(),
+                self.SoC0_IP_input.text(),
+                self.SoC0_telnet_username_input.text(),
+                self.SoC0_telnet_password_input.text(),
+                self.SoC0_FTP_username_input.text(),
+                self.SoC0_FTP_password_input.text()
+            ))
+
+        if self.SoC1_checkbox.isChecked():
+            ecus.append(EcuTarget(
+                self.SoC1_checkbox.text(),
+                self.SoC1_IP_input.text(),
+                self.SoC1_telnet_username_input.text(),
+                self.SoC1_telnet_password_input.text(),
+                self.SoC1_FTP_username_input.text(),
+                self.SoC1_FTP_password_input.text()
+            ))
+
+        return ecus
+
+
+    def update_kpi_tooltip(self, label, title):
+        checkbox, status_label = self.kpi_rows[label]
+        ecu_states = self.kpi_ecu_states.get(label, {})
+        status_label.setToolTip("\n".join([title] + [f"{name}: {state}" for name, state in ecu_states.items()]))
+
+
+    def on_kpi_started(self, label):
+        if label == "CPU and Memory Utilization":
+            self.ensure_tab(self.tab4)
+            self.utilization_chart.reset_from_config(list(self.kpi_ecu_states.get(label, {})), self.config_service.get(label))
+
+        checkbox, status_label = self.kpi_rows[label]
+        status_label.setStyleSheet(status_in_progress_style)
+        self.update_kpi_tooltip(label, "In Progress")
+
+
+    def on_cached_results_found(self, hits, question):
+        # Asked at the start of a run, once the firmware of every ECU is known
+        listed = [describe_hit(hit) for hit in hits[:15]]
+        if len(hits) > len(listed):
+            listed.append(f"... and {len(hits) - len(listed)} more")
+        reply = QMessageBox.question(
+            self, "Cached Results",
+            f"{len(hits)} KPI results were found from earlier runs with the same configuration and firmware:\n\n"
+            + "\n".join(listed) + "\n\nReuse them instead of running these KPIs again?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        reuse = reply == QMessageBox.Yes
+        self.log(f"{'Reusing' if reuse else 'Not reusing'} {len(hits)} cached KPI results")
+        question.answer(reuse)
+
+
+    def on_kpi_progress(self, label, ecu_name, percent):
+        self.kpi_ecu_states.setdefault(label, {})[ecu_name] = f"{percent}%"
+        self.update_kpi_tooltip(label, "In Progress")
+
+
+    def on_ecu_finished(self, label, ecu_name, result):
+        self.kpi_ecu_states.setdefault(label, {})[ecu_name] = {True: "PASS", False: "FAIL"}.get(result, "Not Tested")
+        self.update_kpi_tooltip(label, "In Progress")
+
+
+    def on_kpi_finished(self, label, result):
+        checkbox, status_label = self.kpi_rows[label]
+
+        if result is True:
+            status_label.setStyleSheet(status_pass_style)
+            self.update_kpi_tooltip(label, "PASS")
+        elif result is False:
+            status_label.setStyleSheet(status_fail_style)
+            self.update_kpi_tooltip(label, "FAIL")
+        else:
+            status_label.setStyleSheet(status_not_tested_style)
+            self.update_kpi_tooltip(label, "Not Tested")
+
+
+    def on_run_finished(self):
+        self.log("KPI run finished")
+        self.kpis_group.setEnabled(True)
+        self.run_button.setText('RUN')
+        self.run_button.setEnabled(True)
+
+
     def toggle_buttons(self, state, status_label, label, current_checkbox, checkbox_list, edit_button, folder_button):
         enabled = state == Qt.Checked
 
-        print(f"{label} is {enabled}")
+        self.log(f"{label} is {enabled}", kpi=label)
 
         edit_button.setEnabled(enabled)
         folder_button.setEnabled(enabled)
@@ -774,31 +1098,20 @@ class MainWindow(QMainWindow):
 
 
     def check_KPIs_config(self, label, edit_button):
-        if label == "CPU and Memory Utilization":
-            try:
-                with open('cpu_memory_utilization_config.json', 'r') as f:
-                    data = json.load(f)
-
-                if (data['cpu_usage'] and 
-                    data['memory_usage'] and 
-                    all(data['cpu_usage_list']) and 
-                    data['script_exec_time'] and 
-                    data['initial_logging_delay'] and 
-                    data['test_report_name']):
-                    edit_button.setStyleSheet(common_enabled_style_green + common_hover_style)
-                else:
-                    edit_button.setStyleSheet(common_enabled_style_red + common_hover_style)
-            except FileNotFoundError:
-                edit_button.setStyleSheet(common_enabled_style_red + common_hover_style)
-        else:     
+        # Validation is done by the config service when a file is (re)loaded
+        if self.config_service.is_valid(label):
+            edit_button.setStyleSheet(common_enabled_style_green + common_hover_style)
+        else:
             edit_button.setStyleSheet(common_enabled_style_red + common_hover_style)
 
 
     def on_button_click(self, label, edit_button):
-        print(f"{label} edit button is clicked")
+        self.log(f"{label} edit button is clicked", kpi=label)
         
         try:
             if label == "CPU and Memory Utilization":
+                from cpu_memory_utilization_config_final import CpuMemoryConfig
+
                 self.setEnabled(False)
 
                 cpu_mem = CpuMemoryConfig(self)
@@ -808,8 +1121,19 @@ class MainWindow(QMainWindow):
 
                 self.setEnabled(True)  # Enable the main window after the modal dialog closes
                 self.check_KPIs_config(label, edit_button)
+            elif self.config_service.has_config(label):
+                from kpi_config_dialog import KpiConfigDialog
+
+                self.setEnabled(False)
+
+                config_dialog = KpiConfigDialog(self, label)
+                config_dialog.setModal(True)
+                config_dialog.exec_()
+
+                self.setEnabled(True)
+                self.check_KPIs_config(label, edit_button)
         except Exception as e:
-            print(f"Error: {e}")
+            self.log(f"Error: {e}", kpi=label)
 
     
     def open_file_manager(self, path):
@@ -910,7 +1234,7 @@ class MainWindow(QMainWindow):
 
     def update_button_states(self):    
         if self.configuration_section_input_fields():
-            print("all fields configured")
+            self.log("all fields configured")
             self.IG_OFF_button.setEnabled(True)        
             self.IG_ON_button.setEnabled(True) 
             # self.run_button.setEnabled(False)
@@ -967,18 +1291,64 @@ class MainWindow(QMainWindow):
 
 
     def IG_ON_Off(self):
-        sender = self.sender()
-        if sender == self.IG_ON_button:
-            # Code to be executed when IG ON button is clicked
-            print("IG ON button clicked")
-        elif sender == self.IG_OFF_button:
-            # Code to be executed when IG OFF button is clicked
-            print("IG OFF button clicked")
+        if self.kpi_engine.is_running():
+            self.log("The ignition is switched by the running KPIs")
+            return
+
+        from relay_driver import DEFAULT_BAUDRATE, RelayDriver
+
+        port = self.relay_port_input.text().strip()
+        baudrate = int(self.relay_baudrate_input.text() or DEFAULT_BAUDRATE)
+        if self.relay is not None and (self.relay.port, self.relay.baudrate) != (port, baudrate):
+            self.close_relay()
+        if self.relay is None:
+            self.relay = RelayDriver(port, baudrate, on_edge=self.relay_switched.emit)
+
+        # Queued to the relay's own thread, the click returns at once
+        self.relay.submit(self.sender() == self.IG_ON_button)
+
+
+    def on_relay_switched(self, switch):
+        state = 'ON' if switch.on else 'OFF'
+        if switch.error is not None:
+            self.log(f"IG {state} failed: {switch.error}")
+            return
+        self.log(f"IG {state}")
+        self.show_ignition_state(switch.on, switch.edge)
+
+
+    def show_ignition_state(self, on, edge=None):
+        self.IG_ON_button.setStyleSheet((common_enabled_style_green if on else common_enabled_style) + common_hover_style)
+        self.IG_OFF_button.setStyleSheet((common_enabled_style if on else common_enabled_style_red) + common_hover_style)
+
+
+    def close_relay(self):
+        if self.relay is not None:
+            self.relay.close()
+            self.relay = None
+
+
+    def startup_finished(self):
+        # First pass of the event loop: the window is up and can take input
+        profile.mark('event_loop')
+        try:
+            total = profile.write()
+            self.log(f"Started in {total:.2f} sec, startup profile written to {os.path.abspath(PROFILE_FILE)}")
+        except OSError as e:
+            self.log(f"Startup profile could not be written: {e}")
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    profile.mark('imports')
+
+    with profile.phase('QApplication'):
+        app = QApplication(sys.argv)
+
+    with profile.phase('MainWindow'):
+        main_window = MainWindow()
+
+    with profile.phase('show'):
+        main_window.show()
 
-    main_window = MainWindow()
-    main_window.show()
+    QTimer.singleShot(0, main_window.startup_finished)
     sys.exit(app.exec_())
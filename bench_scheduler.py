@@ -0,0 +1,305 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from kpi_engine import (
+    BENCH_EXCLUSIVE_KPIS,
+    KPI_MODULES,
+    RESULTS_DIRECTORY,
+    KpiEngine,
+    KpiEngineListener,
+    bench_from_dict,
+    bench_to_dict,
+    combine_results,
+    configured_report_name,
+    load_bench_config,
+    safe_file_name
+)
+from kpi_runner import EXIT_FAIL, EXIT_NOT_EVALUATED, EXIT_PASS, EXIT_STOPPED, EXIT_USAGE
+from result_cache import CACHE_MODES, CACHE_OFF, CACHE_REUSE, CACHE_STORE, ResultCache
+
+
+# Fans a test plan out over many benches, e.g.
+#   python bench_scheduler.py lab_plan.json --workers 16
+#
+# lab_plan.json:
+#   {
+#       "kpis": ["CPU and Memory Utilization"],
+#       "benches": [
+#           {"name": "Bench 01", "relay_port": "COM4", "relay_baudrate": "9600",
+#            "max_concurrent": 2, "ecus": [{"name": "SoC0", "ip": "...", ...}]},
+#           {"bench_config": "bench02/bench_config.json", "name": "Bench 02"}
+#       ]
+#   }
+#
+# Every (bench, KPI) pair is one job in a single shared queue. Jobs run in a
+# process pool, each in its own KpiEngine, and a bench never has more than
+# max_concurrent jobs in flight. KPIs in BENCH_EXCLUSIVE_KPIS get their bench to
+# themselves. Jobs of one bench start in plan order.
+
+PLAN_SUMMARY_FILE = 'plan_summary.json'
+
+# Last log lines kept with each job result, shown when a job fails
+LOG_TAIL_LINES = 20
+
+
+class JobListener(KpiEngineListener):
+    # Runs inside the worker process: the full log goes to a file in the job's
+    # results directory, only the tail travels back with the result
+    def __init__(self, log_path, reuse_cached=False):
+        self.reuse_cached = reuse_cached
+        self.log_file = open(log_path, 'a', encoding='utf-8')
+        self.tail = deque(maxlen=LOG_TAIL_LINES)
+        self.ecu_results = {}
+        self.lock = threading.Lock()
+
+    def on_kpi_log(self, label, ecu_name, message):
+        line = f"{time.strftime('%H:%M:%S')} [{ecu_name or '-'}] {message}"
+        with self.lock:
+            self.log_file.write(line + '\n')
+            self.tail.append(line)
+
+    def on_ecu_finished(self, label, ecu_name, result):
+        self.ecu_results[ecu_name] = result
+
+    def on_cached_results(self, hits):
+        return self.reuse_cached
+
+    def close(self):
+        self.log_file.close()
+
+
+def run_job(bench_data, label, config_dir, results_directory, report_name=None, cache=CACHE_STORE):
+    # Process pool entry point, so it takes and returns plain data only
+    from config_service import ConfigService
+
+    bench = bench_from_dict(bench_data)
+    os.makedirs(results_directory, exist_ok=True)
+    listener = JobListener(os.path.join(results_directory, 'kpi.log'), cache == CACHE_REUSE)
+    config_service = ConfigService(config_dir)
+    # One cache shared by all worker processes, see result_cache.py
+    engine = KpiEngine(listener, config_service, results_directory, ResultCache() if cache != CACHE_OFF else None)
+
+    # Ctrl+C reaches the whole process group; stop the KPI instead of dying mid-write
+    signal.signal(signal.SIGINT, lambda signal_number, frame: engine.stop())
+
+    started = time.time()
+    error = None
+    try:
+        engine.run([label], bench.ecus, configured_report_name(config_service, report_name), bench)
+    except Exception as e:
+        error = f"{e}\n{traceback.format_exc()}"
+    finally:
+        listener.close()
+
+    ecu_results = dict(listener.ecu_results)
+    return {
+        'bench': bench.name,
+        'kpi': label,
+        'result': False if error else combine_results(list(ecu_results.values())),
+        'ecu_results': ecu_results,
+        'stopped': engine.stop_event.is_set(),
+        'started': started,
+        'duration': time.time() - started,
+        'results_directory': engine.run_directory,
+        'log_tail': list(listener.tail),
+        'error': error
+    }
+
+
+class BenchScheduler:
+    def __init__(self, benches, labels, workers=None, config_dir='.', results_directory=RESULTS_DIRECTORY,
+                 report_name=None, on_result=None, cache=CACHE_STORE):
+        # benches: list of (Bench, max_concurrent)
+        self.benches = benches
+        self.labels = list(labels)
+        self.workers = workers or max(1, sum(limit for _, limit in benches))
+        self.config_dir = config_dir
+        self.plan_directory = os.path.join(results_directory, 'plan_' + time.strftime('%Y%m%d_%H%M%S'))
+        self.report_name = report_name
+        self.cache = cache
+        self.on_result = on_result
+        self.stop_event = threading.Event()
+        self.results = []
+
+    def stop(self):
+        # Jobs not yet started are dropped, running ones are stopped by their own handler
+        self.stop_event.set()
+
+    def run(self):
+        limits = {bench.name: limit for bench, limit in self.benches}
+        pending = deque((bench, label, number) for number, label in enumerate(self.labels, start=1)
+                        for bench, _ in self.benches)
+        in_flight = Counter()
+        exclusive = set()
+        running = {}
+
+        # spawn behaves the same on the Windows bench PCs and on Linux servers
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            while running or (pending and not self.stop_event.is_set()):
+                if self.stop_event.is_set():
+                    pending.clear()
+
+                # One pass over the queue; once a job of a bench has to wait, the
+                # later jobs of that bench wait too so an exclusive KPI is not starved
+                blocked = set()
+                for job in list(pending):
+                    if len(running) >= self.workers:
+                        break
+                    bench, label, number = job
+                    if bench.name in blocked:
+                        continue
+                    if (bench.name in exclusive or in_flight[bench.name] >= limits[bench.name]
+                            or (label in BENCH_EXCLUSIVE_KPIS and in_flight[bench.name] > 0)):
+                        blocked.add(bench.name)
+                        continue
+
+                    pending.remove(job)
+                    in_flight[bench.name] += 1
+                    if label in BENCH_EXCLUSIVE_KPIS:
+                        exclusive.add(bench.name)
+                    # Numbered, as a plan may run the same KPI more than once
+                    directory = os.path.join(self.plan_directory, safe_file_name(bench.name),
+                                             f"{number:02d}_{safe_file_name(label)}")
+                    future = pool.submit(run_job, bench_to_dict(bench), label, self.config_dir, directory, self.report_name,
+                                         self.cache)
+                    running[future] = job
+
+                if not running:
+                    break
+
+                # Wake up now and then so a stop request is seen without a job finishing
+                done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    bench, label, _ = running.pop(future)
+                    in_flight[bench.name] -= 1
+                    exclusive.discard(bench.name)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'bench': bench.name, 'kpi': label, 'result': False, 'ecu_results': {},
+                                  'stopped': False, 'started': None, 'duration': None,
+                                  'results_directory': None, 'log_tail': [], 'error': f"Worker failed: {e}"}
+                    self.results.append(result)
+                    if self.on_result is not None:
+                        self.on_result(result)
+
+        return aggregate(self.results, self.labels, [bench.name for bench, _ in self.benches])
+
+    def write_summary(self, summary):
+        os.makedirs(self.plan_directory, exist_ok=True)
+        path = os.path.join(self.plan_directory, PLAN_SUMMARY_FILE)
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=4)
+        return path
+
+
+def aggregate(results, labels, bench_names):
+    # Verdicts per KPI across benches, per bench across KPIs, and overall
+    def counts(subset):
+        verdicts = Counter(result_text(result['result']) for result in subset)
+        return {'PASS': verdicts['PASS'], 'FAIL': verdicts['FAIL'], 'Not Tested': verdicts['Not Tested']}
+
+    by_kpi = {label: [result for result in results if result['kpi'] == label] for label in labels}
+    by_bench = {name: [result for result in results if result['bench'] == name] for name in bench_names}
+
+    return {
+        'result': result_text(combine_results([result['result'] for result in results])),
+        'jobs': len(results),
+        'kpis': {label: dict(counts(subset), result=result_text(combine_results([r['result'] for r in subset])))
+                 for label, subset in by_kpi.items()},
+        'benches': {name: dict(counts(subset), result=result_text(combine_results([r['result'] for r in subset])))
+                    for name, subset in by_bench.items()},
+        'details': sorted(results, key=lambda result: (result['bench'], result['kpi']))
+    }
+
+
+def result_text(result):
+    return {True: "PASS", False: "FAIL"}.get(result, "Not Tested")
+
+
+def load_plan(path):
+    # Returns (KPI labels, [(Bench, max_concurrent)])
+    with open(path, 'r') as f:
+        plan = json.load(f)
+
+    base_directory = os.path.dirname(os.path.abspath(path))
+    benches = []
+    for number, entry in enumerate(plan.get('benches', []), start=1):
+        if 'bench_config' in entry:
+            # A bench_config.json saved by the GUI on that bench
+            _, bench = load_bench_config(os.path.join(base_directory, entry['bench_config']))
+            data = bench_to_dict(bench)
+            data.update({key: value for key, value in entry.items() if key in ('name', 'relay_port', 'relay_baudrate')})
+        else:
+            data = entry
+        bench = bench_from_dict(data, default_name=f"Bench {number:02d}")
+        benches.append((bench, max(1, int(entry.get('max_concurrent', 1)))))
+
+    names = [bench.name for bench, _ in benches]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Bench names must be unique: {', '.join(duplicates)}")
+
+    return list(plan.get('kpis', [])), benches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a KPI test plan on many benches in parallel.")
+    parser.add_argument('plan', help="JSON file with the KPIs and bench definitions")
+    parser.add_argument('--kpi', action='append', dest='kpis', metavar='LABEL', help="Override the plan's KPIs, may be repeated")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: sum of the bench limits)")
+    parser.add_argument('--config-dir', default='.', help="Directory holding the KPI configuration files")
+    parser.add_argument('--report-name', help="Excel report file name of every job")
+    parser.add_argument('--cache', choices=CACHE_MODES, default=CACHE_STORE,
+                        help="Result cache use: off, store results (default), or also reuse results cached for "
+                             "unchanged configurations and firmware")
+    arguments = parser.parse_args(argv)
+
+    try:
+        plan_kpis, benches = load_plan(arguments.plan)
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        print(f"Cannot read plan {arguments.plan}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    labels = arguments.kpis or plan_kpis
+    unknown = [label for label in labels if label not in KPI_MODULES]
+    if unknown or not labels or not benches:
+        print(f"Nothing to run or unknown KPI: {', '.join(unknown)}", file=sys.stderr)
+        return EXIT_USAGE
+
+    def on_result(result):
+        print(f"{time.strftime('%H:%M:%S')} [{result['bench']}] [{result['kpi']}] {result_text(result['result'])}"
+              + (f" ({result['duration']:.0f} s)" if result['duration'] is not None else ""), flush=True)
+        if result['result'] is False:
+            for line in ([result['error']] if result['error'] else []) + result['log_tail']:
+                print(f"    {line}")
+
+    scheduler = BenchScheduler(benches, labels, arguments.workers, arguments.config_dir,
+                               report_name=arguments.report_name, on_result=on_result, cache=arguments.cache)
+    signal.signal(signal.SIGINT, lambda signal_number, frame: scheduler.stop())
+
+    print(f"{len(labels) * len(benches)} jobs on {len(benches)} benches, {scheduler.workers} workers", flush=True)
+    summary = scheduler.run()
+    path = scheduler.write_summary(summary)
+
+    for label, counts in summary['kpis'].items():
+        print(f"{label}: {counts['result']} ({counts['PASS']} pass, {counts['FAIL']} fail, {counts['Not Tested']} not tested)")
+    print(f"Overall: {summary['result']}, summary written to {path}")
+
+    if scheduler.stop_event.is_set():
+        return EXIT_STOPPED
+    return {"PASS": EXIT_PASS, "FAIL": EXIT_FAIL}.get(summary['result'], EXIT_NOT_EVALUATED)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import argparse
+import hashlib
+import mmap
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+# Chunks are whole multiples of this, the block size dd reads with on the target
+CHUNK_BLOCK = 1 << 20
+
+# Reference image -> Future of its chunk digests, so that the ECU workers of a
+# run verifying against the same image hash it once between them
+reference_cache = {}
+reference_lock = threading.Lock()
+MAX_CACHED_REFERENCES = 64
+
+
+class HashingStopped(Exception):
+    pass
+
+
+def chunk_ranges(size, chunk_size):
+    return [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+
+
+def hash_chunks(paths, chunk_size, workers=None, stopped=None):
+    # {path: [sha256 hex digest of every chunk]}. The chunks of all files go
+    # into one pool; each is hashed straight from a memory-mapped view, and
+    # hashlib releases the GIL while it hashes, so the threads use every core
+    # and the files are read at disk speed without copying them into Python.
+    # stopped() is checked before every chunk; HashingStopped once it is true.
+    files = []
+    maps = []
+    try:
+        tasks = []
+        for path in paths:
+            f = open(path, 'rb')
+            files.append(f)
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                # mmap cannot map an empty file, and it has no chunks anyway
+                continue
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            maps.append(mapped)
+            tasks.extend((path, mapped, offset, length) for offset, length in chunk_ranges(size, chunk_size))
+
+        def digest(task):
+            path, mapped, offset, length = task
+            if stopped is not None and stopped():
+                raise HashingStopped()
+            if hasattr(mapped, 'madvise') and offset % mmap.PAGESIZE == 0:
+                # Read ahead the whole chunk instead of faulting it in page by page
+                mapped.madvise(mmap.MADV_WILLNEED, offset, length)
+            with memoryview(mapped) as view, view[offset:offset + length] as chunk:
+                return hashlib.sha256(chunk).hexdigest()
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix="ChunkHash") as executor:
+            digests = list(executor.map(digest, tasks))
+    finally:
+        for mapped in maps:
+            mapped.close()
+        for f in files:
+            f.close()
+
+    hashes = {path: [] for path in paths}
+    for (path, _, _, _), value in zip(tasks, digests):
+        hashes[path].append(value)
+    return hashes
+
+
+def reference_key(path, chunk_size):
+    # A reference rewritten in place gets a new key
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, chunk_size)
+
+
+def reference_hashes(paths, chunk_size, workers=None, stopped=None):
+    # hash_chunks() for reference images, shared between threads and runs:
+    # an image already hashed or being hashed by another worker is waited for
+    keys = {path: reference_key(path, chunk_size) for path in paths}
+    own = []
+    with reference_lock:
+        for path, key in keys.items():
+            if key not in reference_cache:
+                reference_cache[key] = Future()
+                own.append(path)
+        while len(reference_cache) > MAX_CACHED_REFERENCES:
+            del reference_cache[next(iter(reference_cache))]
+        futures = {path: reference_cache[key] for path, key in keys.items()}
+
+    if own:
+        try:
+            hashes = hash_chunks(own, chunk_size, workers, stopped)
+        except BaseException as e:
+            with reference_lock:
+                for path in own:
+                    reference_cache.pop(keys[path], None)
+            for path in own:
+                futures[path].set_exception(e)
+            raise
+        for path in own:
+            futures[path].set_result(hashes[path])
+
+    return {path: future.result() for path, future in futures.items()}
+
+
+def hashing_rate(total_bytes, seconds):
+    return f"{total_bytes / (1 << 30):.2f} GiB in {seconds:.1f} s ({total_bytes / (1 << 20) / max(seconds, 1e-6):.0f} MiB/s)"
+
+
+def main(argv=None):
+    # Throughput check, e.g. python chunk_hashes.py image.bin --chunk-size 16 --workers 1
+    parser = argparse.ArgumentParser(description="Hash files in chunks and report the throughput.")
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--chunk-size', type=int, default=16, help="Chunk size in MiB (default 16)")
+    parser.add_argument('--workers', type=int, help="Hashing threads (default: one per core)")
+    arguments = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    hashes = hash_chunks(arguments.paths, arguments.chunk_size * CHUNK_BLOCK, arguments.workers)
+    elapsed = time.perf_counter() - start
+    for path, digests in hashes.items():
+        print(f"{path}: {len(digests)} chunks")
+    print(hashing_rate(sum(os.path.getsize(path) for path in arguments.paths), elapsed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
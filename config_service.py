@@ -0,0 +1,284 @@
+import json
+import os
+import threading
+from collections import namedtuple
+
+
+# One configuration value. kind is int, float, str, comma_separated or list (of item_kind);
+# values are stored as strings in the JSON files, as the dialogs enter them.
+# title and unit label the field in the generic configuration dialog.
+ConfigField = namedtuple('ConfigField', [
+    'name',
+    'kind',
+    'required',
+    'default',
+    'minimum',
+    'maximum',
+    'item_kind',
+    'length',
+    'title',
+    'unit'
+], defaults=[True, None, None, None, int, None, None, ''])
+
+ConfigSchema = namedtuple('ConfigSchema', ['file_name', 'fields'])
+
+
+def comma_separated(value):
+    # Text field holding a comma separated list; kept as text, but separators
+    # alone do not count as a value
+    value = str(value)
+    if not any(item.strip() for item in value.split(',')):
+        raise ValueError("no items given")
+    return value
+
+
+# KPI row label -> its configuration file and fields. A KPI that gets a
+# configuration dialog adds its entry here.
+CONFIG_SCHEMAS = {
+    "CPU and Memory Utilization": ConfigSchema('cpu_memory_utilization_config.json', [
+        ConfigField('cpu_usage', int, minimum=0, maximum=100),
+        ConfigField('memory_usage', int, minimum=0, maximum=100),
+        ConfigField('cpu_usage_list', list, minimum=0, maximum=100, length=8),
+        ConfigField('script_exec_time', int, minimum=1),
+        ConfigField('initial_logging_delay', int, minimum=0),
+        ConfigField('sampling_rate', int, required=False, default=10, minimum=1, maximum=100),
+        ConfigField('test_report_name', str)
+    ]),
+    "Heap Memory": ConfigSchema('heap_memory_config.json', [
+        ConfigField('processes', str, title='Processes', unit='(comma separated names)'),
+        ConfigField('leak_threshold', float, minimum=0, title='Leak Threshold', unit='KiB/h'),
+        ConfigField('min_samples', int, required=False, default=10, minimum=3, title='Minimum Samples'),
+        ConfigField('sampling_interval', int, required=False, default=10, minimum=1, maximum=3600,
+                    title='Sampling Interval', unit='sec'),
+        ConfigField('script_exec_time', int, minimum=1, title='Script Execution Time', unit='sec'),
+        ConfigField('initial_logging_delay', int, minimum=0, title='Initial Logging Delay', unit='sec')
+    ]),
+    "Startup Time": ConfigSchema('startup_time_config.json', [
+        ConfigField('kernel_marker', str, required=False, default='Linux version', title='Kernel Up Marker',
+                    unit='(regex)'),
+        ConfigField('services_marker', str, required=False, default='Reached target Multi-User System',
+                    title='Services Ready Marker', unit='(regex)'),
+        ConfigField('application_marker', str, title='App Ready Marker', unit='(regex)'),
+        ConfigField('boot_log_command', str, required=False,
+                    default='dmesg; journalctl -b -o short-monotonic --no-pager 2>/dev/null', title='Boot Log Command'),
+        ConfigField('max_startup_time', float, minimum=0, title='Max Startup Time', unit='sec'),
+        ConfigField('off_time', int, required=False, default=5, minimum=1, maximum=600, title='IG OFF Time',
+                    unit='sec'),
+        ConfigField('boot_timeout', int, required=False, default=180, minimum=10, title='Boot Timeout', unit='sec')
+    ]),
+    "Cyclic and Turnaround Time": ConfigSchema('cyclic_turnaround_config.json', [
+        ConfigField('trace_command', str, title='Trace Command'),
+        ConfigField('start_event', str, required=False, default='start', title='Start Event'),
+        ConfigField('end_event', str, required=False, default='end', title='End Event'),
+        ConfigField('max_response_time', float, minimum=0, title='Max Response Time', unit='ms'),
+        ConfigField('max_period_jitter', float, minimum=0, title='Max Period Jitter', unit='ms'),
+        ConfigField('iterations', int, required=False, default=1, minimum=1, maximum=1000, title='Iterations'),
+        ConfigField('trace_timeout', int, required=False, default=60, minimum=1, title='Trace Timeout', unit='sec')
+    ]),
+    "Throughput and Fault Injection": ConfigSchema('throughput_config.json', [
+        ConfigField('protocol', str, required=False, default='tcp', title='Protocol', unit='(tcp, udp)'),
+        ConfigField('direction', str, required=False, default='both', title='Direction',
+                    unit='(download, upload, both)'),
+        ConfigField('transfer_size', int, required=False, default=100, minimum=1, maximum=100000,
+                    title='Transfer Size', unit='MiB'),
+        ConfigField('min_throughput', float, minimum=0, title='Min Throughput', unit='Mbit/s'),
+        ConfigField('port', int, required=False, default=5201, minimum=1024, maximum=65535, title='Port'),
+        ConfigField('interval', int, required=False, default=100, minimum=10, maximum=10000, title='Interval',
+                    unit='ms'),
+        ConfigField('transfer_timeout', int, required=False, default=120, minimum=5, title='Transfer Timeout',
+                    unit='sec')
+    ]),
+    "Execution Time": ConfigSchema('execution_time_config.json', [
+        ConfigField('trace_directory', str, title='Trace Directory'),
+        ConfigField('max_execution_time', float, minimum=0, title='Max Execution Time', unit='us')
+    ]),
+    "Shutdown Time": ConfigSchema('shutdown_time_config.json', [
+        ConfigField('log_follow_command', str, required=False,
+                    default='dmesg -w 2>/dev/null || tail -F /var/log/messages', title='Log Follow Command'),
+        ConfigField('max_shutdown_time', float, minimum=0, title='Max Shutdown Time', unit='sec'),
+        ConfigField('probe_interval', int, required=False, default=20, minimum=5, maximum=1000,
+                    title='Probe Interval', unit='ms'),
+        ConfigField('probe_timeout', int, required=False, default=200, minimum=10, maximum=5000,
+                    title='Probe Timeout', unit='ms'),
+        ConfigField('shutdown_timeout', int, required=False, default=60, minimum=5, title='Shutdown Timeout',
+                    unit='sec')
+    ]),
+    "Data Integrity": ConfigSchema('data_integrity_config.json', [
+        ConfigField('items', comma_separated, title='Items', unit='(comma separated, target path=reference image)'),
+        ConfigField('reference_directory', str, required=False, default='.', title='Reference Directory'),
+        ConfigField('chunk_size', int, required=False, default=16, minimum=1, maximum=1024, title='Chunk Size',
+                    unit='MiB'),
+        ConfigField('hash_workers', int, required=False, default=0, minimum=0, maximum=256, title='Host Hash Threads',
+                    unit='(0 = one per core)'),
+        ConfigField('remote_directory', str, required=False, default='/tmp/pfv_integrity',
+                    title='Target Work Directory'),
+        ConfigField('hash_timeout', int, required=False, default=600, minimum=10, title='Hash Timeout', unit='sec')
+    ]),
+}
+
+
+class KpiConfig:
+    # A parsed configuration file: raw holds the strings as saved, values the
+    # typed values, errors what is missing or out of range (empty when valid)
+    def __init__(self, raw, values, errors):
+        self.raw = raw
+        self.values = values
+        self.errors = errors
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+
+class ConfigService:
+    # Loads every KPI configuration once and keeps it parsed and validated, so
+    # checking a KPI is a dictionary lookup. A file is read again only after
+    # reload_if_changed() sees a different mtime, size or inode; the GUI calls
+    # it from a QFileSystemWatcher, headless runs from watch().
+    def __init__(self, directory='.', schemas=None):
+        self.directory = directory
+        self.schemas = schemas if schemas is not None else CONFIG_SCHEMAS
+        self.configs = {}
+        self.signatures = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.watch_thread = None
+        self.stop_event = threading.Event()
+
+    def has_config(self, label):
+        return label in self.schemas
+
+    def path(self, label):
+        return os.path.join(self.directory, self.schemas[label].file_name)
+
+    def paths(self):
+        return {label: self.path(label) for label in self.schemas}
+
+    def get(self, label):
+        with self.lock:
+            config = self.configs.get(label)
+            if config is None:
+                config = self.load(label)
+            return config
+
+    def is_valid(self, label):
+        return self.has_config(label) and self.get(label).valid
+
+    def add_listener(self, callback):
+        # callback(label, config), called from whichever thread noticed the change
+        self.listeners.append(callback)
+
+    def load(self, label):
+        schema = self.schemas[label]
+        path = self.path(label)
+        try:
+            signature = file_signature(path)
+            with open(path, 'r') as f:
+                raw = json.load(f)
+            if not isinstance(raw, dict):
+                raise ValueError("not a JSON object")
+            config = parse_config(schema, raw)
+        except FileNotFoundError:
+            signature = None
+            config = KpiConfig({}, {}, [f"{schema.file_name} not found"])
+        except (OSError, ValueError) as e:
+            signature = None
+            config = KpiConfig({}, {}, [f"{schema.file_name}: {e}"])
+
+        self.configs[label] = config
+        self.signatures[label] = signature
+        return config
+
+    def save(self, label, raw):
+        path = self.path(label)
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(raw, f, indent=4)  # Use indent=4 to write in vertical order
+        os.replace(temporary_path, path)
+
+        with self.lock:
+            config = self.load(label)
+        self.notify(label, config)
+        return config
+
+    def reload_if_changed(self, label):
+        try:
+            signature = file_signature(self.path(label))
+        except OSError:
+            signature = None
+
+        with self.lock:
+            if label in self.signatures and signature == self.signatures[label]:
+                return False
+            config = self.load(label)
+        self.notify(label, config)
+        return True
+
+    def notify(self, label, config):
+        for callback in self.listeners:
+            callback(label, config)
+
+    def watch(self, interval=1.0):
+        # Polling watcher for runs without a Qt event loop
+        if self.watch_thread is not None:
+            return
+        self.stop_event.clear()
+        self.watch_thread = threading.Thread(target=self.watch_loop, args=(interval,), name="ConfigWatcher", daemon=True)
+        self.watch_thread.start()
+
+    def watch_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            for label in self.schemas:
+                self.reload_if_changed(label)
+
+    def stop_watching(self):
+        self.stop_event.set()
+        if self.watch_thread is not None:
+            self.watch_thread.join()
+            self.watch_thread = None
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def parse_config(schema, raw):
+    values = {}
+    errors = []
+    for field in schema.fields:
+        value = raw.get(field.name)
+        if value in (None, '') or value == []:
+            if field.required:
+                errors.append(f"{field.name} is not set")
+            elif field.default is not None:
+                values[field.name] = field.default
+            continue
+
+        try:
+            if field.kind is list:
+                if field.length is not None and len(value) != field.length:
+                    raise ValueError(f"expected {field.length} values")
+                if any(item in (None, '') for item in value):
+                    raise ValueError("not every value is set")
+                values[field.name] = [check_range(field, field.item_kind(item)) for item in value]
+            else:
+                values[field.name] = check_range(field, field.kind(value))
+        except (TypeError, ValueError) as e:
+            errors.append(f"{field.name}: {e}")
+
+    return KpiConfig(raw, values, errors)
+
+
+def check_range(field, value):
+    if field.minimum is not None and value < field.minimum:
+        raise ValueError(f"{value} is below {field.minimum}")
+    if field.maximum is not None and value > field.maximum:
+        raise ValueError(f"{value} is above {field.maximum}")
+    return value
@@ -0,0 +1,210 @@
+import time
+from collections import deque
+
+from PyQt5.QtCore import Qt, QTimer, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import (
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLabel,
+    QComboBox,
+    QPushButton,
+    QTableView,
+    QHeaderView,
+    QAbstractItemView,
+    QApplication
+)
+
+
+ALL_ECUS = "All ECUs"
+ALL_KPIS = "All KPIs"
+
+
+class ConsoleModel(QAbstractListModel):
+    # The lines currently shown. Rows are dropped from the front in one block
+    # once the limit is reached, and only the visible rows are ever formatted.
+    def __init__(self, max_lines, parent=None):
+        super().__init__(parent)
+        self.max_lines = max_lines
+        self.lines = []
+        self.start = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines) - self.start
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return format_record(self.lines[self.start + index.row()])
+        return None
+
+    def append(self, records):
+        if not records:
+            return
+
+        records = records[-self.max_lines:]
+
+        overflow = self.rowCount() + len(records) - self.max_lines
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            self.start += overflow
+            # Compact now and then instead of shifting the list on every removal
+            if self.start > self.max_lines:
+                del self.lines[:self.start]
+                self.start = 0
+            self.endRemoveRows()
+
+        first = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+        self.lines.extend(records)
+        self.endInsertRows()
+
+    def reset(self, records):
+        self.beginResetModel()
+        self.lines = list(records)[-self.max_lines:]
+        self.start = 0
+        self.endResetModel()
+
+
+class ConsoleWidget(QWidget):
+    # append() may be called from any thread at any rate: lines are only queued
+    # there and the GUI thread inserts whatever has piled up once per flush
+    # interval, so a flood costs one model insert per tick instead of one per line
+    def __init__(self, max_lines=20000, flush_interval=50, parent=None):
+        super().__init__(parent)
+
+        self.max_lines = max_lines
+
+        # Both bounded: anything older than max_lines would be trimmed from the
+        # view anyway, so it is dropped before it ever reaches the model
+        self.pending = deque(maxlen=max_lines)
+        self.records = deque(maxlen=max_lines)
+
+        self.create_layout()
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(flush_interval)
+
+    def create_layout(self):
+        layout = QVBoxLayout()
+
+        filter_layout = QHBoxLayout()
+
+        self.ecu_filter = QComboBox()
+        self.ecu_filter.addItem(ALL_ECUS)
+        self.ecu_filter.setMinimumWidth(180)
+        self.ecu_filter.currentIndexChanged.connect(self.refilter)
+
+        self.kpi_filter = QComboBox()
+        self.kpi_filter.addItem(ALL_KPIS)
+        self.kpi_filter.setMinimumWidth(250)
+        self.kpi_filter.currentIndexChanged.connect(self.refilter)
+
+        copy_button = QPushButton('Copy')
+        copy_button.clicked.connect(self.copy_selection)
+
+        clear_button = QPushButton('Clear')
+        clear_button.clicked.connect(self.clear)
+
+        filter_layout.addWidget(QLabel('ECU'))
+        filter_layout.addWidget(self.ecu_filter)
+        filter_layout.addWidget(QLabel('KPI'))
+        filter_layout.addWidget(self.kpi_filter)
+        filter_layout.addStretch()
+        filter_layout.addWidget(copy_button)
+        filter_layout.addWidget(clear_button)
+
+        self.model = ConsoleModel(self.max_lines, self)
+
+        # A single-column table with fixed row heights only touches the visible
+        # rows; QListView and QTreeView walk every row on insert and scroll
+        self.log_view = QTableView()
+        self.log_view.setModel(self.model)
+        self.log_view.setFont(QFont('Consolas', 9))
+        self.log_view.setShowGrid(False)
+        self.log_view.setWordWrap(False)
+        self.log_view.horizontalHeader().hide()
+        self.log_view.horizontalHeader().setStretchLastSection(True)
+        self.log_view.verticalHeader().hide()
+        self.log_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.log_view.verticalHeader().setDefaultSectionSize(self.log_view.fontMetrics().height() + 2)
+        self.log_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.log_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.log_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.log_view)
+        self.setLayout(layout)
+
+    def append(self, text, ecu='', kpi=''):
+        # deque.append is atomic, no lock needed between producer threads
+        timestamp = time.time()
+        for line in text.splitlines() or ['']:
+            self.pending.append((timestamp, ecu, kpi, line))
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+
+        self.add_filter_items(batch)
+        self.records.extend(batch)
+
+        ecu_filter, kpi_filter = self.current_filters()
+        visible = [record for record in batch if matches(record, ecu_filter, kpi_filter)]
+
+        scrollbar = self.log_view.verticalScrollBar()
+        follow = scrollbar.value() == scrollbar.maximum()
+
+        self.model.append(visible)
+
+        if follow:
+            self.log_view.scrollToBottom()
+
+    def add_filter_items(self, batch):
+        ecus = {ecu for _, ecu, _, _ in batch if ecu}
+        kpis = {kpi for _, _, kpi, _ in batch if kpi}
+
+        for combo, names in ((self.ecu_filter, ecus), (self.kpi_filter, kpis)):
+            for name in sorted(names):
+                if combo.findText(name) < 0:
+                    combo.addItem(name)
+
+    def current_filters(self):
+        ecu_filter = self.ecu_filter.currentText()
+        kpi_filter = self.kpi_filter.currentText()
+        return (None if ecu_filter == ALL_ECUS else ecu_filter,
+                None if kpi_filter == ALL_KPIS else kpi_filter)
+
+    def refilter(self):
+        ecu_filter, kpi_filter = self.current_filters()
+        self.model.reset(record for record in self.records if matches(record, ecu_filter, kpi_filter))
+        self.log_view.scrollToBottom()
+
+    def copy_selection(self):
+        rows = sorted(index.row() for index in self.log_view.selectionModel().selectedIndexes())
+        QApplication.clipboard().setText("\n".join(self.model.data(self.model.index(row)) for row in rows))
+
+    def clear(self):
+        self.pending.clear()
+        self.records.clear()
+        self.model.reset([])
+
+
+def matches(record, ecu_filter, kpi_filter):
+    _, ecu, kpi, _ = record
+    return (ecu_filter is None or ecu == ecu_filter) and (kpi_filter is None or kpi == kpi_filter)
+
+
+def format_record(record):
+    timestamp, ecu, kpi, text = record
+    prefix = time.strftime('%H:%M:%S', time.localtime(timestamp)) + f".{int(timestamp * 1000) % 1000:03d}"
+    if kpi:
+        prefix += f" [{kpi}]"
+    if ecu:
+        prefix += f" [{ecu}]"
+    return f"{prefix} {text}"
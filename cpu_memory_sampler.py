@@ -0,0 +1,190 @@
+import threading
+import time
+
+import numpy as np
+
+
+CORE_COUNT = 8
+
+# Column layout of every sample row; thresholds apply to all columns but 'time'
+COLUMNS = ['time', 'cpu_usage', 'memory_usage'] + [f'cpu{i}' for i in range(CORE_COUNT)]
+
+# One round trip per sample returns both files
+SAMPLE_COMMAND = 'cat /proc/stat /proc/meminfo'
+
+
+class SampleRingBuffer:
+    # Fixed-size buffer of the most recent rows; memory is allocated once up front
+    def __init__(self, capacity, column_count):
+        self.data = np.full((capacity, column_count), np.nan)
+        self.capacity = capacity
+        self.position = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, rows):
+        rows = rows[-self.capacity:]
+        with self.lock:
+            end = self.position + len(rows)
+            if end <= self.capacity:
+                self.data[self.position:end] = rows
+            else:
+                split = self.capacity - self.position
+                self.data[self.position:] = rows[:split]
+                self.data[:end - self.capacity] = rows[split:]
+            self.position = end % self.capacity
+            self.count = min(self.count + len(rows), self.capacity)
+
+    def snapshot(self):
+        # Rows in chronological order (a copy, safe to use while sampling goes on)
+        with self.lock:
+            if self.count < self.capacity:
+                return self.data[:self.count].copy()
+            return np.concatenate((self.data[self.position:], self.data[:self.position]))
+
+
+def parse_proc_stat(text):
+    # Returns (busy, total) jiffies for the aggregate line and CPU0..CPU7,
+    # NaN for cores the target does not have
+    counters = np.full((CORE_COUNT + 1, 2), np.nan)
+    for line in text.splitlines():
+        if not line.startswith('cpu'):
+            continue
+        fields = line.split()
+        name = fields[0]
+        index = 0 if name == 'cpu' else int(name[3:]) + 1
+        if index > CORE_COUNT:
+            continue
+        # user nice system idle iowait irq softirq steal (guest time is already in user)
+        values = [int(value) for value in fields[1:9]]
+        total = sum(values)
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        counters[index] = (total - idle, total)
+    return counters
+
+
+def parse_meminfo(text):
+    fields = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(':')
+        if name in ('MemTotal', 'MemAvailable', 'MemFree', 'Buffers', 'Cached'):
+            fields[name] = int(value.split()[0])
+
+    total = fields.get('MemTotal')
+    if not total:
+        return np.nan
+    available = fields.get('MemAvailable')
+    if available is None:
+        available = fields.get('MemFree', 0) + fields.get('Buffers', 0) + fields.get('Cached', 0)
+    return 100.0 * (total - available) / total
+
+
+class CpuMemorySampler:
+    def __init__(self, cpu_threshold, memory_threshold, core_thresholds, rate=10, batch_size=None, capacity=65536):
+        self.thresholds = np.array([cpu_threshold, memory_threshold] + list(core_thresholds), dtype=float)
+        self.period = 1.0 / rate
+        self.batch_size = batch_size or max(1, int(rate))
+
+        self.batch = np.full((self.batch_size, len(COLUMNS)), np.nan)
+        self.batch_count = 0
+        self.ring = SampleRingBuffer(capacity, len(COLUMNS))
+        self.previous_counters = None
+
+        # Running statistics per metric column, constant size however long the run
+        metric_count = len(COLUMNS) - 1
+        self.sample_count = 0
+        self.missed_samples = 0
+        self.valid_counts = np.zeros(metric_count, dtype=np.int64)
+        self.sums = np.zeros(metric_count)
+        self.maxima = np.full(metric_count, -np.inf)
+        self.exceed_counts = np.zeros(metric_count, dtype=np.int64)
+
+    def add_sample(self, timestamp, text):
+        counters = parse_proc_stat(text)
+        memory_usage = parse_meminfo(text)
+
+        previous, self.previous_counters = self.previous_counters, counters
+        if previous is None:
+            return None
+
+        delta = counters - previous
+        with np.errstate(divide='ignore', invalid='ignore'):
+            usage = 100.0 * delta[:, 0] / delta[:, 1]
+
+        row = self.batch[self.batch_count]
+        row[0] = timestamp
+        row[1] = usage[0]
+        row[2] = memory_usage
+        row[3:] = usage[1:]
+        self.batch_count += 1
+
+        if self.batch_count == self.batch_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        if self.batch_count == 0:
+            return None
+
+        batch = self.batch[:self.batch_count]
+        self.evaluate(batch)
+        self.ring.append(batch)
+        rows = batch.copy()
+        self.batch_count = 0
+        return rows
+
+    def evaluate(self, batch):
+        # All metrics of the batch against their thresholds in one pass; NaN
+        # (missing core, first interval) neither counts nor exceeds
+        metrics = batch[:, 1:]
+        valid = ~np.isnan(metrics)
+        self.sample_count += len(batch)
+        self.valid_counts += valid.sum(axis=0)
+        self.sums += np.where(valid, metrics, 0.0).sum(axis=0)
+        self.maxima = np.fmax(self.maxima, np.nanmax(np.where(valid, metrics, -np.inf), axis=0))
+        self.exceed_counts += (np.where(valid, metrics, -np.inf) > self.thresholds).sum(axis=0)
+
+    def run(self, read_stats, duration, sleep, on_batch=None):
+        # Samples on a fixed monotonic schedule. If a read overruns its slot the
+        # missed ticks are skipped rather than queued, so the sampler never falls
+        # behind however long it runs.
+        start = time.monotonic()
+        end = start + duration
+        next_time = start
+
+        while next_time < end:
+            now = time.monotonic()
+            if now < next_time:
+                sleep(next_time - now)
+
+            timestamp = time.time()
+            rows = self.add_sample(timestamp, read_stats())
+            if rows is not None and on_batch is not None:
+                on_batch(rows)
+
+            next_time += self.period
+            now = time.monotonic()
+            if now > next_time:
+                missed = int((now - next_time) / self.period) + 1
+                self.missed_samples += missed
+                next_time += missed * self.period
+
+        rows = self.flush()
+        if rows is not None and on_batch is not None:
+            on_batch(rows)
+
+    def summary(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums / self.valid_counts
+        result = {}
+        for i, name in enumerate(COLUMNS[1:]):
+            if self.valid_counts[i] == 0:
+                continue
+            result[name] = {
+                'threshold': float(self.thresholds[i]),
+                'mean': float(means[i]),
+                'max': float(self.maxima[i]),
+                'samples': int(self.valid_counts[i]),
+                'exceeded': int(self.exceed_counts[i])
+            }
+        return result
@@ -1,4 +1,3 @@
-import json
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QIntValidator
 from PyQt5.QtWidgets import (
@@ -12,6 +11,9 @@ from PyQt5.QtWidgets import (
     QDialog
 )
 
+CONFIG_LABEL = "CPU and Memory Utilization"
+
+
 class CustomIntValidator(QIntValidator):
     def validate(self, input_str, pos):
         if input_str == "":
@@ -79,7 +81,7 @@ class CpuMemoryConfig(QDialog):
         self.create_main_layout()
     
     def done(self, result):
-        print("CPU and Memory Utilization configuration window closed successfully")
+        self.main_window.log("CPU and Memory Utilization configuration window closed successfully", kpi=CONFIG_LABEL)
         super().done(result)
     
     def set_window_properties(self):
@@ -188,6 +190,7 @@ class CpuMemoryConfig(QDialog):
 
         self.create_script_exec_time_input(script_logging_report_button_layout)
         self.create_initial_logging_delay_input(script_logging_report_button_layout)
+        self.create_sampling_rate_input(script_logging_report_button_layout)
         self.create_test_report_name_input(script_logging_report_button_layout)
         self.create_buttons(script_logging_report_button_layout)
 
@@ -229,6 +232,24 @@ class CpuMemoryConfig(QDialog):
 
         layout.addRow(initial_logging_delay_layout)
 
+    def create_sampling_rate_input(self, layout):
+        sampling_rate_layout = QHBoxLayout()
+
+        sampling_rate_label = QLabel('Sampling Rate')
+        sampling_rate_label.setAlignment(Qt.AlignCenter)
+
+        self.sampling_rate_input = QLineEdit()
+        self.sampling_rate_input.setValidator(QIntValidator(1, 100))
+        self.sampling_rate_input.setFixedWidth(100)
+
+        sampling_rate_unit_label = QLabel('Hz')
+
+        sampling_rate_layout.addWidget(sampling_rate_label)
+        sampling_rate_layout.addWidget(self.sampling_rate_input)
+        sampling_rate_layout.addWidget(sampling_rate_unit_label)
+
+        layout.addRow(sampling_rate_layout)
+
     def create_test_report_name_input(self, layout):
         test_report_name_layout = QHBoxLayout()
 
@@ -274,6 +295,7 @@ class CpuMemoryConfig(QDialog):
 
         self.script_exec_time_input.textChanged.connect(self.check_fields)
         self.initial_logging_delay_input.textChanged.connect(self.check_fields)
+        self.sampling_rate_input.textChanged.connect(self.check_fields)
         self.test_report_name_input.textChanged.connect(self.check_fields)       
 
     def check_fields(self):
@@ -282,29 +304,30 @@ class CpuMemoryConfig(QDialog):
             all(cpu_input.text() for cpu_input in self.cpu_inputs) and 
             self.script_exec_time_input.text() and 
             self.initial_logging_delay_input.text() and 
+            self.sampling_rate_input.text() and 
             self.test_report_name_input.toPlainText()):
             self.ok_button.setEnabled(True)
         else:
             self.ok_button.setEnabled(False)
 
     def load_data(self):
-        try:
-            with open('cpu_memory_utilization_config.json', 'r') as f:
-                data = json.load(f)
+        # The cached copy from the config service, no file access here
+        data = self.main_window.config_service.get(CONFIG_LABEL).raw
+        if not data:
+            return
 
-                self.cpu_usage_input.setText(data['cpu_usage'])
-                self.memory_usage_input.setText(data['memory_usage'])
+        self.cpu_usage_input.setText(data.get('cpu_usage', ''))
+        self.memory_usage_input.setText(data.get('memory_usage', ''))
 
-                for i, cpu_input in enumerate(self.cpu_inputs):
-                    cpu_input.setText(data['cpu_usage_list'][i])
-                    
-                self.script_exec_time_input.setText(data['script_exec_time'])
-                self.initial_logging_delay_input.setText(data['initial_logging_delay'])
-                self.test_report_name_input.setPlainText(data['test_report_name'])
+        for cpu_input, value in zip(self.cpu_inputs, data.get('cpu_usage_list', [])):
+            cpu_input.setText(value)
 
-            self.check_fields()  # Call check_fields after loading data
-        except FileNotFoundError:
-            pass
+        self.script_exec_time_input.setText(data.get('script_exec_time', ''))
+        self.initial_logging_delay_input.setText(data.get('initial_logging_delay', ''))
+        self.sampling_rate_input.setText(data.get('sampling_rate', '10'))
+        self.test_report_name_input.setPlainText(data.get('test_report_name', ''))
+
+        self.check_fields()  # Call check_fields after loading data
 
 
     def save_and_close(self):
@@ -314,11 +337,11 @@ class CpuMemoryConfig(QDialog):
             'cpu_usage_list': [cpu_input.text() for cpu_input in self.cpu_inputs],
             'script_exec_time': self.script_exec_time_input.text(),
             'initial_logging_delay': self.initial_logging_delay_input.text(),
+            'sampling_rate': self.sampling_rate_input.text(),
             'test_report_name': self.test_report_name_input.toPlainText()
         }
 
-        with open('cpu_memory_utilization_config.json', 'w') as f:
-            json.dump(data, f, indent=4)  # Use indent=4 to write in vertical order
-            
+        self.main_window.config_service.save(CONFIG_LABEL, data)
+
         self.accept()
 
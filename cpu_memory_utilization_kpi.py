@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+
+from cpu_memory_sampler import COLUMNS, SAMPLE_COMMAND, CpuMemorySampler
+from telnet_pool import TelnetError
+
+
+def run(context):
+    config = context.config()
+
+    initial_logging_delay = config['initial_logging_delay']
+    script_exec_time = config['script_exec_time']
+    sampling_rate = config['sampling_rate']
+
+    sampler = CpuMemorySampler(
+        config['cpu_usage'],
+        config['memory_usage'],
+        config['cpu_usage_list'],
+        rate=sampling_rate
+    )
+
+    # Every sample goes to the report as it arrives, time relative to the start
+    samples_sheet = context.report_sheet(['time (s)'] + COLUMNS[1:], title=f"{context.ecu.name} CPU Memory")
+
+    # Full-resolution series for offline analysis; percentages need no more than float32
+    store = context.sample_store(COLUMNS, dtypes={name: np.float32 for name in COLUMNS[1:]})
+
+    with store, context.telnet_session() as session:
+        context.log(f"Waiting {initial_logging_delay} sec initial logging delay")
+        context.sleep(initial_logging_delay)
+
+        def read_stats():
+            status, output = session.run(SAMPLE_COMMAND)
+            if status != 0:
+                raise TelnetError(f"'{SAMPLE_COMMAND}' failed with status {status}")
+            return output
+
+        def on_batch(rows):
+            context.publish_samples(rows)
+            store.append(rows)
+            report_rows = rows.copy()
+            report_rows[:, 0] -= start_time
+            samples_sheet.append(report_rows)
+            elapsed = rows[-1, 0] - start_time
+            context.progress(min(100, 100 * elapsed / script_exec_time))
+
+        context.log(f"Logging for {script_exec_time} sec at {sampling_rate} samples/sec")
+        start_time = time.time()
+        sampler.run(read_stats, script_exec_time, context.sleep, on_batch)
+
+    context.progress(100)
+
+    if sampler.missed_samples:
+        context.log(f"{sampler.missed_samples} samples skipped, the target answered slower than the sampling rate")
+
+    summary = sampler.summary()
+    if 'cpu_usage' not in summary:
+        context.log("No samples collected, result not evaluated")
+        return None
+
+    # The KPI passes when the average load stays within every threshold;
+    # peaks and the number of samples above the threshold are reported
+    passed = True
+    for name, values in summary.items():
+        within = values['mean'] <= values['threshold']
+        passed = passed and within
+        context.log(f"{name}: mean {values['mean']:.1f}%, max {values['max']:.1f}%, "
+                    f"threshold {values['threshold']:.0f}%, {values['exceeded']}/{values['samples']} samples above "
+                    f"-> {'PASS' if within else 'FAIL'}")
+
+    return passed
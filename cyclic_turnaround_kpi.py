@@ -0,0 +1,84 @@
+import json
+import os
+
+from latency_histogram import LatencyHistogram
+from task_timing import TaskTimingAggregator
+
+
+HISTOGRAM_FILE = 'histograms.json'
+
+SUMMARY_HEADER = ['task', 'metric', 'count', 'min (ms)', 'mean (ms)', 'p50 (ms)', 'p99 (ms)', 'p99.9 (ms)',
+                  'max (ms)', 'jitter (ms)']
+
+
+def run(context):
+    config = context.config()
+    iterations = config['iterations']
+    max_response_time = config['max_response_time']
+    max_period_jitter = config['max_period_jitter']
+
+    # Every iteration is aggregated on its own and merged into the total; the
+    # histograms are fixed-size arrays, so merging costs the same for any trace length
+    total = TaskTimingAggregator(config['start_event'], config['end_event'])
+    with context.telnet_session() as session:
+        for iteration in range(1, iterations + 1):
+            if context.stopped():
+                break
+            context.log(f"Iteration {iteration} of {iterations}: reading the task trace")
+            aggregator = TaskTimingAggregator(config['start_event'], config['end_event'])
+            status = session.run_lines(config['trace_command'], aggregator.feed, timeout=config['trace_timeout'])
+            aggregator.flush()
+            if status != 0:
+                context.log(f"Trace command exited with status {status}")
+            context.log(f"{aggregator.records} trace records, {aggregator.ignored} other lines")
+            total.merge(aggregator)
+            context.progress(100 * iteration / iterations)
+
+    if not total.periods:
+        context.log("No task trace records found, result not evaluated")
+        return None
+
+    with open(os.path.join(context.results_directory(), HISTOGRAM_FILE), 'w') as f:
+        json.dump(total.histograms(), f)
+
+    sheet = context.report_sheet(SUMMARY_HEADER, title=f"{context.ecu.name} Task Timing")
+    all_responses = LatencyHistogram()
+    passed = True
+    for task in sorted(total.periods):
+        period = total.periods[task].summary()
+        response = total.responses[task].summary()
+        all_responses.merge(total.responses[task])
+
+        period_jitter = milliseconds(period['max'] - period['min']) if period['count'] else None
+        sheet.append([summary_row(task, 'period', period, period_jitter),
+                      summary_row(task, 'response', response, None)])
+
+        problems = []
+        if period_jitter is not None and period_jitter > max_period_jitter:
+            problems.append(f"period jitter {period_jitter:.3f} ms above {max_period_jitter:g} ms")
+        if response['count'] and milliseconds(response['max']) > max_response_time:
+            problems.append(f"response time {milliseconds(response['max']):.3f} ms above {max_response_time:g} ms")
+        passed = passed and not problems
+
+        context.log(f"{task}: period p50 {format_ms(period['p50'])} / p99.9 {format_ms(period['p99.9'])} / "
+                    f"max {format_ms(period['max'])} ms, response p50 {format_ms(response['p50'])} / "
+                    f"p99.9 {format_ms(response['p99.9'])} / max {format_ms(response['max'])} ms"
+                    + (f" -> {', '.join(problems)}" if problems else ""))
+
+    sheet.append([summary_row('All tasks', 'response', all_responses.summary(), None)])
+    return passed
+
+
+def summary_row(task, metric, summary, jitter):
+    return [task, metric, summary['count']] + [
+        round(milliseconds(summary[key]), 4) if summary[key] is not None else None
+        for key in ('min', 'mean', 'p50', 'p99', 'p99.9', 'max')
+    ] + [round(jitter, 4) if jitter is not None else None]
+
+
+def milliseconds(nanoseconds):
+    return nanoseconds / 1e6
+
+
+def format_ms(nanoseconds):
+    return f"{milliseconds(nanoseconds):.3f}" if nanoseconds is not None else "-"
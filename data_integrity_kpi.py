@@ -0,0 +1,164 @@
+import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from chunk_hashes import CHUNK_BLOCK, HashingStopped, chunk_ranges, hashing_rate, reference_hashes
+
+
+# Run on the target for every item: the size of a regular file (a partition is
+# usually larger than the image written to it, so its size is not compared),
+# then the sha256 of every chunk, as long as the reference image
+SIZE_COMMAND = 'if [ -f {path} ]; then stat -c %s {path}; else echo -; fi'
+CHUNK_COMMAND = 'dd if={path} bs={block} skip={skip} count={count} 2>/dev/null | head -c {length} | sha256sum'
+CHUNK_LOOP = ('i=0; while [ $i -lt {chunks} ]; do dd if={path} bs={block} skip=$((i * {count})) count={count} '
+              '2>/dev/null | sha256sum; i=$((i + 1)); done')
+
+MISMATCHES_LOGGED = 10
+
+# The verdict is about the target's content, which can change without its
+# firmware version (see result_cache.py); the KPI always runs
+CACHEABLE = False
+
+# How often STOP is checked while waiting for the host hashes
+STOP_POLL_INTERVAL = 0.5
+
+
+def run(context):
+    config = context.config()
+    items = parse_items(config['items'], config['reference_directory'])
+    missing = [reference for _, reference in items if not os.path.isfile(reference)]
+    if missing:
+        raise ValueError(f"Reference image not found: {', '.join(missing)}")
+
+    chunk_size = config['chunk_size'] * CHUNK_BLOCK
+    remote_directory = config['remote_directory'].rstrip('/')
+    sizes = [os.path.getsize(reference) for _, reference in items]
+
+    # The host hashes the references while the target hashes its copies. The
+    # executor is not waited for: after an error on the target the hashing
+    # finishes in the background, after STOP it ends at the next chunk.
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ReferenceHash")
+    try:
+        started = time.perf_counter()
+        references = executor.submit(timed, reference_hashes, [reference for _, reference in items], chunk_size,
+                                     config['hash_workers'] or None, context.stopped)
+
+        try:
+            with context.telnet_session() as session:
+                session.run(f"rm -rf {shlex.quote(remote_directory)}; mkdir -p {shlex.quote(remote_directory)}")
+                for number, ((remote_path, reference), size) in enumerate(zip(items, sizes)):
+                    if context.stopped():
+                        return None
+                    context.log(f"Hashing {remote_path} on the target, {size / (1 << 20):.1f} MiB in "
+                                f"{config['chunk_size']} MiB chunks")
+                    status, output = session.run(target_command(remote_path, size, chunk_size,
+                                                                f"{remote_directory}/{number}.sha256"),
+                                                 timeout=config['hash_timeout'])
+                    if status != 0:
+                        context.log(f"Hashing {remote_path} exited with status {status}: {output.strip()}")
+                    context.progress(80 * (number + 1) / len(items))
+
+            files = context.download_logs([remote_directory])
+        finally:
+            remove_directory(context, remote_directory)
+
+        while True:
+            try:
+                reference_digests, finished = references.result(timeout=STOP_POLL_INTERVAL)
+                break
+            except TimeoutError:
+                if context.stopped():
+                    return None
+            except HashingStopped:
+                return None
+        context.log(f"Reference images hashed on the host: {hashing_rate(sum(sizes), finished - started)}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    checksum_files = {os.path.basename(local_path): local_path for _, local_path, _ in files}
+    sheet = context.report_sheet(['item', 'reference', 'size (bytes)', 'chunks', 'mismatched chunks',
+                                  'first mismatch (byte)', 'result'], title=f"{context.ecu.name} Data Integrity")
+    passed = True
+    for number, ((remote_path, reference), size) in enumerate(zip(items, sizes)):
+        expected = reference_digests[reference]
+        target_size, digests = read_checksum_file(checksum_files.get(f"{number}.sha256"))
+
+        mismatched = [index for index, digest in enumerate(expected)
+                      if index >= len(digests) or digests[index] != digest]
+        size_differs = target_size is not None and target_size != size
+        ok = not mismatched and not size_differs
+        passed = passed and ok
+
+        ranges = chunk_ranges(size, chunk_size)
+        for index in mismatched[:MISMATCHES_LOGGED]:
+            offset, length = ranges[index]
+            context.log(f"{remote_path}: bytes {offset}-{offset + length - 1} differ from {reference}")
+        if len(mismatched) > MISMATCHES_LOGGED:
+            context.log(f"{remote_path}: {len(mismatched) - MISMATCHES_LOGGED} more chunks differ")
+        if size_differs:
+            context.log(f"{remote_path}: {target_size} bytes on the target, {size} in {reference}")
+        context.log(f"{remote_path}: {len(expected) - len(mismatched)}/{len(expected)} chunks match -> "
+                    f"{'PASS' if ok else 'FAIL'}")
+
+        sheet.append([[remote_path, reference, size, len(expected), len(mismatched),
+                       ranges[mismatched[0]][0] if mismatched else None, 'PASS' if ok else 'FAIL']])
+
+    context.progress(100)
+    return passed
+
+
+def remove_directory(context, remote_directory):
+    # Also runs after the session failed; a second failure here must not hide the first
+    try:
+        with context.telnet_session() as session:
+            session.run(f"rm -rf {shlex.quote(remote_directory)}")
+    except Exception as e:
+        context.log(f"Could not remove {remote_directory} on the target: {e}")
+
+
+def parse_items(text, reference_directory):
+    # "/dev/mmcblk0p3=rootfs.ext4, /usr/lib/libapp.so" -> [(remote path, reference)];
+    # without a reference the one named like the remote file is used
+    items = []
+    for part in text.split(','):
+        remote_path, _, reference = part.strip().partition('=')
+        remote_path = remote_path.strip()
+        if not remote_path:
+            continue
+        reference = reference.strip() or os.path.basename(remote_path)
+        items.append((remote_path, os.path.join(reference_directory, reference)))
+    if not items:
+        raise ValueError("No items to verify")
+    return items
+
+
+def target_command(remote_path, size, chunk_size, checksum_path):
+    # Full chunks in a loop on the target, then the tail cut to the reference length
+    path = shlex.quote(remote_path)
+    blocks = chunk_size // CHUNK_BLOCK
+    full_chunks, tail = divmod(size, chunk_size)
+    commands = [SIZE_COMMAND.format(path=path)]
+    if full_chunks:
+        commands.append(CHUNK_LOOP.format(path=path, block=CHUNK_BLOCK, count=blocks, chunks=full_chunks))
+    if tail:
+        commands.append(CHUNK_COMMAND.format(path=path, block=CHUNK_BLOCK, skip=full_chunks * blocks,
+                                             count=-(-tail // CHUNK_BLOCK), length=tail))
+    return f"{{ {'; '.join(commands)}; }} > {shlex.quote(checksum_path)}"
+
+
+def read_checksum_file(path):
+    # (size of a regular file or None, [chunk digests]); no file means nothing was hashed
+    if path is None:
+        return None, []
+    with open(path, 'r', errors='replace') as f:
+        lines = f.read().splitlines()
+    if not lines:
+        return None, []
+    size = int(lines[0]) if lines[0].strip().isdigit() else None
+    return size, [line.split()[0] for line in lines[1:] if line.strip()]
+
+
+def timed(function, *args):
+    result = function(*args)
+    return result, time.perf_counter()
@@ -0,0 +1,1045 @@
+import argparse
+import heapq
+import ipaddress
+import itertools
+import json
+import math
+import os
+import posixpath
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+
+# Simulated ECUs on localhost, to benchmark and regression-test the tool without
+# booking a bench. Every ECU serves telnet and FTP, has a file tree with
+# synthetic /proc files, a boot log and KEV files written at configurable
+# rates, and is powered by a relay stand-in on a pseudo terminal, so the
+# Startup and Shutdown Time KPIs see it boot and shut down.
+#
+# Commands run in a real /bin/sh with the ECU's tree substituted for /proc,
+# /etc, /var/log and /data, and dmesg, pidof, nc and journalctl replaced by shims.
+# POSIX only: on a Windows bench PC it runs under WSL.
+
+DEFAULT_TELNET_PORT = 2323
+DEFAULT_FTP_PORT = 2121
+DEFAULT_USERNAME = 'root'
+DEFAULT_PASSWORD = 'root'
+
+# Load and timing of a simulated ECU. Times are seconds after IG ON (boot) or
+# IG OFF (shutdown), each varied by up to jitter of its value.
+SimulationProfile = namedtuple('SimulationProfile', [
+    'cores',
+    'cpu_load',            # average busy fraction of every core
+    'memory_kib',
+    'memory_load',         # average used fraction of the memory
+    'processes',           # {name: heap growth in KiB/h}, for the Heap Memory KPI
+    'log_rate',            # boot log lines per second once up
+    'kev_rate',            # KEV files per second
+    'kev_size',            # bytes per KEV file
+    'kev_keep',            # KEV files kept, older ones are deleted
+    'kernel_start',
+    'network_ready',
+    'services_ready',
+    'app_ready',
+    'services_stop',
+    'network_down',
+    'jitter',
+    'firmware'             # image version in /etc/version, tells builds apart for the result cache
+], defaults=[4, 0.35, 4 << 20, 0.45, {'app_manager': 0.0, 'diag_server': 120.0}, 20.0, 1.0, 65536, 100,
+             0.3, 1.2, 2.0, 2.8, 0.8, 1.5, 0.05, 'sim-1.0'])
+
+# Kernel clock ticks per second in /proc/stat
+USER_HZ = 100
+
+# Directories of the ECU tree that commands see at the root
+MAPPED_DIRECTORIES = ('proc', 'etc', 'var/log', 'data')
+
+KEV_DIRECTORY = 'data/kev'
+BOOT_LOG = 'var/log/dmesg'
+
+# Commands replaced by shims in <tree>/bin
+SHIMS = ('dmesg', 'pidof', 'nc', 'journalctl', 'task_trace')
+
+# Tasks of the task_trace shim: (name, period in ms, typical run time in ms)
+TRACE_TASKS = [('task_1ms', 1, 0.2), ('task_10ms', 10, 2.0), ('task_100ms', 100, 15.0)]
+
+mapped_path_pattern = re.compile(r"(?<![\w.$/-])/(" + '|'.join(re.escape(path) for path in MAPPED_DIRECTORIES) +
+                                 r")(?=[/\s;|&)'\"]|$)")
+
+filler_messages = [
+    'audit: type=1334 audit({0:.3f}:{1}): prog-id=12 op=LOAD',
+    'can0: bus-off recovery, restarting',
+    'eth0: Link is Up - 1Gbps/Full - flow control off',
+    'systemd-journald[201]: Data hash table of /run/log/journal is full',
+    'random: crng reseeded on system resumption',
+]
+
+
+class TcpService:
+    # Listener thread handing every connection to handler(connection) on a
+    # thread of its own. stop() closes the listener and all open connections.
+    def __init__(self, name, address, port, handler):
+        self.name = name
+        self.address = address
+        self.port = port
+        self.handler = handler
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((address, port))
+        self.listener.listen(16)
+        self.thread = threading.Thread(target=self.accept_loop, name=name, daemon=True)
+        self.thread.start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections.add(connection)
+            threading.Thread(target=self.serve, args=(connection,), name=f"{self.name}-session", daemon=True).start()
+
+    def serve(self, connection):
+        try:
+            self.handler(connection)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.connections.discard(connection)
+            connection.close()
+
+    def stop(self):
+        close_listener(self.listener)
+        self.thread.join()
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class BlackHole:
+    # A port of a powered off ECU: the listener's backlog is filled and never
+    # accepted, so further connects go unanswered as on a dead network instead
+    # of being refused, which is all loopback would otherwise do
+    def __init__(self, address, port):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((address, port))
+        self.listener.listen(0)
+        self.fillers = []
+        for _ in range(2):
+            filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            filler.setblocking(False)
+            try:
+                filler.connect((address, port))
+            except BlockingIOError:
+                pass
+            self.fillers.append(filler)
+
+    def stop(self):
+        for filler in self.fillers:
+            filler.close()
+        close_listener(self.listener)
+
+
+def close_listener(listener):
+    # shutdown() wakes a thread blocked in accept(), close() alone does not
+    try:
+        listener.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    listener.close()
+
+
+class SyntheticProc:
+    # The live files of <tree>/proc, rewritten just before a command reads them
+    def __init__(self, directory, profile, processes):
+        self.directory = directory
+        self.profile = profile
+        self.processes = processes  # [(pid, name, heap growth KiB/h)]
+        self.random = random.Random()
+        self.last = None
+        # Jiffies kept as floats, so frequent reads do not truncate every step to 0
+        self.cores = [[0.0] * 8 for _ in range(profile.cores)]
+        self.context_switches = 0
+        self.lock = threading.Lock()
+
+    def write(self, booted_at):
+        # Sessions read /proc concurrently, the counters advance once per call
+        with self.lock:
+            self.write_files(booted_at)
+
+    def write_files(self, booted_at):
+        now = time.monotonic()
+        uptime = now - booted_at
+        elapsed = 0.0 if self.last is None else now - self.last
+        self.last = now
+
+        # Counters only ever grow, by the time passed at a load that drifts
+        # slowly with a little noise on top
+        ticks = elapsed * USER_HZ
+        for index, counters in enumerate(self.cores):
+            load = self.profile.cpu_load * (1 + 0.3 * sinusoid(uptime, 60 + 7 * index)) + self.random.gauss(0, 0.03)
+            load = min(max(load, 0.0), 1.0)
+            busy = ticks * load
+            counters[0] += busy * 0.6
+            counters[2] += busy * 0.3
+            counters[5] += busy * 0.05
+            counters[6] += busy * 0.05
+            counters[3] += ticks - busy
+        self.context_switches += int(elapsed * 5000 * self.profile.cores)
+
+        total = [sum(values) for values in zip(*self.cores)]
+        stat = [format_cpu_line('cpu ', total)] + [format_cpu_line(f'cpu{index}', counters)
+                                                   for index, counters in enumerate(self.cores)]
+        stat += [f"ctxt {self.context_switches}", f"btime {int(time.time() - uptime)}",
+                 f"processes {300 + int(uptime)}", "procs_running 2", "procs_blocked 0"]
+        write_text(os.path.join(self.directory, 'stat'), '\n'.join(stat) + '\n')
+
+        used = self.profile.memory_load * (1 + 0.1 * sinusoid(uptime, 300)) + self.random.gauss(0, 0.005)
+        total_kib = self.profile.memory_kib
+        available = int(total_kib * (1 - min(max(used, 0.0), 1.0)))
+        write_text(os.path.join(self.directory, 'meminfo'),
+                   f"MemTotal:       {total_kib} kB\n"
+                   f"MemFree:        {available // 2} kB\n"
+                   f"MemAvailable:   {available} kB\n"
+                   f"Buffers:        {available // 16} kB\n"
+                   f"Cached:         {available // 4} kB\n"
+                   f"SwapTotal:      0 kB\n"
+                   f"SwapFree:       0 kB\n")
+
+        write_text(os.path.join(self.directory, 'uptime'), f"{uptime:.2f} {uptime * self.profile.cores * 0.6:.2f}\n")
+        write_text(os.path.join(self.directory, 'timer_list'),
+                   f"Timer List Version: v0.9\nHRTIMER_MAX_CLOCK_BASES: 8\nnow at {int(uptime * 1e9)} nsecs\n")
+
+        for pid, name, growth in self.processes:
+            heap = int(2048 + growth * uptime / 3600 + self.random.randint(0, 8))
+            arena = 1024 + self.random.randint(0, 4) * 4
+            process_directory = os.path.join(self.directory, str(pid))
+            os.makedirs(process_directory, exist_ok=True)
+            write_text(os.path.join(process_directory, 'comm'), name + '\n')
+            write_text(os.path.join(process_directory, 'smaps'),
+                       f"00400000-00452000 r-xp 00000000 b3:02 1234 /usr/bin/{name}\n"
+                       f"Size:                328 kB\nRss:                 296 kB\nSwap:                  0 kB\n"
+                       f"01a2b000-01b2b000 rw-p 00000000 00:00 0 [heap]\n"
+                       f"Size:               {heap} kB\nRss:                {heap} kB\nSwap:                  0 kB\n"
+                       f"7f3c000000-7f3c400000 rw-p 00000000 00:00 0\n"
+                       f"Size:               4096 kB\nRss:                {arena} kB\nSwap:                  0 kB\n")
+
+
+def format_cpu_line(name, counters):
+    return f"{name} " + ' '.join(str(int(value)) for value in counters) + " 0 0"
+
+
+def sinusoid(t, period):
+    return math.sin(2 * math.pi * t / period)
+
+
+def write_text(path, text):
+    # Replaced in one step, a command never reads a half written file
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        f.write(text)
+    os.replace(temporary_path, path)
+
+
+class SimulatedEcu:
+    # One ECU: its tree, services and power state. Timeline events (boot
+    # stages, log lines, KEV files) run on one scheduler thread in due order.
+    def __init__(self, name, address, telnet_port, ftp_port, username, password, directory, profile):
+        self.name = name
+        self.address = address
+        self.telnet_port = telnet_port
+        self.ftp_port = ftp_port
+        self.username = username
+        self.password = password
+        self.directory = directory
+        self.profile = profile
+        self.random = random.Random()
+
+        for path in MAPPED_DIRECTORIES + (KEV_DIRECTORY, 'bin'):
+            os.makedirs(os.path.join(directory, path), exist_ok=True)
+        write_shims(os.path.join(directory, 'bin'), directory, address)
+        self.flash(profile.firmware)
+        processes = [(400 + index * 17, process_name, growth)
+                     for index, (process_name, growth) in enumerate(sorted(profile.processes.items()))]
+        self.proc = SyntheticProc(os.path.join(directory, 'proc'), profile, processes)
+
+        self.booted_at = time.monotonic()
+        self.powered = False
+        self.telnet = None
+        self.ftp = None
+        self.black_holes = []
+        self.lock = threading.RLock()
+        self.shells = set()
+
+        self.events = []
+        self.order = itertools.count()
+        self.generation = 0
+        self.condition = threading.Condition(self.lock)
+        self.stopping = False
+        self.kev_sequence = 0
+        self.statistics = {'sessions': 0, 'command_lines': 0, 'ftp_files': 0, 'ftp_bytes': 0, 'kev_files': 0,
+                           'boots': 0}
+        self.thread = threading.Thread(target=self.run_events, name=f"Ecu-{name}", daemon=True)
+        self.thread.start()
+
+    def flash(self, firmware):
+        # A new image: later runs must not reuse results cached for the old one
+        write_text(os.path.join(self.directory, 'etc', 'version'), f"{firmware}\n")
+        write_text(os.path.join(self.directory, 'proc', 'version'),
+                   f"Linux version 5.10.0-{firmware} (builder@sim) #1 SMP PREEMPT\n")
+
+    # Power
+
+    def power(self, on, immediately=False):
+        # immediately: skip the boot and shutdown timelines (simulator start and stop)
+        with self.lock:
+            if on == self.powered and not immediately:
+                return
+            self.powered = on
+            self.generation += 1
+            self.events = []
+            if on:
+                self.boot(immediately)
+            else:
+                self.shut_down(immediately)
+            self.condition.notify_all()
+
+    def boot(self, immediately):
+        profile = self.profile
+        self.remove_black_holes()
+        kernel_start = 0.0 if immediately else self.vary(profile.kernel_start)
+        # Stage times from kernel start, in the target clock
+        network = self.vary(profile.network_ready - profile.kernel_start)
+        services = self.vary(profile.services_ready - profile.kernel_start)
+        application = self.vary(profile.app_ready - profile.kernel_start)
+
+        def start_kernel():
+            self.booted_at = time.monotonic()
+            self.proc.last = None
+            self.statistics['boots'] += 1
+            write_text(os.path.join(self.directory, BOOT_LOG), '')
+            self.log_line(0.0, "Booting Linux on physical CPU 0x0000000000 [0x411fd073]")
+            self.log_line(0.0, "Linux version 5.10.120-yocto-standard (oe-user@oe-host) (aarch64-poky-linux-gcc "
+                               "11.3.0) #1 SMP PREEMPT")
+
+        if immediately:
+            start_kernel()
+            self.booted_at -= profile.app_ready
+            for stage_time, message in self.boot_messages(network, services, application):
+                self.log_line(stage_time, message)
+            self.start_services()
+            self.schedule_recurring()
+            return
+
+        self.schedule(kernel_start, start_kernel)
+        for stage_time, message in self.boot_messages(network, services, application):
+            self.schedule(kernel_start + stage_time, lambda message=message: self.log_line(self.uptime(), message))
+        self.schedule(kernel_start + network, self.start_services)
+        self.schedule(kernel_start + application, self.schedule_recurring)
+
+    def boot_messages(self, network, services, application):
+        return [
+            (0.42, "Run /sbin/init as init process"),
+            (network - 0.05, "eth0: Link is Up - 1Gbps/Full - flow control off"),
+            (network, "systemd[1]: Started Telnet Server."),
+            (services, "systemd[1]: Reached target Multi-User System."),
+            (application, "app_manager[412]: Application ready"),
+        ]
+
+    def shut_down(self, immediately):
+        if immediately:
+            self.stop_services()
+            return
+        profile = self.profile
+        services_stop = self.vary(profile.services_stop)
+        network_down = max(self.vary(profile.network_down), services_stop + 0.05)
+        self.log_line(self.uptime(), "systemd[1]: Stopping Application Manager...")
+        self.schedule(services_stop * 0.5, lambda: self.log_line(self.uptime(), "systemd[1]: Stopped target Multi-User System."))
+        self.schedule(services_stop * 0.9, lambda: self.log_line(self.uptime(), "reboot: Power down"))
+        self.schedule(services_stop, self.stop_services)
+        self.schedule(network_down, self.network_off)
+
+    def network_off(self):
+        for port in (self.telnet_port, self.ftp_port):
+            try:
+                self.black_holes.append(BlackHole(self.address, port))
+            except OSError:
+                pass
+
+    def remove_black_holes(self):
+        for black_hole in self.black_holes:
+            black_hole.stop()
+        self.black_holes = []
+
+    def start_services(self):
+        if self.telnet is None:
+            self.telnet = TcpService(f"Telnet-{self.name}", self.address, self.telnet_port, self.serve_telnet)
+        if self.ftp is None:
+            self.ftp = TcpService(f"Ftp-{self.name}", self.address, self.ftp_port,
+                                  lambda connection: FtpSession(self, connection).serve())
+
+    def stop_services(self):
+        for service in (self.telnet, self.ftp):
+            if service is not None:
+                service.stop()
+        self.telnet = None
+        self.ftp = None
+        # Shells and their children go with the power, like the telnet sessions
+        for process in list(self.shells):
+            kill_process_group(process)
+
+    def close(self):
+        with self.lock:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.stop_services()
+        self.remove_black_holes()
+
+    # Timeline
+
+    def vary(self, value):
+        return max(0.0, value * (1 + self.random.uniform(-self.profile.jitter, self.profile.jitter)))
+
+    def uptime(self):
+        return time.monotonic() - self.booted_at
+
+    def schedule(self, delay, action, generation=None):
+        with self.lock:
+            generation = self.generation if generation is None else generation
+            heapq.heappush(self.events, (time.monotonic() + delay, next(self.order), generation, action))
+            self.condition.notify_all()
+
+    def schedule_recurring(self):
+        generation = self.generation
+        if self.profile.log_rate > 0:
+            self.schedule(0.1, lambda: self.filler_lines(generation, 0.1), generation)
+        if self.profile.kev_rate > 0:
+            self.schedule(1 / self.profile.kev_rate, lambda: self.write_kev(generation), generation)
+
+    def run_events(self):
+        with self.lock:
+            while not self.stopping:
+                now = time.monotonic()
+                if self.events and self.events[0][0] <= now:
+                    _, _, generation, action = heapq.heappop(self.events)
+                    # Events of an earlier power state are dropped
+                    if generation == self.generation:
+                        try:
+                            action()
+                        except OSError:
+                            pass
+                    continue
+                self.condition.wait(self.events[0][0] - now if self.events else None)
+
+    def log_line(self, target_time, message):
+        with open(os.path.join(self.directory, BOOT_LOG), 'a') as f:
+            f.write(f"[{target_time:12.6f}] {message}\n")
+
+    def filler_lines(self, generation, interval):
+        count = int(self.profile.log_rate * interval + self.random.random())
+        uptime = self.uptime()
+        with open(os.path.join(self.directory, BOOT_LOG), 'a') as f:
+            for _ in range(count):
+                message = self.random.choice(filler_messages).format(time.time(), self.random.randint(1, 999))
+                f.write(f"[{uptime:12.6f}] {message}\n")
+        self.schedule(interval, lambda: self.filler_lines(generation, interval), generation)
+
+    def write_kev(self, generation):
+        directory = os.path.join(self.directory, KEV_DIRECTORY)
+        self.kev_sequence += 1
+        path = os.path.join(directory, f"kev_{self.kev_sequence:08d}.bin")
+        # Written under a hidden name and renamed, a listing never shows a partial file
+        temporary_path = os.path.join(directory, f".kev_{self.kev_sequence:08d}.tmp")
+        with open(temporary_path, 'wb') as f:
+            f.write(os.urandom(self.profile.kev_size))
+        os.replace(temporary_path, path)
+        self.statistics['kev_files'] += 1
+
+        expired = self.kev_sequence - self.profile.kev_keep
+        if expired > 0:
+            try:
+                os.remove(os.path.join(directory, f"kev_{expired:08d}.bin"))
+            except OSError:
+                pass
+        self.schedule(1 / self.profile.kev_rate, lambda: self.write_kev(generation), generation)
+
+    # Telnet
+
+    def serve_telnet(self, connection):
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = LineReader(connection)
+        connection.sendall(b"\r\nSimulated ECU " + self.name.encode() + b"\r\nlogin: ")
+        username = reader.read_line()
+        connection.sendall(b"Password: ")
+        password = reader.read_line()
+        if username is None or password is None:
+            return
+        if (username, password) != (self.username, self.password):
+            connection.sendall(b"\r\nLogin incorrect\r\n")
+            return
+        self.statistics['sessions'] += 1
+
+        environment = dict(os.environ, HOME='/',
+                           PATH=os.path.join(self.directory, 'bin') + os.pathsep + os.environ.get('PATH', ''))
+        # Output goes from the shell to the socket directly; only the input
+        # passes through here, to map the paths of the ECU tree
+        process = subprocess.Popen(['/bin/sh'], stdin=subprocess.PIPE, stdout=connection.fileno(),
+                                   stderr=subprocess.STDOUT, cwd=self.directory, env=environment,
+                                   start_new_session=True)
+        self.shells.add(process)
+        try:
+            while True:
+                line = reader.read_line()
+                if line is None:
+                    break
+                if '/proc' in line:
+                    self.proc.write(self.booted_at)
+                self.statistics['command_lines'] += 1
+                process.stdin.write((self.map_paths(line) + '\n').encode())
+                process.stdin.flush()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.shells.discard(process)
+            kill_process_group(process)
+
+    def map_paths(self, command):
+        return mapped_path_pattern.sub(lambda match: os.path.join(self.directory, match.group(1)), command)
+
+
+class LineReader:
+    # Lines from a telnet client; telnet commands (IAC ...) are dropped
+    def __init__(self, connection):
+        self.connection = connection
+        self.buffer = b''
+
+    def read_line(self):
+        while True:
+            # A CR or LF received can have been the option byte of a telnet command
+            match = re.search(rb'\r\n|\r\0|\r|\n', self.buffer)
+            if match is not None:
+                line, self.buffer = self.buffer[:match.start()], self.buffer[match.end():]
+                return line.decode(errors='replace')
+            data = self.connection.recv(65536)
+            if not data:
+                return None
+            self.buffer += data
+            while b'\xff' in self.buffer:
+                start = self.buffer.index(b'\xff')
+                if len(self.buffer) < start + 3:
+                    break
+                self.buffer = self.buffer[:start] + self.buffer[start + (2 if self.buffer[start + 1] == 0xFF else 3):]
+
+
+def kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, ProcessLookupError):
+        pass
+    try:
+        process.wait(1)
+    except subprocess.TimeoutExpired:
+        pass
+
+
+class FtpSession:
+    # Read-only FTP on the ECU tree: what FtpDownloader and ftplib use
+    # (MLSD/NLST listings, SIZE, REST and RETR over passive connections)
+    def __init__(self, ecu, connection):
+        self.ecu = ecu
+        self.connection = connection
+        self.reader = connection.makefile('rb')
+        self.directory = '/'
+        self.user = None
+        self.logged_in = False
+        self.passive = None
+        self.offset = 0
+
+    def reply(self, text):
+        self.connection.sendall(text.encode() + b'\r\n')
+
+    def serve(self):
+        self.reply("220 Simulated ECU FTP ready")
+        try:
+            while True:
+                line = self.reader.readline()
+                if not line:
+                    return
+                command, _, argument = line.decode(errors='replace').strip().partition(' ')
+                command = command.upper()
+                if command == 'QUIT':
+                    self.reply("221 Bye")
+                    return
+                handler = getattr(self, 'ftp_' + command.lower(), None)
+                if handler is None:
+                    self.reply(f"502 {command} not implemented")
+                elif not self.logged_in and command not in ('USER', 'PASS', 'FEAT', 'SYST', 'OPTS'):
+                    self.reply("530 Not logged in")
+                else:
+                    handler(argument)
+        finally:
+            if self.passive is not None:
+                self.passive.close()
+
+    def ftp_user(self, argument):
+        self.user = argument
+        self.reply("331 Password required")
+
+    def ftp_pass(self, argument):
+        if (self.user, argument) == (self.ecu.username, self.ecu.password):
+            self.logged_in = True
+            self.reply("230 Logged in")
+        else:
+            self.reply("530 Login incorrect")
+
+    def ftp_syst(self, argument):
+        self.reply("215 UNIX Type: L8")
+
+    def ftp_feat(self, argument):
+        self.reply("211-Features:\r\n MLSD\r\n SIZE\r\n REST STREAM\r\n EPSV\r\n211 End")
+
+    def ftp_opts(self, argument):
+        self.reply("200 OK")
+
+    def ftp_noop(self, argument):
+        self.reply("200 OK")
+
+    def ftp_type(self, argument):
+        self.reply("200 Type set")
+
+    def ftp_pwd(self, argument):
+        self.reply(f'257 "{self.directory}"')
+
+    def ftp_cwd(self, argument):
+        path = self.remote_path(argument)
+        if not os.path.isdir(self.local_path(path)):
+            self.reply("550 No such directory")
+            return
+        self.directory = path
+        self.reply("250 OK")
+
+    def ftp_pasv(self, argument):
+        port = self.open_passive()
+        address = self.connection.getsockname()[0].replace('.', ',')
+        self.reply(f"227 Entering Passive Mode ({address},{port >> 8},{port & 0xFF})")
+
+    def ftp_epsv(self, argument):
+        self.reply(f"229 Entering Extended Passive Mode (|||{self.open_passive()}|)")
+
+    def open_passive(self):
+        if self.passive is not None:
+            self.passive.close()
+        self.passive = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.passive.bind((self.connection.getsockname()[0], 0))
+        self.passive.listen(1)
+        self.passive.settimeout(10)
+        return self.passive.getsockname()[1]
+
+    def data_connection(self):
+        if self.passive is None:
+            self.reply("425 Use PASV first")
+            return None
+        try:
+            connection, _ = self.passive.accept()
+        except OSError:
+            self.reply("425 No data connection")
+            return None
+        finally:
+            self.passive.close()
+            self.passive = None
+        return connection
+
+    def ftp_mlsd(self, argument):
+        local_path = self.local_path(self.remote_path(argument))
+        if not os.path.isdir(local_path):
+            self.reply("550 No such directory")
+            return
+        lines = []
+        for entry in sorted(os.scandir(local_path), key=lambda entry: entry.name):
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                lines.append(f"type=dir; {entry.name}")
+            else:
+                lines.append(f"type=file;size={entry.stat().st_size}; {entry.name}")
+        self.send_listing(lines)
+
+    def ftp_nlst(self, argument):
+        remote_path = self.remote_path(argument)
+        local_path = self.local_path(remote_path)
+        if not os.path.isdir(local_path):
+            self.reply("550 No such directory")
+            return
+        self.send_listing([posixpath.join(argument, name) if argument else name
+                           for name in sorted(os.listdir(local_path)) if not name.startswith('.')])
+
+    def send_listing(self, lines):
+        self.reply("150 Listing")
+        connection = self.data_connection()
+        if connection is None:
+            return
+        with connection:
+            connection.sendall(''.join(line + '\r\n' for line in lines).encode())
+        self.reply("226 Done")
+
+    def ftp_size(self, argument):
+        local_path = self.local_path(self.remote_path(argument))
+        if not os.path.isfile(local_path):
+            self.reply("550 No such file")
+            return
+        self.reply(f"213 {os.path.getsize(local_path)}")
+
+    def ftp_rest(self, argument):
+        self.offset = int(argument) if argument.isdigit() else 0
+        self.reply(f"350 Restarting at {self.offset}")
+
+    def ftp_retr(self, argument):
+        offset, self.offset = self.offset, 0
+        local_path = self.local_path(self.remote_path(argument))
+        try:
+            f = open(local_path, 'rb')
+        except OSError:
+            self.reply("550 No such file")
+            return
+        with f:
+            self.reply("150 Sending")
+            connection = self.data_connection()
+            if connection is None:
+                return
+            with connection:
+                sent = connection.sendfile(f, offset)
+            self.ecu.statistics['ftp_files'] += 1
+            self.ecu.statistics['ftp_bytes'] += sent
+        self.reply("226 Transfer complete")
+
+    def remote_path(self, argument):
+        return posixpath.normpath(posixpath.join(self.directory, argument or '.'))
+
+    def local_path(self, remote_path):
+        # normpath of an absolute path never climbs above "/"
+        return os.path.join(self.ecu.directory, *[part for part in remote_path.split('/') if part])
+
+
+# Shims
+
+SHIM_TEMPLATE = """#!{python}
+import sys
+sys.path.insert(0, {package!r})
+from ecu_simulator import run_shim
+sys.exit(run_shim({name!r}, {directory!r}, {address!r}, sys.argv[1:]))
+"""
+
+
+def write_shims(bin_directory, directory, address):
+    package = os.path.dirname(os.path.abspath(__file__))
+    for name in SHIMS:
+        path = os.path.join(bin_directory, name)
+        with open(path, 'w') as f:
+            f.write(SHIM_TEMPLATE.format(python=sys.executable, package=package, name=name, directory=directory,
+                                         address=address))
+        os.chmod(path, 0o755)
+
+
+def run_shim(name, directory, address, arguments):
+    if name == 'dmesg':
+        return shim_dmesg(os.path.join(directory, BOOT_LOG), arguments)
+    if name == 'pidof':
+        return shim_pidof(os.path.join(directory, 'proc'), arguments)
+    if name == 'nc':
+        return shim_nc(address, arguments)
+    if name == 'task_trace':
+        return shim_task_trace(arguments)
+    # No journal on the simulated ECU, the boot log is all in dmesg
+    return 1
+
+
+def shim_dmesg(path, arguments):
+    follow = '-w' in arguments or '--follow' in arguments
+    with open(path, 'r') as f:
+        sys.stdout.write(f.read())
+        sys.stdout.flush()
+        # A new boot truncates the log; following ends there like on the target
+        while follow:
+            line = f.readline()
+            if line:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            else:
+                time.sleep(0.01)
+                if os.path.getsize(path) < f.tell():
+                    return 0
+    return 0
+
+
+def shim_pidof(directory, names):
+    pids = []
+    for entry in os.listdir(directory):
+        if entry.isdigit():
+            try:
+                with open(os.path.join(directory, entry, 'comm')) as f:
+                    if f.read().strip() in names:
+                        pids.append(int(entry))
+            except OSError:
+                pass
+    if not pids:
+        return 1
+    print(' '.join(str(pid) for pid in sorted(pids, reverse=True)))
+    return 0
+
+
+def shim_nc(address, arguments):
+    # The busybox netcat forms the Throughput KPI uses: "nc host port",
+    # "nc -u -w 1 host port" and "nc -l -p port"; a listener is on the ECU's
+    # own address, like on the target
+    udp = '-u' in arguments
+    listen = '-l' in arguments
+    port = None
+    positional = []
+    index = 0
+    while index < len(arguments):
+        argument = arguments[index]
+        if argument in ('-p', '-w'):
+            if argument == '-p':
+                port = int(arguments[index + 1])
+            index += 2
+            continue
+        if not argument.startswith('-'):
+            positional.append(argument)
+        index += 1
+
+    stdin = sys.stdin.buffer
+    if listen:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((address, port))
+            listener.listen(1)
+            connection, _ = listener.accept()
+            with connection:
+                buffer = bytearray(1 << 20)
+                while connection.recv_into(buffer):
+                    pass
+        return 0
+
+    host, port = positional[0], int(positional[1])
+    if udp:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            while True:
+                data = stdin.read1(1024)
+                if not data:
+                    break
+                sock.sendto(data, (host, port))
+        return 0
+    with socket.create_connection((host, port)) as connection:
+        while True:
+            data = stdin.read1(1 << 16)
+            if not data:
+                break
+            connection.sendall(data)
+    return 0
+
+
+def shim_task_trace(arguments):
+    # "<seconds> <task> start|end" for the tasks of TRACE_TASKS over the
+    # given number of seconds (default 1), in time order
+    duration = float(arguments[0]) if arguments else 1.0
+    generator = random.Random()
+    events = []
+    for name, period, run_time in TRACE_TASKS:
+        start = 0.0
+        while start < duration * 1000:
+            release = start + max(generator.gauss(0, period * 0.02), -period * 0.5)
+            end = release + run_time * generator.uniform(0.5, 1.5)
+            events.append((release / 1000, name, 'start'))
+            events.append((end / 1000, name, 'end'))
+            start += period
+    events.sort()
+    sys.stdout.write(''.join(f"{seconds:.6f} {name} {event}\n" for seconds, name, event in events))
+    return 0
+
+
+# Simulator
+
+class EcuSimulator:
+    def __init__(self, count, address='127.0.0.1', telnet_port=DEFAULT_TELNET_PORT, ftp_port=DEFAULT_FTP_PORT,
+                 username=DEFAULT_USERNAME, password=DEFAULT_PASSWORD, profile=None, directory=None,
+                 address_per_ecu=False):
+        self.profile = profile if profile is not None else SimulationProfile()
+        self.own_directory = directory is None
+        self.directory = directory if directory is not None else tempfile.mkdtemp(prefix='ecu_simulator_')
+        self.ecus = []
+        for index in range(count):
+            if address_per_ecu:
+                # Addresses counting up, all on the same ports, for the GUI which only takes an IP
+                ecu_address, ecu_telnet_port, ecu_ftp_port = offset_address(address, index), telnet_port, ftp_port
+            else:
+                ecu_address, ecu_telnet_port, ecu_ftp_port = address, telnet_port + index, ftp_port + index
+            name = f"ECU{index + 1}"
+            self.ecus.append(SimulatedEcu(name, ecu_address, ecu_telnet_port, ecu_ftp_port, username, password,
+                                          os.path.join(self.directory, name), self.profile))
+        self.relay = None
+
+    def start(self):
+        from relay_driver import RelayStandIn
+
+        for ecu in self.ecus:
+            ecu.power(True, immediately=True)
+        self.relay = RelayStandIn(on_switch=self.on_relay)
+        self.relay.start()
+
+    def on_relay(self, channel, on):
+        for ecu in self.ecus:
+            ecu.power(on)
+
+    def stop(self):
+        if self.relay is not None:
+            self.relay.stop()
+        for ecu in self.ecus:
+            ecu.close()
+        if self.own_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def bench(self, name='Simulator'):
+        from kpi_engine import Bench, EcuTarget
+
+        ecus = [EcuTarget(ecu.name, ecu.address, ecu.username, ecu.password, ecu.username, ecu.password,
+                          str(ecu.telnet_port), str(ecu.ftp_port)) for ecu in self.ecus]
+        return Bench(name, ecus, self.relay.path if self.relay is not None else '', '9600')
+
+
+def is_loopback(address):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(address)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def offset_address(address, offset):
+    packed = int.from_bytes(socket.inet_aton(address), 'big') + offset
+    return socket.inet_ntoa(packed.to_bytes(4, 'big'))
+
+
+def parse_processes(text):
+    # "app_manager:0,diag_server:120" -> {name: heap growth KiB/h}
+    processes = {}
+    for part in text.split(','):
+        name, _, growth = part.strip().partition(':')
+        if name:
+            processes[name] = float(growth or 0)
+    return processes
+
+
+def main(argv=None):
+    defaults = SimulationProfile()
+    parser = argparse.ArgumentParser(description="Serve simulated ECUs on localhost for benchmark and regression runs.")
+    parser.add_argument('--ecus', type=int, default=2, help="Number of simulated ECUs (default 2)")
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--allow-remote', action='store_true',
+                        help="Allow a non-loopback --address. Every client that logs in (default root/root, over "
+                             "cleartext telnet) gets a shell on this host as the user running the simulator")
+    parser.add_argument('--telnet-port', type=int, default=DEFAULT_TELNET_PORT,
+                        help=f"Telnet port of the first ECU, the others count up (default {DEFAULT_TELNET_PORT})")
+    parser.add_argument('--ftp-port', type=int, default=DEFAULT_FTP_PORT,
+                        help=f"FTP port of the first ECU, the others count up (default {DEFAULT_FTP_PORT})")
+    parser.add_argument('--address-per-ecu', action='store_true',
+                        help="One address per ECU counting up from --address, all on the same ports; with "
+                             "--telnet-port 23 --ftp-port 21 the GUI can reach them")
+    parser.add_argument('--username', default=DEFAULT_USERNAME)
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--directory', help="Where the ECU trees are kept (default: a temporary directory)")
+    parser.add_argument('--cores', type=int, default=defaults.cores)
+    parser.add_argument('--cpu-load', type=float, default=defaults.cpu_load, help="Busy fraction, 0-1")
+    parser.add_argument('--memory-load', type=float, default=defaults.memory_load, help="Used fraction, 0-1")
+    parser.add_argument('--processes', default=','.join(f"{name}:{growth:g}" for name, growth in defaults.processes.items()),
+                        help="Processes and their heap growth, e.g. app_manager:0,diag_server:120 (KiB/h)")
+    parser.add_argument('--log-rate', type=float, default=defaults.log_rate, help="Log lines per second")
+    parser.add_argument('--kev-rate', type=float, default=defaults.kev_rate, help="KEV files per second")
+    parser.add_argument('--kev-size', type=int, default=defaults.kev_size, help="Bytes per KEV file")
+    parser.add_argument('--boot-time', type=float, default=defaults.app_ready,
+                        help="Seconds from IG ON to the application ready line; the other stages scale with it")
+    parser.add_argument('--shutdown-time', type=float, default=defaults.network_down,
+                        help="Seconds from IG OFF to the network going down; the services stop before")
+    parser.add_argument('--firmware', default=defaults.firmware,
+                        help=f"Firmware version the ECUs report in /etc/version (default {defaults.firmware})")
+    parser.add_argument('--bench', help="Write a bench configuration for kpi_runner.py / bench_scheduler.py")
+    arguments = parser.parse_args(argv)
+
+    addresses = [arguments.address]
+    if arguments.address_per_ecu:
+        addresses.append(offset_address(arguments.address, arguments.ecus - 1))
+    remote = [address for address in addresses if not is_loopback(address)]
+    if remote and not arguments.allow_remote:
+        print(f"{remote[0]} is not a loopback address: the simulated ECUs hand out real shells on this host. "
+              f"Pass --allow-remote to serve them on the network anyway.", file=sys.stderr)
+        return 2
+
+    boot_scale = arguments.boot_time / defaults.app_ready
+    shutdown_scale = arguments.shutdown_time / defaults.network_down
+    profile = defaults._replace(
+        cores=arguments.cores, cpu_load=arguments.cpu_load, memory_load=arguments.memory_load,
+        processes=parse_processes(arguments.processes), log_rate=arguments.log_rate, kev_rate=arguments.kev_rate,
+        kev_size=arguments.kev_size, firmware=arguments.firmware,
+        kernel_start=defaults.kernel_start * boot_scale, network_ready=defaults.network_ready * boot_scale,
+        services_ready=defaults.services_ready * boot_scale, app_ready=arguments.boot_time,
+        services_stop=defaults.services_stop * shutdown_scale, network_down=arguments.shutdown_time)
+
+    try:
+        simulator = EcuSimulator(arguments.ecus, arguments.address, arguments.telnet_port, arguments.ftp_port,
+                                 arguments.username, arguments.password, profile, arguments.directory,
+                                 arguments.address_per_ecu)
+        simulator.start()
+    except OSError as e:
+        print(f"Cannot start the simulator: {e}")
+        return 1
+
+    bench = simulator.bench()
+    for ecu in simulator.ecus:
+        print(f"{ecu.name}: {ecu.address} telnet {ecu.telnet_port}, FTP {ecu.ftp_port}, "
+              f"user {ecu.username} / {ecu.password}, tree {ecu.directory}")
+    print(f"Relay stand-in: {bench.relay_port}")
+    if arguments.bench:
+        from kpi_engine import bench_to_dict
+
+        with open(arguments.bench, 'w') as f:
+            json.dump(dict(bench_to_dict(bench), kpis=[]), f, indent=4)
+        print(f"Bench configuration written to {arguments.bench}")
+    print("Ctrl+C to stop")
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signal_number, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: stop_event.set())
+    started = time.monotonic()
+    while not stop_event.wait(0.5):
+        pass
+
+    simulator.stop()
+    elapsed = time.monotonic() - started
+    for ecu in simulator.ecus:
+        statistics = ecu.statistics
+        print(f"{ecu.name}: {statistics['sessions']} telnet sessions, {statistics['command_lines']} command lines "
+              f"({statistics['command_lines'] / elapsed:.1f}/s), {statistics['ftp_files']} files / "
+              f"{statistics['ftp_bytes'] / 1e6:.1f} MB over FTP, {statistics['kev_files']} KEV files, "
+              f"{statistics['boots']} boots")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import errno
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+
+# Host time of every measured event. time.monotonic() advances in 15.6 ms steps
+# on Windows bench PCs; perf_counter resolves well below a microsecond there too.
+timestamp = time.perf_counter
+
+# Target monotonic clock: the timer list has it in nanoseconds, /proc/uptime
+# (10 ms steps) is the fallback on kernels built without it
+TARGET_CLOCK_COMMAND = "grep -m1 '^now at' /proc/timer_list 2>/dev/null || cat /proc/uptime"
+
+# Readings of the target clock taken to map it onto the host clock
+CLOCK_READINGS = 8
+
+# Interpreter thread switch interval while a capture runs (default 5 ms): a
+# capture thread woken by I/O waits at most this long for busy Python threads
+CAPTURE_SWITCH_INTERVAL = 0.0005
+
+# Windows THREAD_PRIORITY_TIME_CRITICAL and the Linux nice value of capture threads
+WINDOWS_CAPTURE_PRIORITY = 15
+LINUX_CAPTURE_NICE = -10
+
+# Outcomes of a PortProbe
+PROBE_ACCEPTED = 'accepted'
+PROBE_REFUSED = 'refused'
+PROBE_NO_ANSWER = 'no answer'
+
+# "[    3.141592] ..." as printed by dmesg (optionally with its "<6>" level)
+# and by journalctl -o short-monotonic
+monotonic_line_pattern = re.compile(r'^(?:<\d+>)?\[\s*(\d+\.\d+)\]\s?(.*)$')
+
+
+def parse_target_clock(output):
+    # Returns (seconds since boot, resolution in seconds)
+    text = output.strip()
+    if text.startswith('now at'):
+        return int(text.split()[2]) / 1e9, 1e-9
+    return float(text.split()[0]), 0.01
+
+
+class TargetClock:
+    # Maps the target's monotonic clock, which its kernel and journal stamp
+    # their lines with, onto the host clock. Every reading is bracketed by two
+    # host timestamps and the one with the shortest round trip is kept: it
+    # leaves the least room for when the target actually read its clock.
+    def __init__(self, boot_time, uncertainty):
+        self.boot_time = boot_time  # host time at which the target clock was 0
+        self.uncertainty = uncertainty
+
+    @classmethod
+    def measure(cls, session, readings=CLOCK_READINGS):
+        best = None
+        for _ in range(readings):
+            sent = timestamp()
+            status, output = session.run(TARGET_CLOCK_COMMAND)
+            received = timestamp()
+            if status != 0:
+                raise ValueError(f"Cannot read the target clock: {output.strip()}")
+            target_time, resolution = parse_target_clock(output)
+            if best is None or received - sent < best[1] - best[0]:
+                best = (sent, received, target_time, resolution)
+
+        sent, received, target_time, resolution = best
+        return cls((sent + received) / 2 - target_time, (received - sent) / 2 + resolution)
+
+    def to_host(self, target_time):
+        return self.boot_time + target_time
+
+
+class BootMarkers:
+    # Earliest line matching each stage's regex, fed line by line from the
+    # target's boot log. Only lines carrying a monotonic timestamp count.
+    def __init__(self, stages):
+        # stages: [(name, compiled regex)]
+        self.stages = stages
+        self.found = {}
+
+    def feed(self, line):
+        match = monotonic_line_pattern.match(line)
+        if not match:
+            return
+        target_time = float(match.group(1))
+        text = match.group(2)
+        for name, pattern in self.stages:
+            if pattern.search(text) and (name not in self.found or target_time < self.found[name][0]):
+                self.found[name] = (target_time, text)
+
+    def complete(self):
+        return len(self.found) == len(self.stages)
+
+
+def raise_thread_priority():
+    # Best effort, for the calling thread only. Returns False where the OS
+    # refuses (a Linux user without CAP_SYS_NICE), the capture still works.
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            return bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(), WINDOWS_CAPTURE_PRIORITY))
+        # On Linux the nice value of a thread ID applies to that thread alone
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), LINUX_CAPTURE_NICE)
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+class PortProbe:
+    # Non-blocking TCP connect to one port of the target. Accepted: the service
+    # is up. Refused: the target's network stack still answers but the service
+    # is gone. No answer within the timeout: the target is off the network.
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.sock = None
+
+    def start(self):
+        self.close()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        error = self.sock.connect_ex((self.host, self.port))
+        if error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK)):
+            return None
+        self.close()
+        return self.outcome(error)
+
+    def finish(self):
+        # Called once select() reported the socket writable or in error
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        self.close()
+        return PROBE_ACCEPTED if error == 0 else self.outcome(error)
+
+    def outcome(self, error):
+        if error in (errno.ECONNREFUSED, getattr(errno, 'WSAECONNREFUSED', errno.ECONNREFUSED)):
+            return PROBE_REFUSED
+        return PROBE_NO_ANSWER
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+
+
+class CaptureThread(threading.Thread):
+    # Thread that only waits for I/O and timestamps what arrives. Events are
+    # queued as (kind, time, data) and interpreted by the KPI worker, so no
+    # parsing, logging or GUI work sits between an event and its timestamp.
+    switch_lock = threading.Lock()
+    running_captures = 0
+    saved_switch_interval = None
+
+    def __init__(self, name, capture):
+        super().__init__(name=name, daemon=True)
+        # capture(thread) runs the loop: it waits on I/O until thread.stop_event
+        # is set and hands what arrives to thread.add_event()
+        self.capture = capture
+        self.events = deque()
+        self.stop_event = threading.Event()
+        self.priority_raised = False
+        self.error = None
+        self.stopped = False
+
+    def start(self):
+        with CaptureThread.switch_lock:
+            if CaptureThread.running_captures == 0:
+                CaptureThread.saved_switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(CAPTURE_SWITCH_INTERVAL)
+            CaptureThread.running_captures += 1
+        super().start()
+
+    def run(self):
+        self.priority_raised = raise_thread_priority()
+        try:
+            self.capture(self)
+        except Exception as e:
+            self.error = e
+
+    def add_event(self, kind, time_stamp, data=None):
+        self.events.append((kind, time_stamp, data))
+
+    def take_events(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+    def stop(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.stop_event.set()
+        self.join()
+        with CaptureThread.switch_lock:
+            CaptureThread.running_captures -= 1
+            if CaptureThread.running_captures == 0:
+                sys.setswitchinterval(CaptureThread.saved_switch_interval)
@@ -0,0 +1,53 @@
+import os
+
+from execution_trace import (FUNCTION_NAMES_FILE, PERCENTILES, TRACE_SUFFIX, function_statistics, load_function_names,
+                             load_trace, pair_calls)
+
+
+SUMMARY_HEADER = ['function', 'calls', 'min (us)', 'mean (us)'] + [f"p{percent:g} (us)" for percent in PERCENTILES] + [
+    'max (us)']
+
+
+def run(context):
+    config = context.config()
+    max_execution_time = config['max_execution_time']
+
+    files = context.download_logs([config['trace_directory']])
+    trace_paths = [local_path for _, local_path, _ in files if local_path.endswith(TRACE_SUFFIX)]
+    name_paths = [local_path for _, local_path, _ in files if os.path.basename(local_path) == FUNCTION_NAMES_FILE]
+    if not trace_paths:
+        context.log(f"No {TRACE_SUFFIX} files in {config['trace_directory']}, result not evaluated")
+        return None
+    context.progress(50)
+
+    names = load_function_names(name_paths[0]) if name_paths else {}
+    records = load_trace(trace_paths)
+    functions, durations, unmatched = pair_calls(records)
+    context.log(f"{records.size} trace records from {len(trace_paths)} files, {functions.size} calls, "
+                f"{unmatched} unmatched entries or exits")
+    if not functions.size:
+        context.log("No complete calls in the trace, result not evaluated")
+        return None
+
+    statistics = function_statistics(functions, durations)
+    context.progress(90)
+
+    # Slowest functions first
+    order = statistics['max'].argsort()[::-1]
+    sheet = context.report_sheet(SUMMARY_HEADER, title=f"{context.ecu.name} Execution Time")
+    rows = []
+    for index in order.tolist():
+        function = int(statistics['function'][index])
+        rows.append([names.get(function, f"0x{function:x}"), int(statistics['calls'][index])] + [
+            round(float(statistics[key][index]) / 1e3, 3)
+            for key in ['min', 'mean'] + [f"p{percent:g}" for percent in PERCENTILES] + ['max']
+        ])
+    sheet.append(rows)
+
+    over = [row for row in rows if row[-1] > max_execution_time]
+    for row in over[:10]:
+        context.log(f"{row[0]}: max {row[-1]:.3f} us above {max_execution_time:g} us ({row[1]} calls)")
+    if len(over) > 10:
+        context.log(f"{len(over) - 10} more functions above the limit")
+    context.log(f"{len(rows)} functions, {len(over)} above {max_execution_time:g} us")
+    return not over
@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+
+
+# One function entry or exit as written by the target's instrumentation hooks
+TRACE_RECORD = np.dtype([
+    ('time', '<u8'),      # nanoseconds, target monotonic clock
+    ('function', '<u4'),  # function id, see FUNCTION_NAMES_FILE
+    ('thread', '<u2'),
+    ('event', 'u1'),      # ENTRY or EXIT
+    ('reserved', 'u1')
+])
+ENTRY = 1
+EXIT = 0
+
+TRACE_SUFFIX = '.trace'
+
+# "<id> <name>" per line, ids in decimal or 0x hex
+FUNCTION_NAMES_FILE = 'functions.txt'
+
+PERCENTILES = (50, 99, 99.9)
+
+
+def load_trace(paths):
+    # Raw records straight into a structured array, no per-record parsing
+    parts = [np.fromfile(path, dtype=TRACE_RECORD, count=os.path.getsize(path) // TRACE_RECORD.itemsize)
+             for path in sorted(paths)]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=TRACE_RECORD)
+
+
+def load_function_names(path):
+    names = {}
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            fields = line.split(None, 1)
+            if len(fields) == 2:
+                try:
+                    names[int(fields[0], 0)] = fields[1].strip()
+                except ValueError:
+                    pass
+    return names
+
+
+def function_digits(functions):
+    return [(functions & 0xFFFF).astype(np.uint16), (functions >> 16).astype(np.uint16)]
+
+
+def radix_order(order, digits):
+    # Refines order by the 16-bit digits, least significant first. Stable sorts
+    # on 16-bit integers use numpy's radix sort, faster than a lexsort
+    for digit in digits:
+        if digit.any():
+            order = order[np.argsort(digit[order], kind='stable')]
+    return order
+
+
+def pair_calls(records):
+    # Matches every exit with its entry, per thread and function, recursion
+    # included. Returns (function ids, durations in ns, unmatched records).
+    count = records.size
+    if not count:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64), 0
+
+    # Group by (thread, function), in time order within each group
+    order = np.argsort(records['time'], kind='stable')
+    order = radix_order(order, function_digits(records['function']) + [records['thread']])
+    function = records['function'][order]
+    thread = records['thread'][order]
+    time = records['time'][order].astype(np.int64)
+    entry = records['event'][order] == ENTRY
+
+    group_start = np.empty(count, dtype=bool)
+    group_start[0] = True
+    group_start[1:] = (function[1:] != function[:-1]) | (thread[1:] != thread[:-1])
+    group = np.cumsum(group_start)
+
+    # Call depth within the group: an entry opens the level it raises the depth
+    # to, an exit closes the level it lowers the depth from
+    step = np.where(entry, 1, -1)
+    depth = np.cumsum(step)
+    starts = np.flatnonzero(group_start)
+    depth -= np.repeat(depth[starts] - step[starts], np.diff(np.append(starts, count)))
+    level = np.where(entry, depth, depth + 1)
+
+    # Per group and level, calls follow each other: entry, exit, entry, exit...
+    # The records are in time order per group already, so a stable sort on one
+    # combined (group, level) key keeps it
+    lowest = level.min()
+    order = np.argsort(group * (int(level.max() - lowest) + 1) + (level - lowest), kind='stable')
+    entry, group, level, time, function = entry[order], group[order], level[order], time[order], function[order]
+    matched = np.flatnonzero(entry[:-1] & ~entry[1:] & (group[:-1] == group[1:]) & (level[:-1] == level[1:]))
+
+    return function[matched], time[matched + 1] - time[matched], count - 2 * matched.size
+
+
+def function_statistics(functions, durations):
+    # Per function: sort by (function, duration), then every statistic is a
+    # lookup or a reduceat over the group boundaries, no Python loop per call
+    if not functions.size:
+        return {}
+    order = radix_order(np.argsort(durations), function_digits(functions))
+    functions = functions[order]
+    durations = durations[order]
+
+    starts = np.flatnonzero(np.concatenate(([True], functions[1:] != functions[:-1])))
+    counts = np.diff(np.append(starts, functions.size))
+    statistics = {
+        'function': functions[starts],
+        'calls': counts,
+        'min': durations[starts],
+        'mean': np.add.reduceat(durations, starts) / counts,
+        'max': durations[starts + counts - 1]
+    }
+    for percent in PERCENTILES:
+        rank = np.maximum(np.ceil(percent / 100.0 * counts).astype(np.int64), 1)
+        statistics[f"p{percent:g}"] = durations[starts + rank - 1]
+    return statistics
@@ -0,0 +1,192 @@
+import ftplib
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+FTP_PORT = 21
+
+# Size of each read from the data connection and of the file write buffer
+CHUNK_SIZE = 1024 * 1024
+
+
+class FtpTransferError(Exception):
+    pass
+
+
+class FtpTransferStopped(FtpTransferError):
+    pass
+
+
+class FtpDownloader:
+    # Pulls whole directory trees from one target over several FTP connections.
+    # Files are written straight to disk as they arrive and a partially
+    # downloaded file is resumed with REST from its current local size.
+    def __init__(self, host, username, password, port=FTP_PORT, connections=4,
+                 chunk_size=CHUNK_SIZE, timeout=30, retries=3, stop_event=None):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port
+        self.connections = connections
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.retries = retries
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+
+        self.lock = threading.Lock()
+        self.bytes_done = 0
+        self.bytes_total = 0
+
+    def connect(self):
+        ftp = ftplib.FTP()
+        ftp.connect(self.host, self.port, timeout=self.timeout)
+        ftp.login(self.username, self.password)
+        ftp.voidcmd('TYPE I')
+        return ftp
+
+    def download_tree(self, remote_dirs, local_dir, progress=None):
+        # Returns the list of (remote_path, local_path, size) that were fetched
+        ftp = self.connect()
+        try:
+            files = []
+            for remote_dir in remote_dirs:
+                for remote_path, size in self.list_files(ftp, remote_dir):
+                    relative_path = posixpath.relpath(remote_path, posixpath.dirname(remote_dir.rstrip('/')) or '/')
+                    local_path = os.path.join(local_dir, *relative_path.split('/'))
+                    files.append((remote_path, local_path, size))
+        finally:
+            self.quit(ftp)
+
+        self.bytes_done = 0
+        self.bytes_total = sum(size for _, _, size in files if size is not None)
+
+        # Largest files first, so one big log does not end up alone at the tail
+        pending = sorted(files, key=lambda entry: entry[2] or 0, reverse=True)
+        pending_lock = threading.Lock()
+
+        def worker():
+            ftp = None
+            try:
+                while True:
+                    with pending_lock:
+                        if not pending:
+                            return
+                        remote_path, local_path, size = pending.pop(0)
+                    ftp = self.download_file(ftp, remote_path, local_path, size, progress)
+            finally:
+                if ftp is not None:
+                    self.quit(ftp)
+
+        worker_count = max(1, min(self.connections, len(files)))
+        with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix=f"FTP-{self.host}") as executor:
+            futures = [executor.submit(worker) for _ in range(worker_count)]
+            for future in futures:
+                future.result()
+
+        return files
+
+    def list_files(self, ftp, remote_dir):
+        try:
+            entries = [(name, facts.get('type'), facts.get('size'))
+                       for name, facts in ftp.mlsd(remote_dir, facts=['type', 'size'])]
+        except ftplib.error_perm:
+            entries = self.list_without_mlsd(ftp, remote_dir)
+
+        for name, entry_type, size in entries:
+            if name in ('.', '..') or entry_type in ('cdir', 'pdir'):
+                continue
+            path = posixpath.join(remote_dir, name)
+            if entry_type == 'dir':
+                yield from self.list_files(ftp, path)
+            else:
+                yield path, int(size) if size is not None else None
+
+    def list_without_mlsd(self, ftp, remote_dir):
+        entries = []
+        for path in ftp.nlst(remote_dir):
+            name = posixpath.basename(path.rstrip('/'))
+            try:
+                size = ftp.size(posixpath.join(remote_dir, name))
+                entries.append((name, 'file', size))
+            except ftplib.error_perm:
+                entries.append((name, 'dir', None))
+        return entries
+
+    def download_file(self, ftp, remote_path, local_path, size, progress=None):
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        # Bytes of this file already reported through progress
+        counted = 0
+
+        for attempt in range(self.retries + 1):
+            if self.stop_event.is_set():
+                raise FtpTransferStopped("Transfer stopped")
+
+            offset = os.path.getsize(local_path) if os.path.exists(local_path) else 0
+            if size is not None and offset > size:
+                offset = 0
+            self.add_progress(offset - counted, progress)
+            counted = offset
+
+            if size is not None and offset == size:
+                return ftp
+
+            try:
+                if ftp is None:
+                    ftp = self.connect()
+                self.retrieve(ftp, remote_path, local_path, offset, progress)
+                return ftp
+            except FtpTransferStopped:
+                raise
+            except ftplib.error_perm as e:
+                if offset and str(e).startswith('5') and 'REST' in str(e).upper():
+                    # Server without REST support, start the file over
+                    os.remove(local_path)
+                    continue
+                raise FtpTransferError(f"{remote_path}: {e}")
+            except ftplib.all_errors as e:
+                # Connection lost mid-file: drop it and resume from what is on disk
+                if ftp is not None:
+                    ftp.close()
+                ftp = None
+                counted = os.path.getsize(local_path) if os.path.exists(local_path) else 0
+                if attempt == self.retries:
+                    raise FtpTransferError(f"{remote_path}: {e}")
+                time.sleep(min(2 ** attempt, 10))
+
+        return ftp
+
+    def retrieve(self, ftp, remote_path, local_path, offset, progress):
+        mode = 'r+b' if offset else 'wb'
+        with open(local_path, mode, buffering=self.chunk_size) as f:
+            f.seek(offset)
+            f.truncate()
+
+            def write_chunk(data):
+                if self.stop_event.is_set():
+                    raise FtpTransferStopped("Transfer stopped")
+                f.write(data)
+                self.add_progress(len(data), progress)
+
+            ftp.retrbinary(f'RETR {remote_path}', write_chunk, self.chunk_size, rest=offset or None)
+
+    def add_progress(self, count, progress):
+        with self.lock:
+            self.bytes_done += count
+            bytes_done, bytes_total = self.bytes_done, self.bytes_total
+        if progress is not None and count:
+            progress(bytes_done, bytes_total)
+
+    def quit(self, ftp):
+        # quit() waits for the server's reply, up to the full timeout on a
+        # stalled target; after STOP the connection is just dropped
+        if self.stop_event.is_set():
+            ftp.close()
+            return
+        try:
+            ftp.quit()
+        except ftplib.all_errors:
+            ftp.close()
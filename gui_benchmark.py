@@ -0,0 +1,464 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+# Must be set before the QApplication exists
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PyQt5.QtCore import PYQT_VERSION_STR, QT_VERSION_STR, QEventLoop, Qt, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from utilization_chart import SERIES
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# GUI responsiveness benchmark, e.g.
+#   python gui_benchmark.py --baseline results/gui_benchmark_baseline.json
+# Builds the MainWindow offscreen and loads it the way a KPI run does: worker
+# threads call the engine listener (log lines, samples, status signals) while
+# the KPI rows are toggled on the GUI thread. Each scenario records how late
+# the event loop gets to a precise timer, how long a full repaint of the shown
+# tab takes and how the process memory grows. Results are written as JSON; a
+# previous result file passed as --baseline is compared metric by metric.
+
+RESULT_FILE = os.path.join('results', 'gui_benchmark.json')
+HISTORY_FILE = os.path.join('results', 'gui_benchmark_history.jsonl')
+
+CPU_LABEL = "CPU and Memory Utilization"
+
+# Load threads deliver in bursts this far apart, like a worker draining a socket
+TICK = 0.01
+
+PROBE_INTERVAL = 0.005
+FRAME_INTERVAL = 0.1
+MEMORY_INTERVAL = 0.25
+
+# Scenario -> (tab shown, loads applied)
+SCENARIOS = {
+    'idle': ('tester', ()),
+    'log_flood': ('console', ('log',)),
+    'sample_stream': ('chart', ('samples',)),
+    'status_updates': ('tester', ('status',)),
+    'row_toggles': ('tester', ('toggles',)),
+    'combined': ('console', ('log', 'samples', 'status', 'toggles')),
+}
+
+# (group, metric, noise floor): a change is a regression only when it is above
+# the tolerance and above the floor, so sub-millisecond jitter never fails a run
+COMPARED_METRICS = [
+    ('event_loop_latency_ms', 'p99', 2.0),
+    ('event_loop_latency_ms', 'max', 10.0),
+    ('frame_time_ms', 'p99', 2.0),
+    ('memory_mib', 'growth', 5.0),
+]
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+EXIT_USAGE = 2
+
+
+def resident_memory():
+    # Bytes, or None where neither psutil nor /proc is available
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def summary(values, scale=1.0):
+    if not values:
+        return {'count': 0}
+    values = np.asarray(values) * scale
+    return {
+        'count': int(values.size),
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3),
+        'max': round(float(values.max()), 3),
+    }
+
+
+class LoopProbe:
+    # A precise timer on the GUI thread: how late each timeout fires is how long
+    # the event loop was busy with something else
+    def __init__(self, interval=PROBE_INTERVAL):
+        self.interval = interval
+        self.latencies = []
+        self.last = None
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start(int(self.interval * 1000))
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        now = time.perf_counter()
+        self.latencies.append(max(0.0, now - self.last - self.interval))
+        self.last = now
+
+
+class FrameProbe:
+    # Repaints the whole window synchronously now and then and times it, which
+    # is what the widgets of the shown tab cost per frame
+    def __init__(self, window, interval=FRAME_INTERVAL):
+        self.window = window
+        self.frame_times = []
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.frame)
+        self.interval = interval
+
+    def start(self):
+        self.timer.start(int(self.interval * 1000))
+
+    def stop(self):
+        self.timer.stop()
+
+    def frame(self):
+        start = time.perf_counter()
+        self.window.repaint()
+        self.frame_times.append(time.perf_counter() - start)
+
+
+class MemoryProbe:
+    def __init__(self, interval=MEMORY_INTERVAL):
+        self.samples = []
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.sample)
+        self.interval = interval
+
+    def start(self):
+        self.sample()
+        self.timer.start(int(self.interval * 1000))
+
+    def stop(self):
+        self.timer.stop()
+        self.sample()
+
+    def sample(self):
+        rss = resident_memory()
+        if rss is not None:
+            self.samples.append(rss)
+
+    def result(self):
+        if not self.samples:
+            return {}
+        mib = [rss / (1 << 20) for rss in self.samples]
+        return {'start': round(mib[0], 1), 'peak': round(max(mib), 1), 'end': round(mib[-1], 1),
+                'growth': round(mib[-1] - mib[0], 1)}
+
+
+class LoadThread(threading.Thread):
+    # Calls step(first, count) with however many items are due to keep up
+    # `rate` per second; first numbers the items from the start
+    def __init__(self, rate, step, stop_event):
+        super().__init__(daemon=True)
+        self.rate = rate
+        self.step = step
+        self.stop_event = stop_event
+        self.count = 0
+
+    def run(self):
+        start = time.perf_counter()
+        while not self.stop_event.wait(TICK):
+            due = int((time.perf_counter() - start) * self.rate) - self.count
+            if due > 0:
+                self.step(self.count, due)
+                self.count += due
+
+
+class LogFlood:
+    # Log lines of every KPI on every ECU, through the sink the KPI workers use
+    def __init__(self, listener, labels, ecus):
+        self.listener = listener
+        self.sources = [(label, ecu) for label in labels for ecu in ecus]
+
+    def step(self, first, count):
+        for number in range(first, first + count):
+            label, ecu = self.sources[number % len(self.sources)]
+            self.listener.on_kpi_log(label, ecu, f"line {number}: sample output of {label} on {ecu}")
+
+
+class SampleStream:
+    # CPU and memory sample rows for every ECU; rate is rows per second per ECU
+    def __init__(self, listener, ecus, column_count, rate):
+        self.listener = listener
+        self.ecus = ecus
+        self.column_count = column_count
+        self.rate = rate
+        self.random = np.random.default_rng(0)
+
+    def step(self, first, count):
+        times = (np.arange(first, first + count) / self.rate)[:, None]
+        for ecu in self.ecus:
+            rows = np.hstack([times, self.random.uniform(0, 100, (count, self.column_count - 1))])
+            self.listener.on_samples(CPU_LABEL, ecu, rows)
+
+
+class StatusUpdates:
+    # KPI started, per-ECU progress and results, KPI finished, for every row in
+    # turn; these are queued signals, one GUI slot call each
+    def __init__(self, listener, labels, ecus):
+        self.listener = listener
+        self.events = []
+        for number, label in enumerate(labels):
+            self.events.append(('on_kpi_started', (label,)))
+            for ecu in ecus:
+                self.events.extend(('on_kpi_progress', (label, ecu, percent)) for percent in (25, 50, 75, 100))
+                self.events.append(('on_ecu_finished', (label, ecu, number % 3 != 2)))
+            self.events.append(('on_kpi_finished', (label, [True, False, None][number % 3])))
+
+    def step(self, first, count):
+        for number in range(first, first + count):
+            name, arguments = self.events[number % len(self.events)]
+            getattr(self.listener, name)(*arguments)
+
+
+class RowToggles:
+    # Checks and unchecks the KPI rows in turn on the GUI thread, which runs
+    # toggle_buttons and the configuration check of each row
+    def __init__(self, window, rate):
+        self.checkboxes = [checkbox for checkbox, _ in window.kpi_rows.values()]
+        self.count = 0
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.toggle)
+        self.interval = 1.0 / rate
+
+    def start(self):
+        self.timer.start(max(1, int(self.interval * 1000)))
+
+    def stop(self):
+        self.timer.stop()
+        for checkbox in self.checkboxes:
+            checkbox.setChecked(False)
+
+    def toggle(self):
+        checkbox = self.checkboxes[(self.count // 2) % len(self.checkboxes)]
+        checkbox.setChecked(not checkbox.isChecked())
+        self.count += 1
+
+
+class GuiBenchmark:
+    def __init__(self, window, arguments):
+        self.window = window
+        self.arguments = arguments
+
+        self.labels = list(window.kpi_rows)
+        self.ecus = [checkbox.text() for checkbox in
+                     (window.padas_checkbox, window.RCar_checkbox, window.SoC0_checkbox, window.SoC1_checkbox)]
+        self.tabs = {'tester': window.tab1, 'console': window.tab2, 'chart': window.tab4}
+
+        # The chart is built and reset for every ECU once, as on a run of the CPU KPI
+        window.ensure_tab(window.tab4)
+        window.kpi_ecu_states[CPU_LABEL] = {ecu: "Not Tested" for ecu in self.ecus}
+        window.utilization_chart.reset_from_config(self.ecus, window.config_service.get(CPU_LABEL))
+
+    def process_events(self, duration):
+        loop = QEventLoop()
+        QTimer.singleShot(int(duration * 1000), loop.quit)
+        loop.exec_()
+
+    def run(self, name):
+        tab, loads = SCENARIOS[name]
+        arguments = self.arguments
+        window = self.window
+        listener = window.kpi_engine
+
+        window.console.clear()
+        window.tab_widget.setCurrentWidget(self.tabs[tab])
+        gc.collect()
+        self.process_events(0.2)
+
+        stop_event = threading.Event()
+        threads = {}
+        if 'log' in loads:
+            threads['log_lines'] = LoadThread(arguments.log_rate, LogFlood(listener, self.labels, self.ecus).step,
+                                              stop_event)
+        if 'samples' in loads:
+            stream = SampleStream(listener, self.ecus, len(SERIES) + 1, arguments.sample_rate)
+            threads['sample_rows'] = LoadThread(arguments.sample_rate, stream.step, stop_event)
+        if 'status' in loads:
+            threads['status_updates'] = LoadThread(arguments.status_rate,
+                                                   StatusUpdates(listener, self.labels, self.ecus).step, stop_event)
+        toggles = RowToggles(window, arguments.toggle_rate) if 'toggles' in loads else None
+
+        for thread in threads.values():
+            thread.start()
+        if toggles is not None:
+            toggles.start()
+
+        # Measured once the load has settled in
+        self.process_events(arguments.warmup)
+        loop_probe = LoopProbe()
+        frame_probe = FrameProbe(window)
+        memory_probe = MemoryProbe()
+        counts = {key: thread.count for key, thread in threads.items()}
+        toggle_count = toggles.count if toggles is not None else 0
+        for probe in (loop_probe, frame_probe, memory_probe):
+            probe.start()
+        start = time.perf_counter()
+
+        self.process_events(arguments.duration)
+
+        elapsed = time.perf_counter() - start
+        for probe in (loop_probe, frame_probe, memory_probe):
+            probe.stop()
+        stop_event.set()
+        for thread in threads.values():
+            thread.join()
+        if toggles is not None:
+            toggles.stop()
+
+        rates = {key: round((thread.count - counts[key]) / elapsed) for key, thread in threads.items()}
+        if toggles is not None:
+            rates['row_toggles'] = round((toggles.count - toggle_count) / elapsed)
+
+        # What the console still has to insert once the load stops
+        backlog = len(window.console.pending)
+        self.process_events(0.2)
+
+        return {
+            'tab': tab,
+            'duration': round(elapsed, 3),
+            'event_loop_latency_ms': summary(loop_probe.latencies, 1000),
+            'frame_time_ms': summary(frame_probe.frame_times, 1000),
+            'memory_mib': memory_probe.result(),
+            'delivered_per_second': rates,
+            'console_backlog': backlog,
+        }
+
+
+def compare(results, baseline, tolerance):
+    # Returns the printed lines and the number of regressions
+    lines = []
+    regressions = 0
+    for name, scenario in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for group, metric, floor in COMPARED_METRICS:
+            old = previous.get(group, {}).get(metric)
+            new = scenario.get(group, {}).get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            regressed = new > old * (1 + tolerance / 100) and new - old > floor
+            regressions += regressed
+            lines.append(f"{name:16} {group + '.' + metric:28} {old:10.3f} {new:10.3f} {change:+8.1f}%"
+                         f"{'  REGRESSION' if regressed else ''}")
+    return lines, regressions
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Measure GUI responsiveness under KPI run load, offscreen.")
+    parser.add_argument('--scenario', action='append', dest='scenarios', choices=list(SCENARIOS),
+                        help="Scenario to run, may be repeated (default: all)")
+    parser.add_argument('--duration', type=float, default=5.0, help="Measured seconds per scenario (default: 5)")
+    parser.add_argument('--warmup', type=float, default=1.0,
+                        help="Seconds of load before measuring (default: 1)")
+    parser.add_argument('--log-rate', type=int, default=20000, help="Log lines per second (default: 20000)")
+    parser.add_argument('--sample-rate', type=int, default=100,
+                        help="Sample rows per second per ECU (default: 100)")
+    parser.add_argument('--status-rate', type=int, default=500, help="Status signals per second (default: 500)")
+    parser.add_argument('--toggle-rate', type=int, default=20, help="KPI row toggles per second (default: 20)")
+    parser.add_argument('--output', default=RESULT_FILE, help=f"Result file (default: {RESULT_FILE})")
+    parser.add_argument('--baseline', help="Earlier result file to compare with")
+    parser.add_argument('--tolerance', type=float, default=20.0,
+                        help="Percent a metric may grow over the baseline (default: 20)")
+    parser.add_argument('--list', action='store_true', help="List the scenarios and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+
+    if arguments.list:
+        for name, (tab, loads) in SCENARIOS.items():
+            print(f"{name:16} {tab:8} {', '.join(loads) or '-'}")
+        return EXIT_OK
+
+    # Read before the run, the output may overwrite the same file
+    baseline = None
+    if arguments.baseline:
+        if os.path.abspath(arguments.baseline) == os.path.abspath(arguments.output):
+            print(f"--baseline and --output are both {arguments.output}; copy the baseline or pass another --output",
+                  file=sys.stderr)
+            return EXIT_USAGE
+        with open(arguments.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    app = QApplication(sys.argv[:1])
+
+    # Importing the GUI starts its startup profile, which is of no use here
+    from Gen2_PF_Validation_GUI_pyqt5_final import MainWindow, profile
+    profile.stop_import_timing()
+
+    window = MainWindow()
+    window.show()
+    benchmark = GuiBenchmark(window, arguments)
+
+    results = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'platform': {'python': platform.python_version(), 'qt': QT_VERSION_STR, 'pyqt': PYQT_VERSION_STR,
+                     'qpa': app.platformName(), 'system': platform.platform()},
+        'settings': {key: getattr(arguments, key) for key in
+                     ('duration', 'warmup', 'log_rate', 'sample_rate', 'status_rate', 'toggle_rate')},
+        'kpi_rows': len(benchmark.labels),
+        'ecus': benchmark.ecus,
+        'scenarios': {}
+    }
+
+    for name in arguments.scenarios or list(SCENARIOS):
+        result = benchmark.run(name)
+        results['scenarios'][name] = result
+        latency = result['event_loop_latency_ms']
+        frame = result['frame_time_ms']
+        print(f"{name:16} loop p99 {latency.get('p99', 0):7.2f} ms, max {latency.get('max', 0):7.2f} ms, "
+              f"frame p99 {frame.get('p99', 0):7.2f} ms, memory {result['memory_mib'].get('growth', 0):+.1f} MiB",
+              flush=True)
+
+    window.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(arguments.output)), exist_ok=True)
+    with open(arguments.output, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    history = {'time': results['time']}
+    for name, result in results['scenarios'].items():
+        history[name] = {'loop_p99': result['event_loop_latency_ms'].get('p99'),
+                         'frame_p99': result['frame_time_ms'].get('p99')}
+    os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+    with open(HISTORY_FILE, 'a') as f:
+        f.write(json.dumps(history) + '\n')
+    print(f"Results written to {os.path.abspath(arguments.output)}")
+
+    if baseline is None:
+        return EXIT_OK
+
+    lines, regressions = compare(results, baseline, arguments.tolerance)
+    print(f"{'scenario':16} {'metric':28} {'baseline':>10} {'current':>10} {'change':>9}")
+    for line in lines:
+        print(line)
+    print(f"{regressions} regressions over {arguments.tolerance:g}%")
+    return EXIT_REGRESSION if regressions else EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
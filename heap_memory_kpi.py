@@ -0,0 +1,99 @@
+import re
+import time
+
+import numpy as np
+
+from heap_memory_tracker import SAMPLE_COMMAND, HeapTracker, SmapsParser
+
+
+SAMPLE_COLUMNS = ['time', 'pid', 'heap_kib']
+
+process_name_pattern = re.compile(r'^[A-Za-z0-9_.+-]+$')
+
+
+def run(context):
+    config = context.config()
+
+    names = [name.strip() for name in config['processes'].split(',') if name.strip()]
+    invalid = [name for name in names if not process_name_pattern.match(name)]
+    if invalid:
+        raise ValueError(f"Invalid process name: {', '.join(invalid)}")
+
+    leak_threshold = config['leak_threshold']
+    sampling_interval = config['sampling_interval']
+    script_exec_time = config['script_exec_time']
+    initial_logging_delay = config['initial_logging_delay']
+
+    tracker = HeapTracker(leak_threshold, config['min_samples'])
+    parser = SmapsParser()
+    command = SAMPLE_COMMAND.format(names=' '.join(names))
+
+    samples_sheet = context.report_sheet(['time (s)', 'process', 'pid', 'heap (KiB)'], title=f"{context.ecu.name} Heap")
+    store = context.sample_store(SAMPLE_COLUMNS, dtypes={'pid': np.int32, 'heap_kib': np.int64})
+
+    with store, context.telnet_session() as session:
+        context.log(f"Waiting {initial_logging_delay} sec initial logging delay")
+        context.sleep(initial_logging_delay)
+
+        context.log(f"Tracking the heap of {', '.join(names)} every {sampling_interval} sec for {script_exec_time} sec")
+        start = time.monotonic()
+        next_time = start
+        seen = set()
+        while next_time - start < script_exec_time:
+            now = time.monotonic()
+            if now < next_time:
+                context.sleep(next_time - now)
+
+            # smaps of a large process runs to hundreds of KB; it is parsed line
+            # by line as it arrives instead of being buffered first
+            elapsed = time.monotonic() - start
+            # The exit status only tells whether the last process was still there
+            session.run_lines(command, parser.feed, timeout=30)
+            sample = parser.result()
+
+            seen.update(name for name, _ in sample.values())
+            for name, pid, leaking, slope in tracker.add_sample(elapsed, sample):
+                if leaking:
+                    context.log(f"Possible leak: {name} [{pid}] heap growing {slope:.1f} KiB/h")
+                else:
+                    context.log(f"{name} [{pid}] heap growth back to {slope:.1f} KiB/h")
+
+            if sample:
+                pids = sorted(sample)
+                store.append(np.column_stack([np.full(len(pids), time.time()), pids, [sample[pid][1] for pid in pids]]))
+                samples_sheet.append([[round(elapsed, 1), sample[pid][0], pid, sample[pid][1]] for pid in pids])
+
+            context.progress(min(100, 100 * (time.monotonic() - start) / script_exec_time))
+
+            # Skip missed ticks rather than sampling back to back after a slow read
+            next_time += sampling_interval
+            now = time.monotonic()
+            if now > next_time:
+                next_time += (int((now - next_time) / sampling_interval) + 1) * sampling_interval
+
+    context.progress(100)
+
+    missing = [name for name in names if name not in seen]
+    if missing:
+        context.log(f"Not running on the target: {', '.join(missing)}")
+
+    summary = tracker.summary()
+    if not summary:
+        context.log("No heap samples collected, result not evaluated")
+        return None
+
+    slopes_sheet = context.report_sheet(['process', 'pid', 'samples', 'first (KiB)', 'last (KiB)', 'max (KiB)',
+                                         'slope (KiB/h)', 'r squared', 'leak'], title=f"{context.ecu.name} Heap Slopes")
+    passed = True
+    for process in summary:
+        enough = process['samples'] >= config['min_samples']
+        verdict = 'FAIL' if process['leaking'] else ('PASS' if enough else 'too few samples')
+        passed = passed and not process['leaking']
+        context.log(f"{process['process']} [{process['pid']}]: {process['first_kib']} -> {process['last_kib']} KiB, "
+                    f"slope {process['slope_kib_per_hour']:.1f} KiB/h (r² {process['r_squared']:.2f}), "
+                    f"threshold {leak_threshold:g} KiB/h -> {verdict}")
+        slopes_sheet.append([[process['process'], process['pid'], process['samples'], process['first_kib'],
+                              process['last_kib'], process['max_kib'], round(process['slope_kib_per_hour'], 2),
+                              round(process['r_squared'], 3), verdict]])
+
+    return passed
@@ -0,0 +1,126 @@
+import re
+
+
+# For every PID of the named processes: a marker line, then its smaps. Runs as
+# one command so a sample costs one round trip whatever the number of processes.
+SAMPLE_COMMAND = ('for pid in $(pidof {names}); do '
+                  'echo "@@PID $pid $(cat /proc/$pid/comm 2>/dev/null)"; '
+                  'cat /proc/$pid/smaps 2>/dev/null; done')
+
+mapping_header_pattern = re.compile(r'^[0-9a-f]+-[0-9a-f]+\s')
+
+# Fields of a heap mapping that count towards the heap size
+HEAP_FIELDS = ('Rss', 'Swap')
+
+
+class SmapsParser:
+    # Incremental parser, fed one line at a time while the output streams in.
+    # The heap of a process is its [heap] mapping plus its anonymous mappings
+    # (malloc arenas and large mmap'd blocks), resident or swapped out.
+    def __init__(self):
+        self.processes = {}
+        self.pid = None
+        self.in_heap_mapping = False
+
+    def feed(self, line):
+        if line.startswith('@@PID '):
+            fields = line.split(None, 2)
+            self.pid = int(fields[1])
+            name = fields[2].strip() if len(fields) > 2 else str(self.pid)
+            self.processes[self.pid] = [name, 0]
+            self.in_heap_mapping = False
+        elif self.pid is None:
+            return
+        elif mapping_header_pattern.match(line):
+            fields = line.split()
+            # address perms offset dev inode [pathname]
+            self.in_heap_mapping = len(fields) < 6 or fields[5] == '[heap]'
+        elif self.in_heap_mapping:
+            name, _, value = line.partition(':')
+            if name in HEAP_FIELDS:
+                self.processes[self.pid][1] += int(value.split()[0])
+
+    def result(self):
+        # {pid: (name, heap KiB)} for the sample just parsed, then start over
+        processes = {pid: (name, heap) for pid, (name, heap) in self.processes.items()}
+        self.processes = {}
+        self.pid = None
+        self.in_heap_mapping = False
+        return processes
+
+
+class OnlineRegression:
+    # Least-squares line through (t, y) updated one point at a time (Welford
+    # style), so the slope is known at every sample without keeping the samples
+    def __init__(self):
+        self.count = 0
+        self.mean_t = 0.0
+        self.mean_y = 0.0
+        self.m_tt = 0.0
+        self.m_yy = 0.0
+        self.c_ty = 0.0
+
+    def add(self, t, y):
+        self.count += 1
+        delta_t = t - self.mean_t
+        delta_y = y - self.mean_y
+        self.mean_t += delta_t / self.count
+        self.mean_y += delta_y / self.count
+        self.m_tt += delta_t * (t - self.mean_t)
+        self.m_yy += delta_y * (y - self.mean_y)
+        self.c_ty += delta_t * (y - self.mean_y)
+
+    def slope(self):
+        return self.c_ty / self.m_tt if self.m_tt > 0 else 0.0
+
+    def r_squared(self):
+        if self.m_tt <= 0 or self.m_yy <= 0:
+            return 0.0
+        return self.c_ty * self.c_ty / (self.m_tt * self.m_yy)
+
+
+class HeapTracker:
+    # One regression per PID. A restarted process gets a new PID and so a new
+    # line; its old one is kept for the summary.
+    def __init__(self, leak_threshold, min_samples):
+        # leak_threshold in KiB per hour
+        self.leak_threshold = leak_threshold
+        self.min_samples = min_samples
+        self.processes = {}
+
+    def add_sample(self, timestamp, sample):
+        # Returns the processes whose leak state changed: [(name, pid, leaking, slope)]
+        changes = []
+        for pid, (name, heap) in sample.items():
+            process = self.processes.get(pid)
+            if process is None:
+                process = self.processes[pid] = {
+                    'name': name, 'regression': OnlineRegression(), 'first': heap, 'last': heap,
+                    'maximum': heap, 'leaking': False
+                }
+            process['regression'].add(timestamp / 3600.0, heap)
+            process['last'] = heap
+            process['maximum'] = max(process['maximum'], heap)
+
+            leaking = self.is_leaking(process)
+            if leaking != process['leaking']:
+                process['leaking'] = leaking
+                changes.append((name, pid, leaking, process['regression'].slope()))
+        return changes
+
+    def is_leaking(self, process):
+        regression = process['regression']
+        return regression.count >= self.min_samples and regression.slope() > self.leak_threshold
+
+    def summary(self):
+        return [{
+            'process': process['name'],
+            'pid': pid,
+            'samples': process['regression'].count,
+            'first_kib': process['first'],
+            'last_kib': process['last'],
+            'max_kib': process['maximum'],
+            'slope_kib_per_hour': process['regression'].slope(),
+            'r_squared': process['regression'].r_squared(),
+            'leaking': self.is_leaking(process)
+        } for pid, process in sorted(self.processes.items(), key=lambda item: (item[1]['name'], item[0]))]
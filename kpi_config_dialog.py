@@ -0,0 +1,146 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QIcon, QIntValidator, QDoubleValidator
+from PyQt5.QtWidgets import (
+    QGroupBox,
+    QFormLayout,
+    QLabel,
+    QLineEdit,
+    QHBoxLayout,
+    QVBoxLayout,
+    QPushButton,
+    QDialog
+)
+
+from config_service import parse_config
+
+
+class KpiConfigDialog(QDialog):
+    # Configuration window built from the KPI's schema in config_service, for
+    # every KPI without a hand-made dialog. OK is enabled once the entered
+    # values pass the same validation the service applies when loading.
+    def __init__(self, main_window, label):
+        super().__init__()
+
+        self.main_window = main_window  # Store the main window reference
+        self.label = label
+        self.schema = main_window.config_service.schemas[label]
+
+        self.set_window_properties()
+
+        self.create_main_layout()
+
+    def done(self, result):
+        self.main_window.log(f"{self.label} configuration window closed successfully", kpi=self.label)
+        super().done(result)
+
+    def set_window_properties(self):
+        self.setWindowTitle(f'{self.label} Configuration')
+        self.setWindowIcon(QIcon('KPIT_logo.ico'))
+
+        # Define window dimensions
+        window_width = 500
+        window_height = 90 + 40 * len(self.schema.fields)
+
+        # Calculate the position to center the window on the MainWindow
+        x = self.main_window.x() + (self.main_window.width() - window_width) // 2
+        y = self.main_window.y() + (self.main_window.height() - window_height) // 2
+
+        self.setGeometry(x, y, window_width, window_height)
+        self.setFixedSize(window_width, window_height)
+
+    def create_main_layout(self):
+        main_layout = QVBoxLayout()
+
+        settings_group = QGroupBox("Settings")
+        settings_group.setStyleSheet("QGroupBox { border: 1px solid #000000; }")
+
+        settings_layout = QFormLayout()
+        settings_layout.setLabelAlignment(Qt.AlignRight | Qt.AlignVCenter)
+
+        self.inputs = {}
+        for field in self.schema.fields:
+            self.create_input(settings_layout, field)
+
+        settings_group.setLayout(settings_layout)
+
+        self.error_label = QLabel()
+        self.error_label.setStyleSheet("color: red;")
+
+        main_layout.addWidget(settings_group)
+        main_layout.addWidget(self.error_label)
+        main_layout.addLayout(self.create_buttons())
+
+        self.setLayout(main_layout)
+        self.load_data()
+        self.connect_signals()
+
+    def create_input(self, layout, field):
+        label = QLabel(field.title or field.name.replace('_', ' ').title())
+
+        input_field = QLineEdit()
+        if field.kind is int:
+            input_field.setValidator(QIntValidator(
+                field.minimum if field.minimum is not None else -2147483647,
+                field.maximum if field.maximum is not None else 2147483647))
+        elif field.kind is float:
+            validator = QDoubleValidator()
+            validator.setNotation(QDoubleValidator.StandardNotation)
+            if field.minimum is not None:
+                validator.setBottom(field.minimum)
+            input_field.setValidator(validator)
+        if not field.required and field.default is not None:
+            input_field.setPlaceholderText(str(field.default))
+
+        input_layout = QHBoxLayout()
+        input_layout.addWidget(input_field)
+        input_layout.addWidget(QLabel(field.unit))
+
+        layout.addRow(label, input_layout)
+        self.inputs[field.name] = input_field
+
+    def create_buttons(self):
+        buttons_layout = QHBoxLayout()
+
+        self.ok_button = QPushButton('OK')
+        self.ok_button.setEnabled(False)
+        self.ok_button.clicked.connect(self.save_and_close)
+
+        cancel_button = QPushButton('Cancel')
+        cancel_button.clicked.connect(self.reject)
+
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.ok_button)
+        buttons_layout.addWidget(cancel_button)
+        return buttons_layout
+
+    def connect_signals(self):
+        for input_field in self.inputs.values():
+            input_field.textChanged.connect(self.check_fields)
+
+    def entered_data(self):
+        data = {}
+        for field in self.schema.fields:
+            text = self.inputs[field.name].text().strip()
+            data[field.name] = [item.strip() for item in text.split(',')] if field.kind is list and text else text
+        return data
+
+    def check_fields(self):
+        config = parse_config(self.schema, self.entered_data())
+        self.ok_button.setEnabled(config.valid)
+        self.error_label.setText(config.errors[0] if config.errors else "")
+
+    def load_data(self):
+        # The cached copy from the config service, no file access here
+        data = self.main_window.config_service.get(self.label).raw
+        for field in self.schema.fields:
+            value = data.get(field.name, '')
+            if isinstance(value, list):
+                value = ', '.join(str(item) for item in value)
+            self.inputs[field.name].setText(str(value))
+
+        self.check_fields()  # Call check_fields after loading data
+
+    def save_and_close(self):
+        self.main_window.config_service.save(self.label, self.entered_data())
+
+        self.accept()
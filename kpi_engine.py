@@ -0,0 +1,605 @@
+import importlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from config_service import ConfigService
+
+# The protocol stacks, openpyxl and numpy are imported where they are first
+# needed, so that importing the engine (and starting the GUI) stays cheap
+
+
+# KPI row label -> module implementing it. Modules are imported on first use so
+# that selecting one KPI does not pull in the protocol stacks of all the others.
+KPI_MODULES = {
+    "CPU and Memory Utilization": "cpu_memory_utilization_kpi",
+    "Heap Memory": "heap_memory_kpi",
+    "Startup Time": "startup_time_kpi",
+    "Cyclic and Turnaround Time": "cyclic_turnaround_kpi",
+    "Throughput and Fault Injection": "throughput_kpi",
+    "Execution Time": "execution_time_kpi",
+    "Shutdown Time": "shutdown_time_kpi",
+    "Data Integrity": "data_integrity_kpi",
+}
+
+# KPIs that switch a bench's ignition; the scheduler never runs anything else
+# on that bench at the same time
+BENCH_EXCLUSIVE_KPIS = {"Startup Time", "Shutdown Time"}
+
+# Every run stores its logs and reports under results/<start time>/
+RESULTS_DIRECTORY = 'results'
+
+# Excel report written into the run directory when no name is configured
+DEFAULT_REPORT_NAME = 'Test Report.xlsx'
+
+# ECUs, credentials and KPI selection of the last GUI run, for kpi_runner.py
+BENCH_CONFIG_FILE = 'bench_config.json'
+
+# One target the KPIs run against, as configured in the Login Credentials group.
+# The ports are empty for the standard ones; set them for a target behind a
+# port forward or a simulated ECU (see ecu_simulator.py).
+EcuTarget = namedtuple('EcuTarget', [
+    'name',
+    'ip',
+    'telnet_username',
+    'telnet_password',
+    'ftp_username',
+    'ftp_password',
+    'telnet_port',
+    'ftp_port'
+], defaults=['', ''])
+
+# A test bench: the ECUs on it and the relay that switches its ignition
+Bench = namedtuple('Bench', ['name', 'ecus', 'relay_port', 'relay_baudrate'], defaults=['', ''])
+
+
+class KpiStopped(Exception):
+    pass
+
+
+class KpiEngineListener:
+    # Called from the engine and ECU worker threads; subclasses must hand the
+    # events over to their own thread (the Qt bridge does this through queued signals)
+    def on_kpi_started(self, label):
+        pass
+
+    def on_kpi_progress(self, label, ecu_name, percent):
+        pass
+
+    def on_kpi_log(self, label, ecu_name, message):
+        pass
+
+    def on_samples(self, label, ecu_name, rows):
+        pass
+
+    def on_ecu_finished(self, label, ecu_name, result):
+        pass
+
+    def on_kpi_finished(self, label, result):
+        pass
+
+    def on_run_finished(self):
+        pass
+
+    def on_ignition_switched(self, on, edge):
+        # edge: perf_counter time the relay switched
+        pass
+
+    def on_cached_results(self, hits):
+        # hits: [CachedResult] found for this run, see result_cache.py. Return
+        # True to reuse them instead of running those KPIs on those ECUs again.
+        return False
+
+
+class KpiContext:
+    def __init__(self, engine, label, ecu, recording=None):
+        self.engine = engine
+        self.label = label
+        self.ecu = ecu
+        # CacheRecording of this run when its result is to be cached
+        self.recording = recording
+
+    def log(self, message):
+        if self.recording is not None:
+            self.recording.log(message)
+        self.engine.listener.on_kpi_log(self.label, self.ecu.name, message)
+
+    def progress(self, percent):
+        self.engine.listener.on_kpi_progress(self.label, self.ecu.name, int(percent))
+
+    def publish_samples(self, rows):
+        # Measurement rows for live views; the layout is up to the KPI module
+        self.engine.listener.on_samples(self.label, self.ecu.name, rows)
+
+    def config(self):
+        # Typed values of this KPI's configuration, see config_service.py
+        config = self.engine.config_service.get(self.label)
+        if not config.valid:
+            raise ValueError(f"Configuration incomplete: {'; '.join(config.errors)}")
+        return config
+
+    @property
+    def bench(self):
+        return self.engine.bench
+
+    def stopped(self):
+        return self.engine.stop_event.is_set()
+
+    def sleep(self, seconds):
+        # Interruptible wait, so STOP does not have to sit out a long delay
+        if self.engine.stop_event.wait(seconds):
+            raise KpiStopped()
+
+    def switch_ignition(self, on, at=None):
+        # Waits for the other ECUs of the bench, then switches the relay once for
+        # all of them, at the perf_counter time at if given (the latest one asked
+        # for). Returns the perf_counter time of the switch.
+        switch = self.engine.ignition.switch(on, at)
+        late = f" ({switch.lateness * 1000:+.2f} ms from schedule)" if switch.lateness is not None else ""
+        self.log(f"IG {'ON' if on else 'OFF'}{late}")
+        return switch.edge
+
+    def power_sequence(self, steps, wait=None, repeat=1):
+        # Scripted sequence through switch_ignition, see relay_driver.run_sequence.
+        # Returns [(on, due, edge)].
+        from relay_driver import run_sequence
+        edges = run_sequence(steps, self.switch_ignition, wait, repeat, self.engine.stop_event)
+        if self.stopped():
+            raise KpiStopped()
+        return edges
+
+    @property
+    def telnet_port(self):
+        from telnet_pool import TELNET_PORT
+        return int(self.ecu.telnet_port or TELNET_PORT)
+
+    @property
+    def ftp_port(self):
+        from ftp_transfer import FTP_PORT
+        return int(self.ecu.ftp_port or FTP_PORT)
+
+    def telnet_session(self):
+        # Pooled shell on this ECU, shared with the other KPIs of the run
+        return self.engine.telnet_pool.session(self.ecu.ip, self.ecu.telnet_username, self.ecu.telnet_password,
+                                               self.telnet_port)
+
+    def ftp_downloader(self, **options):
+        from ftp_transfer import FtpDownloader
+        return FtpDownloader(self.ecu.ip, self.ecu.ftp_username, self.ecu.ftp_password, self.ftp_port,
+                             stop_event=self.engine.stop_event, **options)
+
+    def report_sheet(self, header, title=None):
+        # Worksheet in the run's Excel report; rows are streamed to disk as they are added
+        sheet = self.engine.report.sheet(title or f"{self.ecu.name} {self.label}", header)
+        return self.recording.sheet(sheet) if self.recording is not None else sheet
+
+    def sample_store(self, columns, dtypes=None, name='samples'):
+        # Memory-mapped column files under the results directory, see sample_store.py
+        from sample_store import SampleStoreWriter
+        return SampleStoreWriter(os.path.join(self.results_directory(), name), columns, dtypes)
+
+    def results_directory(self):
+        path = os.path.join(self.engine.run_directory, safe_file_name(self.ecu.name), safe_file_name(self.label))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def download_logs(self, remote_dirs):
+        from ftp_transfer import FtpTransferStopped
+
+        self.log(f"Downloading {', '.join(remote_dirs)}")
+
+        last_report = [0.0]
+        def report(bytes_done, bytes_total):
+            now = time.monotonic()
+            if now - last_report[0] >= 1.0 or bytes_done == bytes_total:
+                last_report[0] = now
+                self.log(f"Downloaded {bytes_done / 1e6:.1f} of {bytes_total / 1e6:.1f} MB")
+
+        try:
+            files = self.ftp_downloader().download_tree(remote_dirs, self.results_directory(), report)
+        except FtpTransferStopped:
+            raise KpiStopped()
+
+        self.log(f"Downloaded {len(files)} files")
+        return files
+
+
+class IgnitionSwitch:
+    # The relay switches the whole bench while a KPI runs one worker per ECU.
+    # Every worker calls switch() once it is ready to measure and the relay is
+    # switched when the last one arrives, so all ECUs are timed from the same edge.
+    def __init__(self, engine, parties):
+        self.engine = engine
+        self.parties = parties
+        self.condition = threading.Condition()
+        self.waiting = 0
+        self.requested = None
+        self.due = None
+        self.generation = 0
+        self.pending = None
+
+    def switch(self, on, due=None):
+        # Returns the acknowledged RelaySwitch
+        with self.condition:
+            if self.waiting and on != self.requested:
+                raise RuntimeError("ECUs of the bench requested different ignition states")
+            self.requested = on
+            if due is not None:
+                self.due = due if self.due is None else max(self.due, due)
+            self.waiting += 1
+            generation = self.generation
+            self.switch_if_ready()
+            while self.generation == generation:
+                if self.engine.stop_event.is_set():
+                    self.waiting -= 1
+                    raise KpiStopped()
+                self.condition.wait(0.1)
+            pending = self.pending
+
+        if isinstance(pending, Exception):
+            raise pending
+        # The relay acknowledges from its own thread; a scheduled switch can be
+        # seconds away, so the wait is outside the lock and can be stopped
+        if pending.wait(stop_event=self.engine.stop_event) is None:
+            raise KpiStopped()
+        return pending
+
+    def leave(self):
+        # A worker that finished or failed no longer holds the others up
+        with self.condition:
+            self.parties -= 1
+            self.switch_if_ready()
+
+    def switch_if_ready(self):
+        if not self.waiting or self.waiting < self.parties:
+            return
+        try:
+            self.pending = self.engine.relay_driver().submit(self.requested, self.due)
+        except Exception as e:
+            self.pending = e
+        self.waiting = 0
+        self.due = None
+        self.generation += 1
+        self.condition.notify_all()
+
+
+class KpiEngine:
+    def __init__(self, listener=None, config_service=None, results_directory=RESULTS_DIRECTORY, result_cache=None):
+        self.listener = listener if listener is not None else KpiEngineListener()
+        self.config_service = config_service if config_service is not None else ConfigService()
+        self.results_directory = results_directory
+        # ResultCache the results are stored in and offered from, None to run without one
+        self.result_cache = result_cache
+        self.result_keys = {}
+        self.firmware = {}
+        self.reused = {}
+        self.bench = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.telnet_pool = None
+        self.relay = None
+        self.ignition = None
+        self.run_directory = None
+        self.report = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, labels, ecus, report_name=None, bench=None):
+        if self.is_running():
+            raise RuntimeError("A KPI run is already in progress")
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, args=(list(labels), list(ecus), report_name, bench),
+                                       name="KpiEngine", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def run(self, labels, ecus, report_name=None, bench=None):
+        from report_writer import ReportWriter
+        from telnet_pool import TelnetPool
+
+        self.bench = bench if bench is not None else Bench('', list(ecus))
+        self.telnet_pool = None
+        self.report = None
+        self.result_keys = {}
+        self.reused = {}
+        try:
+            # Inside the try: a results directory that cannot be written or a
+            # bad report name still ends the run for the listener
+            self.run_directory = os.path.join(self.results_directory, time.strftime('%Y%m%d_%H%M%S'))
+            os.makedirs(self.run_directory, exist_ok=True)
+            self.telnet_pool = TelnetPool()
+            self.report = ReportWriter(os.path.join(self.run_directory, report_file_name(report_name)))
+            if self.result_cache is not None:
+                self.reused = self.find_cached_results(labels, ecus)
+            for label in labels:
+                if self.stop_event.is_set():
+                    break
+                self.run_kpi(label, ecus)
+        except Exception as e:
+            self.listener.on_kpi_log("", "", f"Run aborted: {e}")
+        finally:
+            if self.telnet_pool is not None:
+                self.telnet_pool.close()
+            if self.relay is not None:
+                # A worker stopped between IG OFF and IG ON cannot switch back
+                # on its own (the others have left); the bench is not left off
+                if self.relay.state is False:
+                    try:
+                        self.relay.switch(True)
+                    except Exception as e:
+                        self.listener.on_kpi_log("", "", f"IG ON after the run failed: {e}")
+                self.relay.close()
+                self.relay = None
+            if self.report is not None:
+                self.close_report()
+            self.listener.on_run_finished()
+
+    def find_cached_results(self, labels, ecus):
+        # Works out the cache key of every KPI and ECU of the run and asks the
+        # listener whether to reuse what is cached under them.
+        # Returns {(label, ECU name): CachedResult}.
+        from result_cache import CachedResult, code_digest, result_key
+
+        self.firmware = self.read_firmware(ecus)
+        hits = []
+        for label in labels:
+            try:
+                module = load_kpi_module(label)
+            except Exception:
+                # Reported when the KPI runs
+                continue
+            # A KPI checking the target's content (Data Integrity) cannot go by the firmware version
+            if module is None or not getattr(module, 'CACHEABLE', True):
+                continue
+            config_path = self.config_service.path(label) if self.config_service.has_config(label) else ''
+            code = code_digest(module.__file__)
+            for ecu in ecus:
+                firmware, _ = self.firmware[ecu.name]
+                if firmware is None:
+                    continue
+                key = result_key(label, config_path, code, ecu, firmware)
+                self.result_keys[(label, ecu.name)] = key
+                entry = self.result_cache.get(key)
+                if entry is not None:
+                    hits.append(CachedResult(label, ecu.name, key, entry))
+
+        if not hits or not self.listener.on_cached_results(hits) or self.stop_event.is_set():
+            return {}
+        return {(hit.label, hit.ecu_name): hit for hit in hits}
+
+    def read_firmware(self, ecus):
+        # {ECU name: (firmware id, description)}. Without an id the results of
+        # that ECU are neither stored nor reused.
+        from result_cache import FIRMWARE_COMMAND, firmware_id
+
+        def read(ecu):
+            context = KpiContext(self, "", ecu)
+            try:
+                with context.telnet_session() as session:
+                    _, output = session.run(FIRMWARE_COMMAND)
+            except Exception as e:
+                context.log(f"Firmware not identified, results are not cached: {e}")
+                return None, ''
+            firmware, description = firmware_id(output)
+            context.log(f"Firmware: {description}" if firmware is not None else
+                        "Firmware not identified, results are not cached")
+            return firmware, description
+
+        with ThreadPoolExecutor(max_workers=max(len(ecus), 1), thread_name_prefix="KpiWorker") as executor:
+            return dict(zip([ecu.name for ecu in ecus], executor.map(read, ecus)))
+
+    def relay_driver(self):
+        # Opened by the first KPI that switches the ignition
+        if self.relay is None:
+            from relay_driver import RelayDriver
+            self.relay = RelayDriver(self.bench.relay_port, self.bench.relay_baudrate, on_edge=self.on_relay_edge)
+        return self.relay
+
+    def on_relay_edge(self, switch):
+        if switch.error is None:
+            self.listener.on_ignition_switched(switch.on, switch.edge)
+
+    def close_report(self):
+        try:
+            self.report.close()
+            self.listener.on_kpi_log("", "", f"Report saved to {os.path.abspath(self.report.path)}")
+        except Exception as e:
+            self.listener.on_kpi_log("", "", f"Report could not be saved: {e}")
+
+    def run_kpi(self, label, ecus):
+        self.listener.on_kpi_started(label)
+
+        module = None
+        try:
+            module = load_kpi_module(label)
+        except Exception as e:
+            self.listener.on_kpi_log(label, "", f"Error: {e}")
+            self.report.add_result(label, "All ECUs", False)
+            self.listener.on_kpi_finished(label, False)
+            return False
+
+        if module is None:
+            self.listener.on_kpi_log(label, "", "No test implementation available, skipped")
+            self.report.add_result(label, "All ECUs", None)
+            self.listener.on_kpi_finished(label, None)
+            return None
+
+        # Every ECU gets its own worker, so the wall-clock time of a KPI is that of
+        # the slowest target rather than the sum of all of them
+        reused = {ecu.name: self.reused[(label, ecu.name)] for ecu in ecus if (label, ecu.name) in self.reused}
+        self.ignition = IgnitionSwitch(self, len(ecus) - len(reused))
+        with ThreadPoolExecutor(max_workers=max(len(ecus), 1), thread_name_prefix="KpiWorker") as executor:
+            futures = []
+            for ecu in ecus:
+                if ecu.name in reused:
+                    futures.append(executor.submit(self.reuse_result, label, ecu, reused[ecu.name]))
+                else:
+                    futures.append(executor.submit(self.run_kpi_on_ecu, module, label, ecu))
+            results = [future.result() for future in futures]
+
+        result = combine_results(results)
+        self.report.add_result(label, "All ECUs", result)
+        self.listener.on_kpi_finished(label, result)
+        return result
+
+    def run_kpi_on_ecu(self, module, label, ecu):
+        key = self.result_keys.get((label, ecu.name))
+        recording = self.result_cache.recording() if key is not None else None
+        context = KpiContext(self, label, ecu, recording)
+        started = time.time()
+
+        result = None
+        completed = False
+        try:
+            result = module.run(context)
+            completed = True
+
+            # Modules name the target directories holding their logs and results;
+            # they are pulled into the run's results directory afterwards
+            remote_log_directories = getattr(module, 'REMOTE_LOG_DIRECTORIES', None)
+            if remote_log_directories:
+                from ftp_transfer import FtpTransferError
+                try:
+                    context.download_logs(remote_log_directories)
+                except (FtpTransferError, OSError) as e:
+                    context.log(f"Log download failed: {e}")
+        except KpiStopped:
+            context.log("Stopped by user")
+        except Exception as e:
+            context.log(f"Error: {e}")
+            context.log(traceback.format_exc())
+            result = False
+        finally:
+            self.ignition.leave()
+
+        duration = time.time() - started
+        if recording is not None:
+            self.store_result(key, recording, label, ecu, result if completed else None, started, duration)
+
+        self.report.add_result(label, ecu.name, result, started, duration)
+        self.listener.on_ecu_finished(label, ecu.name, result)
+        return result
+
+    def store_result(self, key, recording, label, ecu, result, started, duration):
+        # Only verdicts are kept: after an error, a stop or a result that could
+        # not be evaluated the KPI runs again next time
+        if result is None or self.stop_event.is_set():
+            recording.discard()
+            return
+        try:
+            self.result_cache.store(key, recording, {
+                'label': label,
+                'ecu': ecu.name,
+                'result': result,
+                'started': started,
+                'duration': duration,
+                'firmware': self.firmware[ecu.name][1],
+                'run_directory': self.run_directory
+            })
+        except OSError as e:
+            recording.discard()
+            self.listener.on_kpi_log(label, ecu.name, f"Result not cached: {e}")
+
+    def reuse_result(self, label, ecu, hit):
+        # Replays a cached result: its log, its report sheets and its verdict
+        entry = hit.entry
+        context = KpiContext(self, label, ecu)
+        context.log(f"Reusing the result of {time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['started']))} "
+                    f"from {entry['run_directory']}, configuration and firmware are unchanged")
+        for message in entry['logs']:
+            context.log(message)
+
+        result = entry['result']
+        try:
+            for sheet in entry['sheets']:
+                report_sheet = self.report.sheet(sheet['title'], sheet['header'])
+                for rows in self.result_cache.sheet_rows(hit.key, sheet):
+                    report_sheet.append(rows)
+            self.result_cache.touch(hit.key)
+        except (OSError, ValueError) as e:
+            context.log(f"Cached result could not be read, run the KPI again: {e}")
+            result = None
+
+        context.progress(100)
+        self.report.add_result(label, ecu.name, result, entry['started'], entry['duration'],
+                               reused_from=entry['run_directory'])
+        self.listener.on_ecu_finished(label, ecu.name, result)
+        return result
+
+
+def save_bench_config(labels, bench, path=BENCH_CONFIG_FILE):
+    data = bench_to_dict(bench)
+    data['kpis'] = list(labels)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(temporary_path, path)
+
+
+def load_bench_config(path=BENCH_CONFIG_FILE):
+    # Returns (KPI labels, Bench)
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return list(data.get('kpis', [])), bench_from_dict(data)
+
+
+def bench_to_dict(bench):
+    return {
+        'name': bench.name,
+        'relay_port': bench.relay_port,
+        'relay_baudrate': bench.relay_baudrate,
+        'ecus': [ecu._asdict() for ecu in bench.ecus]
+    }
+
+
+def bench_from_dict(data, default_name=''):
+    ecus = [EcuTarget(**{field: str(ecu.get(field, '')) for field in EcuTarget._fields}) for ecu in data.get('ecus', [])]
+    return Bench(str(data.get('name') or default_name), ecus,
+                 str(data.get('relay_port', '')), str(data.get('relay_baudrate', '')))
+
+
+def load_kpi_module(label):
+    module_name = KPI_MODULES.get(label)
+    if module_name is None:
+        return None
+    return importlib.import_module(module_name)
+
+
+def safe_file_name(name):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_')
+
+
+def configured_report_name(config_service, name=None):
+    # An explicit name wins; otherwise the one entered in the CPU and Memory
+    # Utilization configuration, as the GUI does. report_file_name() handles None.
+    if name is None and config_service.has_config("CPU and Memory Utilization"):
+        name = config_service.get("CPU and Memory Utilization").get('test_report_name')
+    return name
+
+
+def report_file_name(name):
+    stem, _ = os.path.splitext(os.path.basename((name or '').strip()))
+    return (safe_file_name(stem) or os.path.splitext(DEFAULT_REPORT_NAME)[0]) + '.xlsx'
+
+
+def combine_results(results):
+    # A KPI fails if any ECU failed and passes only if every ECU passed;
+    # anything else (stopped, skipped) leaves it not evaluated
+    if any(result is False for result in results):
+        return False
+    if results and all(result is True for result in results):
+        return True
+    return None
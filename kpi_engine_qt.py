@@ -0,0 +1,96 @@
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from kpi_engine import KpiEngine, KpiEngineListener
+
+
+class QtKpiEngine(QObject, KpiEngineListener):
+    # The engine threads emit these; since this object lives in the GUI thread
+    # Qt delivers them as queued connections and the slots run in the GUI thread
+    kpi_started = pyqtSignal(str)
+    kpi_progress = pyqtSignal(str, str, int)
+    kpi_log = pyqtSignal(str, str, str)
+    samples = pyqtSignal(str, str, object)
+    ecu_finished = pyqtSignal(str, str, object)
+    kpi_finished = pyqtSignal(str, object)
+    run_finished = pyqtSignal()
+    ignition_switched = pyqtSignal(bool, float)
+    # Cached results found before a run, with the CacheQuestion to answer
+    cached_results_found = pyqtSignal(object, object)
+
+    def __init__(self, parent=None, log_sink=None, sample_sink=None, config_service=None, result_cache=None):
+        super().__init__(parent)
+        self.engine = KpiEngine(self, config_service, result_cache=result_cache)
+
+        # Log lines and samples can arrive far faster than one queued signal each
+        # is worth; thread-safe sinks such as ConsoleWidget.append take them directly
+        self.log_sink = log_sink
+        self.sample_sink = sample_sink
+
+    def on_kpi_started(self, label):
+        self.kpi_started.emit(label)
+
+    def on_kpi_progress(self, label, ecu_name, percent):
+        self.kpi_progress.emit(label, ecu_name, percent)
+
+    def on_kpi_log(self, label, ecu_name, message):
+        if self.log_sink is not None:
+            self.log_sink(message, ecu_name, label)
+        else:
+            self.kpi_log.emit(label, ecu_name, message)
+
+    def on_samples(self, label, ecu_name, rows):
+        if self.sample_sink is not None:
+            self.sample_sink(label, ecu_name, rows)
+        else:
+            self.samples.emit(label, ecu_name, rows)
+
+    def on_ecu_finished(self, label, ecu_name, result):
+        self.ecu_finished.emit(label, ecu_name, result)
+
+    def on_kpi_finished(self, label, result):
+        self.kpi_finished.emit(label, result)
+
+    def on_run_finished(self):
+        self.run_finished.emit()
+
+    def on_ignition_switched(self, on, edge):
+        self.ignition_switched.emit(on, edge)
+
+    def on_cached_results(self, hits):
+        # The engine thread waits here until the GUI has answered (or STOP)
+        if not self.receivers(self.cached_results_found):
+            return False
+        question = CacheQuestion()
+        self.cached_results_found.emit(hits, question)
+        return question.wait(self.engine.stop_event)
+
+    def is_running(self):
+        return self.engine.is_running()
+
+    def start(self, labels, ecus, report_name=None, bench=None):
+        self.engine.start(labels, ecus, report_name, bench)
+
+    def stop(self):
+        self.engine.stop()
+
+    def wait(self, timeout=None):
+        self.engine.wait(timeout)
+
+
+class CacheQuestion:
+    # Carries the GUI's answer back to the waiting engine thread
+    def __init__(self):
+        self.answered = threading.Event()
+        self.reuse = False
+
+    def answer(self, reuse):
+        self.reuse = reuse
+        self.answered.set()
+
+    def wait(self, stop_event):
+        while not self.answered.wait(0.1):
+            if stop_event.is_set():
+                return False
+        return self.reuse
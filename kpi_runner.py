@@ -0,0 +1,172 @@
+import argparse
+import signal
+import sys
+import threading
+import time
+
+from config_service import ConfigService
+from kpi_engine import (
+    BENCH_CONFIG_FILE,
+    KPI_MODULES,
+    KpiEngine,
+    KpiEngineListener,
+    configured_report_name,
+    load_bench_config
+)
+from result_cache import CACHE_MODES, CACHE_OFF, CACHE_REUSE, CACHE_STORE, ResultCache, describe_hit
+
+
+# Headless entry point for benches without a display, e.g.
+#   python kpi_runner.py --bench bench_config.json --kpi "CPU and Memory Utilization"
+# The bench file is the one the GUI writes on RUN; KPI settings come from the
+# same configuration files the GUI edits. PyQt5 is never imported.
+
+EXIT_PASS = 0
+EXIT_FAIL = 1
+EXIT_USAGE = 2
+EXIT_NOT_EVALUATED = 3
+EXIT_STOPPED = 130
+
+
+class ConsoleListener(KpiEngineListener):
+    def __init__(self, quiet=False, reuse_cached=False):
+        self.quiet = quiet
+        self.reuse_cached = reuse_cached
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def write(self, kpi, ecu_name, message):
+        prefix = time.strftime('%H:%M:%S')
+        if kpi:
+            prefix += f" [{kpi}]"
+        if ecu_name:
+            prefix += f" [{ecu_name}]"
+        with self.lock:
+            print(f"{prefix} {message}", flush=True)
+
+    def on_kpi_started(self, label):
+        self.write(label, "", "Started")
+
+    def on_kpi_log(self, label, ecu_name, message):
+        if not self.quiet:
+            self.write(label, ecu_name, message)
+
+    def on_ecu_finished(self, label, ecu_name, result):
+        self.write(label, ecu_name, result_text(result))
+
+    def on_kpi_finished(self, label, result):
+        self.results[label] = result
+        self.write(label, "", f"Finished: {result_text(result)}")
+
+    def on_cached_results(self, hits):
+        for hit in hits:
+            self.write(hit.label, hit.ecu_name, f"Cached: {describe_hit(hit)}")
+        if not self.reuse_cached:
+            self.write("", "", f"{len(hits)} cached results not reused, see --cache reuse")
+        return self.reuse_cached
+
+
+def result_text(result):
+    return {True: "PASS", False: "FAIL"}.get(result, "Not Tested")
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Run platform validation KPIs without the GUI.")
+    parser.add_argument('--bench', default=BENCH_CONFIG_FILE,
+                        help=f"ECU and credential settings written by the GUI (default: {BENCH_CONFIG_FILE})")
+    parser.add_argument('--kpi', action='append', dest='kpis', metavar='LABEL',
+                        help="KPI to run, may be repeated (default: the KPIs selected in the bench file)")
+    parser.add_argument('--ecu', action='append', dest='ecus', metavar='NAME',
+                        help="Only run on this ECU, may be repeated (default: all ECUs in the bench file)")
+    parser.add_argument('--config-dir', default='.',
+                        help="Directory holding the KPI configuration files (default: current directory)")
+    parser.add_argument('--report-name', help="Excel report file name (default: from the KPI configuration)")
+    parser.add_argument('--quiet', action='store_true', help="Only print KPI and ECU results")
+    parser.add_argument('--cache', choices=CACHE_MODES, default=CACHE_STORE,
+                        help="Result cache use: off, store results (default), or also reuse results cached for "
+                             "unchanged configurations and firmware")
+    parser.add_argument('--list', action='store_true', help="List the available KPIs and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+
+    if arguments.list:
+        for label in KPI_MODULES:
+            print(label)
+        return EXIT_PASS
+
+    try:
+        bench_kpis, bench = load_bench_config(arguments.bench)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Cannot read bench configuration {arguments.bench}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    ecus = bench.ecus
+    if arguments.kpis:
+        labels = arguments.kpis
+        unknown = [label for label in labels if label not in KPI_MODULES]
+        if unknown:
+            print(f"Unknown KPI: {', '.join(unknown)} (see --list)", file=sys.stderr)
+            return EXIT_USAGE
+    else:
+        # The GUI saves every ticked row, also those without a test implementation;
+        # it skips them when running, and so does the rerun
+        labels = [label for label in bench_kpis if label in KPI_MODULES]
+        for label in bench_kpis:
+            if label not in KPI_MODULES:
+                print(f"{label}: no test implementation available, skipped", file=sys.stderr)
+
+    if arguments.ecus:
+        missing = set(arguments.ecus) - {ecu.name for ecu in ecus}
+        if missing:
+            print(f"ECU not in {arguments.bench}: {', '.join(sorted(missing))}", file=sys.stderr)
+            return EXIT_USAGE
+        ecus = [ecu for ecu in ecus if ecu.name in arguments.ecus]
+
+    if not labels or not ecus:
+        print("Nothing to run: no KPI or no ECU selected", file=sys.stderr)
+        return EXIT_USAGE
+
+    config_service = ConfigService(arguments.config_dir)
+    incomplete = [label for label in labels if config_service.has_config(label) and not config_service.is_valid(label)]
+    for label in incomplete:
+        print(f"{label}: configuration incomplete: {'; '.join(config_service.get(label).errors)}", file=sys.stderr)
+    if incomplete:
+        return EXIT_USAGE
+
+    report_name = configured_report_name(config_service, arguments.report_name)
+
+    listener = ConsoleListener(arguments.quiet, arguments.cache == CACHE_REUSE)
+    engine = KpiEngine(listener, config_service, result_cache=ResultCache() if arguments.cache != CACHE_OFF else None)
+
+    # First Ctrl+C / SIGTERM stops the KPIs cleanly, the report is still written
+    stopped = threading.Event()
+    def stop(signal_number, frame):
+        if stopped.is_set():
+            raise KeyboardInterrupt()
+        stopped.set()
+        listener.write("", "", "Stopping, press Ctrl+C again to abort")
+        engine.stop()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    engine.start(labels, ecus, report_name, bench._replace(ecus=ecus))
+    # Short waits so the signal handler gets to run
+    while engine.is_running():
+        engine.wait(0.5)
+
+    if stopped.is_set():
+        return EXIT_STOPPED
+
+    results = [listener.results.get(label) for label in labels]
+    if any(result is False for result in results):
+        return EXIT_FAIL
+    if all(result is True for result in results):
+        return EXIT_PASS
+    return EXIT_NOT_EVALUATED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+# Buckets per power of two are 2**(PRECISION_BITS - 1), so a value is kept with
+# a relative error below 1%
+PRECISION_BITS = 8
+
+# Values are integer nanoseconds below 2**HIGHEST_BITS (about 2.4 hours); larger
+# ones are counted in the top bucket and as saturated
+HIGHEST_BITS = 43
+
+PERCENTILES = (50, 99, 99.9)
+
+
+class LatencyHistogram:
+    # HDR-style histogram: one bucket per value below 2**PRECISION_BITS, then for
+    # every further power of two the same number of buckets, each twice as wide
+    # as the last. The counts array has a fixed size however much is recorded,
+    # and two histograms with the same layout merge by adding their arrays.
+    def __init__(self, precision_bits=PRECISION_BITS, highest_bits=HIGHEST_BITS):
+        self.precision_bits = precision_bits
+        self.highest_bits = highest_bits
+        self.half = 1 << (precision_bits - 1)
+        self.counts = np.zeros((highest_bits - precision_bits + 2) * self.half, dtype=np.int64)
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.sum = 0.0
+        self.saturated = 0
+
+    def record(self, values):
+        # values: array of nanoseconds, recorded in one vectorized pass
+        values = np.asarray(values, dtype=np.int64)
+        if not values.size:
+            return
+
+        values = np.maximum(values, 0)
+        highest = (1 << self.highest_bits) - 1
+        saturated = int(np.count_nonzero(values > highest))
+        if saturated:
+            self.saturated += saturated
+            values = np.minimum(values, highest)
+
+        # frexp gives the bit length; exact as the values are below 2**53
+        _, bit_length = np.frexp(values.astype(np.float64))
+        shift = np.maximum(bit_length - self.precision_bits, 0)
+        indices = shift * self.half + (values >> shift)
+        self.counts += np.bincount(indices, minlength=self.counts.size)
+
+        self.total += int(values.size)
+        self.sum += float(values.sum(dtype=np.float64))
+        low = int(values.min())
+        high = int(values.max())
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+    def merge(self, other):
+        if (other.precision_bits, other.highest_bits) != (self.precision_bits, self.highest_bits):
+            raise ValueError("Histograms with different layouts cannot be merged")
+        self.counts += other.counts
+        self.total += other.total
+        self.sum += other.sum
+        self.saturated += other.saturated
+        for name, pick in (('minimum', min), ('maximum', max)):
+            values = [value for value in (getattr(self, name), getattr(other, name)) if value is not None]
+            setattr(self, name, pick(values) if values else None)
+        return self
+
+    def bucket_bounds(self, index):
+        # Lowest and highest value stored in a bucket
+        shift = max(index // self.half - 1, 0)
+        low = (index - shift * self.half) << shift
+        return low, low + (1 << shift) - 1
+
+    def percentile(self, percent):
+        # Highest value of the bucket holding the rank, within the recorded range
+        if not self.total:
+            return None
+        rank = max(1, int(np.ceil(percent / 100.0 * self.total)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        _, high = self.bucket_bounds(index)
+        return max(self.minimum, min(high, self.maximum))
+
+    @property
+    def mean(self):
+        return self.sum / self.total if self.total else None
+
+    def summary(self):
+        summary = {'count': self.total, 'min': self.minimum, 'mean': self.mean}
+        for percent in PERCENTILES:
+            summary[f"p{percent:g}"] = self.percentile(percent)
+        summary['max'] = self.maximum
+        return summary
+
+    def to_dict(self):
+        # Only the used buckets, so a saved histogram stays small
+        used = np.flatnonzero(self.counts)
+        return {
+            'precision_bits': self.precision_bits,
+            'highest_bits': self.highest_bits,
+            'total': self.total,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'sum': self.sum,
+            'saturated': self.saturated,
+            'indices': used.tolist(),
+            'counts': self.counts[used].tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['precision_bits'], data['highest_bits'])
+        histogram.counts[np.asarray(data['indices'], dtype=np.int64)] = data['counts']
+        histogram.total = data['total']
+        histogram.minimum = data['minimum']
+        histogram.maximum = data['maximum']
+        histogram.sum = data['sum']
+        histogram.saturated = data['saturated']
+        return histogram
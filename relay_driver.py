@@ -0,0 +1,417 @@
+import argparse
+import heapq
+import itertools
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+
+
+DEFAULT_BAUDRATE = 9600
+
+# Channel of the USB relay module wired to the bench's ignition line
+IGNITION_CHANNEL = 1
+
+FRAME_SIZE = 4
+
+# The I/O thread sleeps until this close to a scheduled switch, then spins on
+# the clock; sleeping alone can overshoot by a scheduler tick
+SPIN_WINDOW = 0.002
+
+# How long after its due time a switch may take to be acknowledged
+SWITCH_TIMEOUT = 5.0
+
+# One step of a power sequence: action 'on', 'off' or 'wait', and how long to
+# hold it in seconds (for 'wait', the longest to wait)
+SequenceStep = namedtuple('SequenceStep', ['action', 'duration'])
+
+sequence_step_pattern = re.compile(r'^(on|off|wait)(?:\s+(\d+(?:\.\d*)?)\s*(ms|s)?)?$', re.IGNORECASE)
+
+
+class RelayError(Exception):
+    pass
+
+
+def relay_command(channel, on):
+    # LCUS relay module frame: start byte, channel, state, checksum
+    state = 1 if on else 0
+    return bytes([0xA0, channel, state, (0xA0 + channel + state) & 0xFF])
+
+
+def parse_relay_command(frame):
+    # (channel, on) of a valid frame, None for anything else
+    if len(frame) != FRAME_SIZE or frame[0] != 0xA0 or frame[2] not in (0, 1):
+        return None
+    if (frame[0] + frame[1] + frame[2]) & 0xFF != frame[3]:
+        return None
+    return frame[1], frame[2] == 1
+
+
+class RelaySwitch:
+    # One queued switch. The I/O thread fills in edge, the perf_counter time the
+    # command left the wire, or error, and sets done.
+    def __init__(self, on, due=None):
+        self.on = on
+        self.due = due
+        self.edge = None
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def finish(self, edge=None, error=None):
+        self.edge = edge
+        self.error = error
+        self.done.set()
+
+    def cancel(self):
+        # Only stops a switch that has not gone out yet
+        self.cancelled = True
+
+    @property
+    def lateness(self):
+        # Seconds from the due time to the edge
+        if self.due is None or self.edge is None:
+            return None
+        return self.edge - self.due
+
+    def wait(self, timeout=SWITCH_TIMEOUT, stop_event=None):
+        # Returns the edge time, or None if stop_event was set first
+        deadline = max(self.due or 0.0, time.perf_counter()) + timeout
+        while not self.done.wait(0.05):
+            if stop_event is not None and stop_event.is_set():
+                self.cancel()
+                return None
+            if time.perf_counter() >= deadline:
+                self.cancel()
+                raise RelayError(f"Relay did not acknowledge IG {'ON' if self.on else 'OFF'} within {timeout:g} sec")
+        if self.error is not None:
+            raise self.error
+        return self.edge
+
+
+class RelayDriver:
+    # Serial relay that switches the ignition (IG ON / IG OFF) of a whole bench.
+    # The port belongs to one I/O thread: callers queue switches, now or at a
+    # perf_counter time, and get each edge acknowledged with its timestamp, so
+    # neither the GUI nor a KPI worker ever blocks on the serial port.
+    # pyserial is imported on first use, benches without a relay never need it.
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, channel=IGNITION_CHANNEL, timeout=1.0, on_edge=None):
+        self.port = port
+        self.baudrate = int(baudrate or DEFAULT_BAUDRATE)
+        self.channel = channel
+        self.timeout = timeout
+        # Called from the I/O thread with every finished RelaySwitch
+        self.on_edge = on_edge
+        self.serial = None
+        self.state = None
+        self.commands = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, on, due=None):
+        switch = RelaySwitch(on, due)
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="RelayDriver", daemon=True)
+                self.thread.start()
+            self.commands.put(switch)
+        return switch
+
+    def switch(self, on, due=None, timeout=SWITCH_TIMEOUT, stop_event=None):
+        # Returns the perf_counter time the command finished going out on the
+        # wire, which is when the relay acts
+        return self.submit(on, due).wait(timeout, stop_event)
+
+    def close(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+            if thread is not None:
+                self.commands.put(None)
+        if thread is not None:
+            thread.join()
+
+    def run(self):
+        # Switches are executed in due order; immediate ones as they come
+        scheduled = []
+        order = itertools.count()
+        try:
+            while True:
+                timeout = None
+                if scheduled:
+                    timeout = max(scheduled[0][0] - time.perf_counter() - SPIN_WINDOW, 0)
+                try:
+                    switch = self.commands.get(timeout=timeout)
+                except queue.Empty:
+                    switch = False
+                if switch is None:
+                    break
+                if switch:
+                    if switch.due is None:
+                        self.execute(switch)
+                    else:
+                        heapq.heappush(scheduled, (switch.due, next(order), switch))
+                        # Opened ahead, so the edge is not late by the time that takes;
+                        # an error is reported by the switch itself
+                        if self.serial is None:
+                            try:
+                                self.open()
+                            except RelayError:
+                                pass
+
+                while scheduled and scheduled[0][0] - time.perf_counter() <= SPIN_WINDOW:
+                    due, _, switch = heapq.heappop(scheduled)
+                    while time.perf_counter() < due:
+                        pass
+                    self.execute(switch)
+        finally:
+            pending = [switch for _, _, switch in scheduled]
+            while True:
+                try:
+                    switch = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                if switch:
+                    pending.append(switch)
+            for switch in pending:
+                switch.finish(error=RelayError("Relay driver closed"))
+            self.close_port()
+
+    def execute(self, switch):
+        if switch.cancelled:
+            switch.finish(error=RelayError("Relay switch cancelled"))
+            return
+        try:
+            if self.serial is None:
+                self.open()
+            edge = self.write_frame(relay_command(self.channel, switch.on))
+        except RelayError as e:
+            switch.finish(error=e)
+        else:
+            self.state = switch.on
+            switch.finish(edge)
+        if self.on_edge is not None:
+            try:
+                self.on_edge(switch)
+            except Exception:
+                pass
+
+    def open(self):
+        if not self.port:
+            raise RelayError("Relay serial port is not configured")
+        try:
+            import serial
+        except ImportError:
+            raise RelayError("pyserial is not installed, the relay cannot be switched")
+
+        try:
+            # Non-blocking: write() takes what the driver buffer has room for
+            self.serial = serial.Serial(self.port, self.baudrate, timeout=0, write_timeout=0)
+        except (serial.SerialException, ValueError) as e:
+            raise RelayError(f"Cannot open relay port {self.port}: {e}")
+
+    def write_frame(self, frame):
+        # flush() only returns once the driver has sent the last byte, so the
+        # edge is not timed while the frame still queues
+        frame = memoryview(frame)
+        deadline = time.perf_counter() + self.timeout
+        try:
+            while frame:
+                written = self.serial.write(frame) or 0
+                frame = frame[written:]
+                if frame:
+                    if time.perf_counter() >= deadline:
+                        raise RelayError("write timed out")
+                    time.sleep(0.0005)
+            self.serial.flush()
+            edge = time.perf_counter()
+            # Modules that echo or answer leave bytes behind, they are not needed
+            self.serial.reset_input_buffer()
+            return edge
+        except Exception as e:
+            self.close_port()
+            raise RelayError(f"Relay port {self.port} write failed: {e}")
+
+    def close_port(self):
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except Exception:
+                pass
+        self.serial = None
+
+
+def parse_sequence(text):
+    # "OFF 2s, ON 30, WAIT 120, OFF 500ms" -> [SequenceStep]; durations are
+    # seconds unless marked ms. A switch without one is not held.
+    steps = []
+    for part in re.split(r'[,;\n]', text):
+        part = part.strip()
+        if not part:
+            continue
+        match = sequence_step_pattern.match(part)
+        if match is None:
+            raise ValueError(f"Invalid power sequence step: {part}")
+        action, value, unit = match.groups()
+        duration = float(value) if value else 0.0
+        if unit and unit.lower() == 'ms':
+            duration /= 1000
+        steps.append(SequenceStep(action.lower(), duration))
+    return steps
+
+
+def run_sequence(steps, switch, wait=None, repeat=1, stop_event=None):
+    # switch(on, due) switches at a perf_counter time and returns the edge.
+    # Every switch is due at a fixed offset from the sequence anchor rather than
+    # from the previous edge, so one late edge does not shift all that follow.
+    # A 'wait' step calls wait(duration), e.g. to wait for the boot, and moves
+    # the anchor to when it returned. Returns [(on, due, edge)].
+    edges = []
+    anchor = time.perf_counter()
+    offset = 0.0
+    for _ in range(repeat):
+        for step in steps:
+            if stop_event is not None and stop_event.is_set():
+                return edges
+            if step.action == 'wait':
+                # The switch before is held first
+                hold_until(anchor + offset, stop_event)
+                if wait is not None:
+                    wait(step.duration)
+                anchor = time.perf_counter()
+                offset = 0.0
+                continue
+
+            due = anchor + offset
+            edge = switch(step.action == 'on', due)
+            if edge is None:
+                return edges
+            edges.append((step.action == 'on', due, edge))
+            offset += step.duration
+
+    # The last step is held like every other one
+    hold_until(anchor + offset, stop_event)
+    return edges
+
+
+def hold_until(deadline, stop_event=None):
+    remaining = deadline - time.perf_counter()
+    if remaining > 0:
+        if stop_event is not None:
+            stop_event.wait(remaining)
+        else:
+            time.sleep(remaining)
+
+
+class RelayStandIn(threading.Thread):
+    # A relay on a pseudo terminal for benches and tests without the hardware:
+    # RelayDriver opens path like a serial port, the stand-in decodes the frames
+    # and keeps (perf_counter time, channel, on) for each one. on_switch, if
+    # given, is called with every decoded frame, e.g. to power a simulated ECU.
+    def __init__(self, on_switch=None):
+        super().__init__(name="RelayStandIn", daemon=True)
+        import pty
+        import tty
+
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.on_switch = on_switch
+        self.switches = []
+        self.states = {}
+        self.invalid = 0
+        self.stopping = False
+
+    def run(self):
+        import select
+
+        pending = b''
+        try:
+            while not self.stopping:
+                readable, _, _ = select.select([self.master], [], [], 0.1)
+                if not readable:
+                    continue
+                received = time.perf_counter()
+                try:
+                    data = os.read(self.master, 256)
+                except OSError:
+                    break
+                pending += data
+                # Resynchronise on the start byte after a broken frame
+                while len(pending) >= FRAME_SIZE:
+                    decoded = parse_relay_command(pending[:FRAME_SIZE])
+                    if decoded is None:
+                        self.invalid += 1
+                        start = pending.find(b'\xA0', 1)
+                        pending = pending[start:] if start >= 0 else b''
+                        continue
+                    pending = pending[FRAME_SIZE:]
+                    channel, on = decoded
+                    self.states[channel] = on
+                    self.switches.append((received, channel, on))
+                    if self.on_switch is not None:
+                        self.on_switch(channel, on)
+        finally:
+            for descriptor in (self.master, self.slave):
+                try:
+                    os.close(descriptor)
+                except OSError:
+                    pass
+
+    def stop(self):
+        self.stopping = True
+        self.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Switch the bench ignition relay or run a power sequence.")
+    parser.add_argument('--port', help="Serial port of the relay, e.g. COM4 or /dev/ttyUSB0 (default: a stand-in)")
+    parser.add_argument('--baudrate', type=int, default=DEFAULT_BAUDRATE)
+    parser.add_argument('--channel', type=int, default=IGNITION_CHANNEL)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('sequence', help='Power sequence, e.g. "OFF 2s, ON 30, OFF 2s, ON"')
+    arguments = parser.parse_args(argv)
+
+    try:
+        steps = parse_sequence(arguments.sequence)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stand_in = None
+    port = arguments.port
+    if not port:
+        stand_in = RelayStandIn()
+        stand_in.start()
+        port = stand_in.path
+        print(f"No port given, switching a stand-in relay on {port}")
+
+    start = time.perf_counter()
+    def report(switch):
+        if switch.error is not None:
+            print(f"IG {'ON' if switch.on else 'OFF'} failed: {switch.error}")
+            return
+        late = f", {switch.lateness * 1000:+.3f} ms from schedule" if switch.lateness is not None else ""
+        print(f"{switch.edge - start:10.4f} s  IG {'ON' if switch.on else 'OFF'}{late}")
+
+    driver = RelayDriver(port, arguments.baudrate, arguments.channel, on_edge=report)
+    stop_event = threading.Event()
+    try:
+        run_sequence(steps, driver.switch, wait=lambda duration: stop_event.wait(duration),
+                     repeat=arguments.repeat, stop_event=stop_event)
+    except RelayError as e:
+        print(e)
+        return 1
+    except KeyboardInterrupt:
+        stop_event.set()
+    finally:
+        driver.close()
+        if stand_in is not None:
+            stand_in.stop()
+            print(f"Stand-in received {len(stand_in.switches)} switches, {stand_in.invalid} invalid frames")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
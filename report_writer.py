@@ -0,0 +1,133 @@
+import math
+import re
+import threading
+import time
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+
+
+# Rows per worksheet including the header; longer series continue on "<title> (2)" etc.
+MAX_SHEET_ROWS = 1048576
+
+MAX_TITLE_LENGTH = 31
+
+SUMMARY_HEADER = ['KPI', 'ECU', 'Result', 'Started', 'Duration (s)', 'Reused from']
+
+RESULT_TEXT = {True: 'PASS', False: 'FAIL', None: 'Not Tested'}
+
+RESULT_FILLS = {
+    'PASS': PatternFill('solid', fgColor='60A917'),
+    'FAIL': PatternFill('solid', fgColor='FF0000'),
+    'Not Tested': PatternFill('solid', fgColor='D0CEE2')
+}
+
+
+class ReportSheet:
+    # Rows go straight to the workbook's temporary sheet file and are not kept,
+    # so memory does not grow with the number of samples written
+    def __init__(self, report, title, header):
+        self.report = report
+        self.title = title
+        self.header = list(header)
+        self.part = 0
+        self.worksheet = None
+        self.rows_in_sheet = MAX_SHEET_ROWS
+        self.row_count = 0
+
+    def append(self, rows, decimals=2):
+        # rows: a 2-D numpy array or a list of row lists; NaN becomes an empty cell
+        if hasattr(rows, 'round'):
+            rows = rows.round(decimals).tolist()
+
+        with self.report.lock:
+            if self.report.closed:
+                return
+            for row in rows:
+                if self.rows_in_sheet == MAX_SHEET_ROWS:
+                    self.next_part()
+                self.worksheet.append([None if isinstance(value, float) and math.isnan(value) else value
+                                       for value in row])
+                self.rows_in_sheet += 1
+            self.row_count += len(rows)
+
+    def next_part(self):
+        self.part += 1
+        title = self.title if self.part == 1 else f"{self.title[:MAX_TITLE_LENGTH - 5]} ({self.part})"
+        self.worksheet = self.report.create_worksheet(title)
+        self.worksheet.append([header_cell(self.worksheet, name) for name in self.header])
+        self.rows_in_sheet = 1
+
+
+class ReportWriter:
+    # Streaming .xlsx report for one run. The workbook is opened in write-only
+    # mode: every row is serialized when it is appended, and close() adds the
+    # Summary sheet and saves. Sheets may be written from several threads.
+    def __init__(self, path):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.lock = threading.Lock()
+        self.titles = set()
+        self.results = []
+        self.closed = False
+
+    def sheet(self, title, header):
+        return ReportSheet(self, title, header)
+
+    def create_worksheet(self, title):
+        title = unique_title(sheet_title(title), self.titles)
+        self.titles.add(title.lower())
+        return self.workbook.create_sheet(title)
+
+    def add_result(self, kpi, ecu_name, result, started=None, duration=None, reused_from=None):
+        # reused_from: run directory of a cached result taken over instead of running the KPI
+        with self.lock:
+            self.results.append((kpi, ecu_name, RESULT_TEXT.get(result, str(result)), started, duration, reused_from))
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+            summary = self.create_worksheet('Summary')
+            summary.append([header_cell(summary, name) for name in SUMMARY_HEADER])
+            for kpi, ecu_name, result, started, duration, reused_from in self.results:
+                result_cell = cell(summary, result)
+                result_cell.fill = RESULT_FILLS.get(result, RESULT_FILLS['Not Tested'])
+                summary.append([
+                    kpi,
+                    ecu_name,
+                    result_cell,
+                    time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)) if started else None,
+                    round(duration, 1) if duration is not None else None,
+                    reused_from
+                ])
+
+            self.workbook.save(self.path)
+
+
+def cell(worksheet, value):
+    return WriteOnlyCell(worksheet, value=value)
+
+
+def header_cell(worksheet, value):
+    header = cell(worksheet, value)
+    header.font = Font(bold=True)
+    return header
+
+
+def sheet_title(title):
+    # Excel rejects []:*?/\ in sheet names and anything over 31 characters
+    return re.sub(r'[\[\]:*?/\\]', '_', title).strip("'")[:MAX_TITLE_LENGTH] or 'Sheet'
+
+
+def unique_title(title, taken):
+    candidate = title
+    number = 2
+    while candidate.lower() in taken:
+        suffix = f" ({number})"
+        candidate = title[:MAX_TITLE_LENGTH - len(suffix)] + suffix
+        number += 1
+    return candidate
@@ -0,0 +1,259 @@
+import ast
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+
+
+# KPI results of earlier runs, one entry per KPI and ECU, addressed by a hash of
+# everything that could change the result: the KPI's configuration file and
+# implementation (its module and the modules of the tool it imports), the
+# target and the firmware image on it. One changed image only invalidates the
+# entries of that ECU.
+CACHE_DIRECTORY = os.path.join('results', 'cache')
+
+# Least recently used entries are deleted once the cache grows past this
+CACHE_MAX_BYTES = 2 << 30
+
+# Part of every key, bumped when the entry layout changes
+CACHE_FORMAT = 1
+
+# Run on the target; together these tell firmware images apart, files a target
+# does not have are skipped
+FIRMWARE_COMMAND = "cat /etc/version /etc/os-release /proc/version 2>/dev/null"
+
+ENTRY_FILE = 'entry.json'
+
+# Staging directories older than this were left behind by a run that was killed
+STALE_RECORDING = 2 * 24 * 3600
+
+# What a run does with the cache: neither use it, only store its results, or
+# also reuse results cached for unchanged configurations and firmware
+CACHE_OFF = 'off'
+CACHE_STORE = 'store'
+CACHE_REUSE = 'reuse'
+CACHE_MODES = [CACHE_OFF, CACHE_STORE, CACHE_REUSE]
+
+# Log lines kept with an entry and shown again when it is reused
+LOG_LINES = 1000
+
+# A cache hit offered for reuse before a run
+CachedResult = namedtuple('CachedResult', ['label', 'ecu_name', 'key', 'entry'])
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except OSError:
+        return ''
+    return digest.hexdigest()
+
+
+def firmware_id(output):
+    # Output of FIRMWARE_COMMAND -> (id, first line for display), or (None, '')
+    # when the target showed nothing to tell its firmware by
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    if not lines:
+        return None, ''
+    return hashlib.sha256('\n'.join(lines).encode()).hexdigest(), lines[0]
+
+
+def project_sources(module_path):
+    # The module and every module next to it that it imports, directly or
+    # through others; imports inside functions count too, most helpers are
+    # imported where they are used
+    directory = os.path.dirname(os.path.abspath(module_path))
+    found = set()
+    pending = [os.path.abspath(module_path)]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        try:
+            with open(path, 'rb') as f:
+                tree = ast.parse(f.read(), path)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = os.path.join(directory, name.split('.')[0] + '.py')
+                if os.path.isfile(candidate):
+                    pending.append(candidate)
+    return sorted(found)
+
+
+def code_digest(module_path):
+    # Changes with any source the KPI's verdict could depend on
+    digest = hashlib.sha256()
+    for path in project_sources(module_path):
+        digest.update(os.path.basename(path).encode() + b'\0' + file_digest(path).encode() + b'\0')
+    return digest.hexdigest()
+
+
+def result_key(label, config_path, code, ecu, firmware):
+    # code: code_digest() of the KPI module
+    digest = hashlib.sha256()
+    for part in [str(CACHE_FORMAT), label, file_digest(config_path), code,
+                 ecu.name, ecu.ip, ecu.telnet_port, ecu.ftp_port, firmware]:
+        digest.update(str(part).encode() + b'\0')
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # <directory>/<key[:2]>/<key>/ holds entry.json and one rows file per
+    # report sheet. The modification time of entry.json is the last use, so
+    # several processes (see bench_scheduler.py) can share a cache without an
+    # index to keep consistent.
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def entry_directory(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.entry_directory(key), ENTRY_FILE), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('format') == CACHE_FORMAT else None
+
+    def touch(self, key):
+        try:
+            os.utime(os.path.join(self.entry_directory(key), ENTRY_FILE))
+        except OSError:
+            pass
+
+    def sheet_rows(self, key, sheet):
+        # Row batches as they were appended
+        with open(os.path.join(self.entry_directory(key), sheet['file']), 'r') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def recording(self):
+        return CacheRecording(os.path.join(self.directory, 'tmp', uuid.uuid4().hex))
+
+    def store(self, key, recording, entry):
+        recording.close()
+        entry = dict(entry, format=CACHE_FORMAT, key=key, sheets=recording.sheets, logs=list(recording.logs),
+                     size=recording.size())
+        with open(os.path.join(recording.directory, ENTRY_FILE), 'w') as f:
+            json.dump(entry, f, indent=4)
+
+        path = self.entry_directory(key)
+        with self.lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(recording.directory, path)
+            self.evict()
+
+    def entries(self):
+        # [(last use, size, directory)]
+        entries = []
+        for prefix in os.listdir(self.directory):
+            if prefix == 'tmp' or not os.path.isdir(os.path.join(self.directory, prefix)):
+                continue
+            for key in os.listdir(os.path.join(self.directory, prefix)):
+                path = os.path.join(self.directory, prefix, key)
+                try:
+                    last_use = os.path.getmtime(os.path.join(path, ENTRY_FILE))
+                except OSError:
+                    continue
+                size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+                entries.append((last_use, size, path))
+        return entries
+
+    def evict(self):
+        staging = os.path.join(self.directory, 'tmp')
+        for name in os.listdir(staging) if os.path.isdir(staging) else []:
+            path = os.path.join(staging, name)
+            if time.time() - os.path.getmtime(path) > STALE_RECORDING:
+                shutil.rmtree(path, ignore_errors=True)
+
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class CacheRecording:
+    # What one KPI run on one ECU produces, collected while it runs: the report
+    # rows go straight to files in a staging directory, only the last log lines
+    # are kept in memory. Stored by ResultCache.store() or discarded.
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.sheets = []
+        self.files = []
+        self.logs = deque(maxlen=LOG_LINES)
+        self.lock = threading.Lock()
+
+    def log(self, message):
+        self.logs.append(message)
+
+    def sheet(self, report_sheet):
+        with self.lock:
+            number = len(self.sheets)
+            self.sheets.append({'title': report_sheet.title, 'header': report_sheet.header,
+                                'file': f"sheet{number}.jsonl"})
+            self.files.append(open(os.path.join(self.directory, self.sheets[-1]['file']), 'w'))
+        return RecordedSheet(report_sheet, self, number)
+
+    def write_rows(self, number, rows):
+        # numpy scalars in row lists are written as plain numbers
+        line = json.dumps(rows, default=lambda value: value.item())
+        with self.lock:
+            self.files[number].write(line + '\n')
+
+    def size(self):
+        return sum(os.path.getsize(os.path.join(self.directory, sheet['file'])) for sheet in self.sheets)
+
+    def close(self):
+        with self.lock:
+            for f in self.files:
+                f.close()
+            self.files = []
+
+    def discard(self):
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class RecordedSheet:
+    # A report sheet whose rows are also written to the cache recording
+    def __init__(self, sheet, recording, number):
+        self.sheet = sheet
+        self.recording = recording
+        self.number = number
+
+    def append(self, rows, decimals=2):
+        if hasattr(rows, 'round'):
+            rows = rows.round(decimals).tolist()
+        self.sheet.append(rows, decimals)
+        self.recording.write_rows(self.number, rows)
+
+
+def describe_hit(hit):
+    entry = hit.entry
+    result = {True: 'PASS', False: 'FAIL'}.get(entry['result'], 'Not Tested')
+    when = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['started']))
+    return f"{hit.label} on {hit.ecu_name}: {result} ({when}, {entry['firmware']})"
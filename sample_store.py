@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+INDEX_FILE = 'index.json'
+
+# Files grow in steps of this many rows, so a long run remaps rarely
+GROWTH_ROWS = 1 << 16
+
+
+class SampleStoreWriter:
+    # Append-only columnar store: one raw file per column, memory mapped, plus
+    # index.json with the dtypes and the number of committed rows. Data lives in
+    # the page cache rather than the Python heap, so a multi-day run costs disk
+    # space, not RAM. Rows past the index row count (a crash mid-append) are ignored.
+    def __init__(self, directory, columns, dtypes=None, default_dtype=np.float64, index_interval=1.0):
+        self.directory = directory
+        self.columns = list(columns)
+        dtypes = dtypes or {}
+        self.dtypes = [np.dtype(dtypes.get(name, default_dtype)) for name in self.columns]
+        self.index_interval = index_interval
+
+        self.row_count = 0
+        self.capacity = 0
+        self.maps = []
+        self.last_index_time = 0.0
+        self.lock = threading.Lock()
+        self.closed = False
+
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, column_file_name(name, dtype)) for name, dtype in zip(self.columns, self.dtypes)]
+        for path in self.paths:
+            open(path, 'wb').close()
+        self.write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, rows):
+        # rows: 2-D array with one column per store column, in order
+        rows = np.asarray(rows)
+        if rows.ndim != 2 or rows.shape[1] != len(self.columns):
+            raise ValueError(f"Expected rows with {len(self.columns)} columns, got shape {rows.shape}")
+
+        with self.lock:
+            end = self.row_count + len(rows)
+            if end > self.capacity:
+                self.grow(end)
+
+            for i, column in enumerate(self.maps):
+                column[self.row_count:end] = rows[:, i]
+            self.row_count = end
+
+            now = time.monotonic()
+            if now - self.last_index_time >= self.index_interval:
+                self.last_index_time = now
+                self.write_index()
+
+    def grow(self, required_rows):
+        self.maps = []
+        self.capacity = -(-required_rows // GROWTH_ROWS) * GROWTH_ROWS
+        for path, dtype in zip(self.paths, self.dtypes):
+            with open(path, 'r+b') as f:
+                f.truncate(self.capacity * dtype.itemsize)
+            self.maps.append(np.memmap(path, dtype=dtype, mode='r+', shape=(self.capacity,)))
+
+    def flush(self):
+        with self.lock:
+            for column in self.maps:
+                column.flush()
+            self.write_index()
+
+    def write_index(self):
+        index = {
+            'rows': self.row_count,
+            'complete': self.closed,
+            'columns': [{'name': name, 'dtype': dtype.str, 'file': os.path.basename(path)}
+                        for name, dtype, path in zip(self.columns, self.dtypes, self.paths)]
+        }
+        temporary_path = os.path.join(self.directory, INDEX_FILE + '.tmp')
+        with open(temporary_path, 'w') as f:
+            json.dump(index, f, indent=4)
+        os.replace(temporary_path, os.path.join(self.directory, INDEX_FILE))
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+            for column in self.maps:
+                column.flush()
+            self.maps = []
+
+            # Drop the unused tail of the last growth step
+            for path, dtype in zip(self.paths, self.dtypes):
+                with open(path, 'r+b') as f:
+                    f.truncate(self.row_count * dtype.itemsize)
+            self.write_index()
+
+
+class SampleStoreReader:
+    # Read side for reports, charts and offline analysis. column() returns a
+    # read-only memmap slice, nothing is copied until the caller computes on it.
+    # refresh() picks up rows a writer committed since the store was opened.
+    def __init__(self, directory):
+        self.directory = directory
+        self.refresh()
+
+    def refresh(self):
+        with open(os.path.join(self.directory, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+
+        self.row_count = index['rows']
+        self.complete = index['complete']
+        self.columns = [column['name'] for column in index['columns']]
+        self.maps = {}
+        for column in index['columns']:
+            dtype = np.dtype(column['dtype'])
+            if self.row_count == 0:
+                self.maps[column['name']] = np.empty(0, dtype)
+            else:
+                self.maps[column['name']] = np.memmap(os.path.join(self.directory, column['file']),
+                                                      dtype=dtype, mode='r', shape=(self.row_count,))
+
+    def __len__(self):
+        return self.row_count
+
+    def column(self, name, start=0, stop=None):
+        return self.maps[name][start:stop]
+
+    def rows(self, start=0, stop=None, columns=None):
+        # A 2-D copy of the selected columns, for consumers that want rows
+        return np.column_stack([self.column(name, start, stop) for name in (columns or self.columns)])
+
+    def chunks(self, chunk_rows=GROWTH_ROWS, columns=None):
+        for start in range(0, self.row_count, chunk_rows):
+            yield self.rows(start, start + chunk_rows, columns)
+
+    def summary(self, name, chunk_rows=GROWTH_ROWS):
+        # Count, min, mean and max of one column, a slice at a time, so a
+        # multi-day column is never read into memory as a whole
+        count, minimum, maximum, total = 0, None, None, 0.0
+        for start in range(0, self.row_count, chunk_rows):
+            values = self.column(name, start, start + chunk_rows)
+            count += len(values)
+            minimum = values.min() if minimum is None else min(minimum, values.min())
+            maximum = values.max() if maximum is None else max(maximum, values.max())
+            total += float(values.sum(dtype=np.float64))
+        return {'count': count, 'min': minimum, 'mean': total / count if count else None, 'max': maximum}
+
+
+def column_file_name(name, dtype):
+    return f"{name}.{dtype.kind}{dtype.itemsize}"
+
+
+def export_csv(reader, path, columns=None, chunk_rows=GROWTH_ROWS):
+    columns = columns or reader.columns
+    with open(path, 'w', newline='') as f:
+        f.write(','.join(columns) + '\n')
+        for rows in reader.chunks(chunk_rows, columns):
+            np.savetxt(f, rows, delimiter=',', fmt='%.9g')
+
+
+def main(argv=None):
+    # Offline look at a run, e.g. python sample_store.py results/<run>/ECU1/CPU_and_Memory_Utilization/samples
+    parser = argparse.ArgumentParser(description="Summarize or export a sample store written by a KPI run.")
+    parser.add_argument('directory')
+    parser.add_argument('--columns', help="Comma separated columns (default: all)")
+    parser.add_argument('--csv', help="Also write the selected columns to this CSV file")
+    arguments = parser.parse_args(argv)
+
+    reader = SampleStoreReader(arguments.directory)
+    columns = [name.strip() for name in arguments.columns.split(',')] if arguments.columns else reader.columns
+    unknown = [name for name in columns if name not in reader.columns]
+    if unknown:
+        parser.error(f"Unknown column: {', '.join(unknown)} (store has {', '.join(reader.columns)})")
+
+    print(f"{len(reader)} rows{'' if reader.complete else ', store not closed (run still going or aborted)'}")
+    for name in columns:
+        values = reader.summary(name)
+        if values['count']:
+            print(f"{name}: min {values['min']:.6g}, mean {values['mean']:.6g}, max {values['max']:.6g}")
+        else:
+            print(f"{name}: no samples")
+    if arguments.csv:
+        export_csv(reader, arguments.csv, columns)
+        print(f"Written to {arguments.csv}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
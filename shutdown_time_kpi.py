@@ -0,0 +1,216 @@
+import select
+
+from event_capture import PROBE_ACCEPTED, PROBE_NO_ANSWER, CaptureThread, PortProbe, timestamp
+from kpi_engine import KpiStopped
+from telnet_pool import TelnetSession
+
+
+# Consecutive probe cycles that must agree before a port or the network counts
+# as down, so one lost SYN is not a shutdown; the change is timed at the first
+CONFIRM_PROBES = 2
+
+# Time the services get to answer a probe before IG OFF
+BASELINE_TIMEOUT = 5
+
+
+def capture_shutdown(capture, log_socket, probes, interval, probe_timeout):
+    # Follows the target's log over an open telnet connection and probes its
+    # telnet and FTP ports every interval, all on one high-priority CaptureThread
+    next_cycle = timestamp()
+    while not capture.stop_event.is_set():
+        cycle = timestamp()
+        outcomes = {}
+        pending = {}
+        for probe in probes:
+            outcome = probe.start()
+            if outcome is None:
+                pending[probe.sock] = probe
+            else:
+                outcomes[probe.port] = outcome
+
+        # Skip missed cycles rather than probing back to back
+        next_cycle = max(next_cycle + interval, cycle)
+        probe_deadline = cycle + probe_timeout
+
+        # Serve the log socket until this cycle's probes are answered (or
+        # timed out) and the next cycle is due
+        while not capture.stop_event.is_set():
+            now = timestamp()
+            if pending and now >= probe_deadline:
+                for probe in pending.values():
+                    probe.close()
+                    outcomes[probe.port] = PROBE_NO_ANSWER
+                pending = {}
+            if not pending and now >= next_cycle:
+                break
+
+            readable, writable, failed = select.select([log_socket] if log_socket else [], list(pending),
+                                                       list(pending), (probe_deadline if pending else next_cycle) - now)
+            event_time = timestamp()
+
+            if readable:
+                try:
+                    data = log_socket.recv(65536)
+                except OSError:
+                    data = b''
+                if data:
+                    capture.add_event('log', event_time, data)
+                else:
+                    capture.add_event('log closed', event_time)
+                    log_socket = None
+
+            for sock in set(writable) | set(failed):
+                probe = pending.pop(sock)
+                outcomes[probe.port] = probe.finish()
+
+        capture.add_event('probe', cycle, outcomes)
+
+    for probe in probes:
+        probe.close()
+
+
+class ShutdownAnalysis:
+    # Turns the capture events into shutdown stages; fed by the KPI worker
+    def __init__(self, ports):
+        self.ports = ports
+        self.ignition_off = None
+        self.log_data = b''
+        self.last_log = None
+        self.log_closed = None
+        self.last_accepted = {port: None for port in ports}
+        self.refusing = {port: [] for port in ports}
+        self.port_down = {port: None for port in ports}
+        self.last_answer = None
+        self.silent = []
+        self.network_down = None
+
+    def feed(self, events):
+        for kind, event_time, data in events:
+            if kind == 'log':
+                lines = (self.log_data + data).split(b'\n')
+                self.log_data = lines.pop()
+                for line in lines:
+                    text = line.decode(errors='replace').strip()
+                    if text:
+                        self.last_log = (event_time, text)
+            elif kind == 'log closed':
+                if self.ignition_off is not None and self.log_closed is None:
+                    self.log_closed = event_time
+            elif kind == 'probe':
+                self.add_probe(event_time, data)
+
+    def add_probe(self, cycle, outcomes):
+        after_ignition_off = self.ignition_off is not None and cycle >= self.ignition_off
+
+        for port in self.ports:
+            if outcomes.get(port) == PROBE_ACCEPTED:
+                if self.port_down[port] is None:
+                    self.last_accepted[port] = cycle
+                    self.refusing[port] = []
+            elif after_ignition_off and self.port_down[port] is None and self.last_accepted[port] is not None:
+                self.refusing[port].append(cycle)
+                if len(self.refusing[port]) >= CONFIRM_PROBES:
+                    first = self.refusing[port][0]
+                    self.port_down[port] = (first, first - self.last_accepted[port])
+
+        if self.network_down is not None:
+            return
+        if any(outcome != PROBE_NO_ANSWER for outcome in outcomes.values()):
+            self.last_answer = cycle
+            self.silent = []
+        elif after_ignition_off and self.last_answer is not None:
+            self.silent.append(cycle)
+            if len(self.silent) >= CONFIRM_PROBES:
+                self.network_down = (self.silent[0], self.silent[0] - self.last_answer)
+
+    def answering(self):
+        # Ports that accepted a connection so far
+        return [port for port in self.ports if self.last_accepted[port] is not None]
+
+
+def run(context):
+    config = context.config()
+    probe_interval = config['probe_interval'] / 1000
+    probe_timeout = config['probe_timeout'] / 1000
+    shutdown_timeout = config['shutdown_timeout']
+    max_shutdown_time = config['max_shutdown_time']
+
+    telnet_port = context.telnet_port
+    port_names = {telnet_port: 'Telnet', context.ftp_port: 'FTP'}
+    analysis = ShutdownAnalysis(list(port_names))
+
+    # A connection of its own rather than a pooled one, it dies with the target
+    session = TelnetSession(context.ecu.ip, context.ecu.telnet_username, context.ecu.telnet_password, telnet_port)
+    session.connect_with_backoff()
+    session.write(config['log_follow_command'] + "\n")
+
+    probes = [PortProbe(context.ecu.ip, port) for port in port_names]
+    capture = CaptureThread(f"ShutdownCapture-{context.ecu.name}",
+                            lambda thread: capture_shutdown(thread, session.sock, probes, probe_interval, probe_timeout))
+    capture.start()
+    ignition_off = None
+    try:
+        baseline_deadline = timestamp() + BASELINE_TIMEOUT
+        while len(analysis.answering()) < len(port_names) and timestamp() < baseline_deadline:
+            context.sleep(0.1)
+            analysis.feed(capture.take_events())
+        if not capture.priority_raised:
+            context.log("Capture thread priority could not be raised, it runs at normal priority")
+        if telnet_port not in analysis.answering():
+            context.log("Telnet port not answering before IG OFF")
+            return False
+        for port in set(port_names) - set(analysis.answering()):
+            context.log(f"{port_names[port]} port not answering before IG OFF, its stage is skipped")
+
+        ignition_off = context.switch_ignition(False)
+        analysis.ignition_off = ignition_off
+        deadline = ignition_off + shutdown_timeout
+        while analysis.network_down is None and timestamp() < deadline:
+            context.sleep(0.1)
+            analysis.feed(capture.take_events())
+            if capture.error is not None:
+                raise capture.error
+            context.progress(90 * min(1.0, (timestamp() - ignition_off) / shutdown_timeout))
+    finally:
+        capture.stop()
+        session.close()
+        # Back on, also after STOP or an error, so the bench is usable for the KPIs that follow
+        if ignition_off is not None:
+            try:
+                context.switch_ignition(True)
+            except KpiStopped:
+                pass
+    analysis.feed(capture.take_events())
+
+    # (stage, seconds from IG OFF, how long before that it may have happened, detail)
+    events = []
+    if analysis.last_log is not None:
+        events.append(('Last log line', analysis.last_log[0] - ignition_off, 0.0, analysis.last_log[1]))
+    if analysis.log_closed is not None:
+        events.append(('Log connection closed', analysis.log_closed - ignition_off, 0.0, ''))
+    for port, name in port_names.items():
+        if analysis.port_down[port] is not None:
+            down, window = analysis.port_down[port]
+            events.append((f"{name} unreachable", down - ignition_off, window, ''))
+    if analysis.network_down is not None:
+        down, window = analysis.network_down
+        events.append(('Network down', down - ignition_off, window, ''))
+    events.sort(key=lambda event: event[1])
+
+    sheet = context.report_sheet(['stage', 'from IG OFF (s)', 'since previous stage (s)', 'window (s)', 'detail'],
+                                 title=f"{context.ecu.name} Shutdown")
+    previous = 0.0
+    for name, latency, window, detail in events:
+        context.log(f"{name}: {latency:.3f} sec after IG OFF (+{latency - previous:.3f} sec, "
+                    f"within the {window * 1000:.1f} ms before)" + (f": {detail}" if detail else ""))
+        sheet.append([[name, round(latency, 6), round(latency - previous, 6), round(window, 6), detail]])
+        previous = latency
+
+    context.progress(100)
+
+    if analysis.network_down is None:
+        context.log(f"Network still up {shutdown_timeout} sec after IG OFF")
+        return False
+    shutdown_time = analysis.network_down[0] - ignition_off
+    context.log(f"Shutdown time {shutdown_time:.3f} sec, limit {max_shutdown_time:g} sec")
+    return shutdown_time <= max_shutdown_time
@@ -0,0 +1,285 @@
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from PyQt5.QtCore import QEvent, QObject, Qt, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QLabel
+
+
+# Opt-in: set to the stall threshold in milliseconds to switch the watchdog on,
+# e.g. GUI_STALL_WATCHDOG=250
+WATCHDOG_VARIABLE = 'GUI_STALL_WATCHDOG'
+DEFAULT_THRESHOLD = 0.25
+
+# One JSON object per stall; rolled over so a long session cannot fill the disk
+TRACE_FILE = os.path.join('results', 'stall_trace.jsonl')
+TRACE_MAX_BYTES = 2 << 20
+TRACE_BACKUPS = 3
+
+HEARTBEAT_INTERVAL = 0.01
+
+# Slot calls kept to find the ones that ran during a stall
+RECENT_CALLS = 2000
+
+OVERLAY_TIMEOUT = 10000
+
+# A slot call that merely overlapped a stall is only blamed for it when it took
+# at least this share of the stall
+BLAMED_SHARE = 0.5
+
+
+def watchdog_threshold():
+    # Seconds, or None when the watchdog is off
+    value = os.environ.get(WATCHDOG_VARIABLE, '').strip()
+    if not value or value == '0':
+        return None
+    try:
+        return float(value) / 1000
+    except ValueError:
+        return DEFAULT_THRESHOLD
+
+
+class SlotTimings:
+    # Times every call of the instrumented methods. instrument() replaces them
+    # on the instance, so it has to run before they are connected to signals.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.recent = deque(maxlen=RECENT_CALLS)
+        # Slots running right now on the GUI thread, outermost first
+        self.active = []
+
+    def instrument(self, target, names):
+        for name in names:
+            setattr(target, name, self.timed(name, getattr(target, name)))
+
+    def timed(self, name, method):
+        # Signals pass more arguments than some slots take (stateChanged to
+        # update_checkbox_states); PyQt drops them for the plain method, so do the same
+        parameters = inspect.signature(method).parameters.values()
+        if any(parameter.kind == parameter.VAR_POSITIONAL for parameter in parameters):
+            count = None
+        else:
+            count = sum(parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+                        for parameter in parameters)
+
+        @functools.wraps(method)
+        def slot(*args, **kwargs):
+            start = time.perf_counter()
+            entry = (name, start)
+            self.active.append(entry)
+            try:
+                return method(*args[:count], **kwargs)
+            finally:
+                self.active.remove(entry)
+                self.record(name, start, time.perf_counter() - start)
+        return slot
+
+    def record(self, name, start, duration):
+        with self.lock:
+            calls, total, longest = self.totals.get(name, (0, 0.0, 0.0))
+            self.totals[name] = (calls + 1, total + duration, max(longest, duration))
+            self.recent.append((name, start, duration))
+
+    def running(self, now):
+        return [{'slot': name, 'running_ms': round((now - start) * 1000, 1)} for name, start in list(self.active)]
+
+    def calls_between(self, start, end):
+        with self.lock:
+            recent = list(self.recent)
+        return [{'slot': name, 'start_ms': round((call_start - start) * 1000, 1),
+                 'duration_ms': round(duration * 1000, 2)}
+                for name, call_start, duration in recent if call_start < end and call_start + duration > start]
+
+    def snapshot(self):
+        with self.lock:
+            return {name: {'calls': calls, 'total_ms': round(total * 1000, 1), 'max_ms': round(longest * 1000, 2)}
+                    for name, (calls, total, longest) in self.totals.items()}
+
+
+def capture_stacks():
+    # Every thread's Python stack, taken from the monitor thread while the GUI
+    # thread is still stuck in whatever blocks it
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    main = threading.main_thread().ident
+    stacks = []
+    for ident, frame in sys._current_frames().items():
+        if ident == threading.get_ident():
+            continue
+        stacks.append({
+            'thread': names.get(ident, str(ident)),
+            'gui': ident == main,
+            'stack': [f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}: {entry.line or ''}".rstrip()
+                      for entry in traceback.extract_stack(frame)]
+        })
+    stacks.sort(key=lambda entry: not entry['gui'])
+    return stacks
+
+
+class StallWatchdog(QObject):
+    # A precise heartbeat timer on the GUI thread and a monitor thread watching
+    # it. Once the heartbeat has been silent for longer than the threshold the
+    # monitor captures all stacks; when the heartbeat is back the stall is
+    # written to the trace file with the slot calls that ran during it, and
+    # stall_detected is emitted (queued, so the slots run on the GUI thread).
+    stall_detected = pyqtSignal(object)
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, trace_file=TRACE_FILE, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.trace_file = os.path.abspath(trace_file)
+        self.slot_timings = SlotTimings()
+
+        self.last_beat = time.perf_counter()
+        self.resumed = queue.SimpleQueue()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.stall_count = 0
+        self.worst = 0.0
+
+        self.heartbeat = QTimer(self)
+        self.heartbeat.setTimerType(Qt.PreciseTimer)
+        self.heartbeat.timeout.connect(self.beat)
+
+        self.trace = logging.getLogger('stall_trace')
+        self.trace.propagate = False
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.trace_file), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(self.trace_file, maxBytes=TRACE_MAX_BYTES,
+                                                       backupCount=TRACE_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.trace.addHandler(handler)
+        self.trace.setLevel(logging.INFO)
+
+        self.last_beat = time.perf_counter()
+        self.heartbeat.start(int(HEARTBEAT_INTERVAL * 1000))
+        self.thread = threading.Thread(target=self.monitor, name='stall watchdog', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.heartbeat.stop()
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for handler in list(self.trace.handlers):
+            self.trace.removeHandler(handler)
+            handler.close()
+
+    def beat(self):
+        now = time.perf_counter()
+        previous = self.last_beat
+        # Queued before the beat moves on, so the monitor never sees the
+        # heartbeat back without the stall it reports
+        if self.is_stall(now - previous):
+            self.resumed.put((previous, now))
+        self.last_beat = now
+
+    def is_stall(self, silence):
+        # The one condition for both threads: stacks captured for a pause that
+        # is not reported would end up attached to the next stall
+        return silence - HEARTBEAT_INTERVAL > self.threshold
+
+    def monitor(self):
+        captured = None
+        captured_beat = None
+        while not self.stop_event.wait(min(self.threshold / 4, 0.05)):
+            now = time.perf_counter()
+            last_beat = self.last_beat
+            if captured is not None and last_beat != captured_beat and self.resumed.empty():
+                # The heartbeat is back and nothing was reported: not a stall after all
+                captured = None
+            if captured is None and self.is_stall(now - last_beat):
+                captured_beat = last_beat
+                captured = {'captured_after_ms': round((now - last_beat) * 1000, 1),
+                            'running_slots': self.slot_timings.running(now),
+                            'threads': capture_stacks()}
+
+            try:
+                start, end = self.resumed.get_nowait()
+            except queue.Empty:
+                continue
+
+            # A stall shorter than the polling interval ends before it is sampled
+            report = {
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'duration_ms': round((end - start) * 1000, 1),
+                'threshold_ms': round(self.threshold * 1000, 1),
+                'slot_calls': self.slot_timings.calls_between(start, end),
+                'slot_totals': self.slot_timings.snapshot()
+            }
+            # Stacks only go with the stall they were captured in
+            stacks_match = captured is not None and start == captured_beat
+            report.update(captured if stacks_match else {'threads': []})
+            captured = None
+
+            self.stall_count += 1
+            self.worst = max(self.worst, end - start)
+            self.trace.info(json.dumps(report))
+            self.stall_detected.emit(report)
+
+
+def stall_location(report):
+    # Innermost instrumented slot running when the stall was sampled, else the
+    # GUI thread's innermost frame; a stall too short to be sampled only has
+    # the slot calls during it
+    running = report.get('running_slots')
+    if running:
+        return running[-1]['slot']
+    for thread in report['threads']:
+        if thread['gui'] and thread['stack']:
+            return thread['stack'][-1].split(': ', 1)[0]
+    longest = max(report['slot_calls'], key=lambda call: call['duration_ms'], default=None)
+    if longest is not None and longest['duration_ms'] >= BLAMED_SHARE * report['duration_ms']:
+        return longest['slot']
+    return None
+
+
+class StallOverlay(QLabel):
+    # Floats over the top right corner of a view (the Console's log view) for a
+    # while after each stall; a click hides it
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.setStyleSheet("background-color: rgba(255, 255, 136, 230); border: 1px solid #E81123; padding: 4px;")
+        self.hide()
+        view.installEventFilter(self)
+
+        self.hide_timer = QTimer(self)
+        self.hide_timer.setSingleShot(True)
+        self.hide_timer.timeout.connect(self.hide)
+
+    def show_stall(self, report, stall_count, worst, trace_file):
+        location = stall_location(report)
+        text = f"Event loop stalled for {report['duration_ms']:.0f} ms"
+        if location:
+            text += f" in {location}"
+        text += f"\n{stall_count} stalls, worst {worst * 1000:.0f} ms, details in {trace_file}"
+        self.setText(text)
+        self.adjustSize()
+        self.place()
+        self.show()
+        self.raise_()
+        self.hide_timer.start(OVERLAY_TIMEOUT)
+
+    def place(self):
+        self.move(max(0, self.view.width() - self.width() - 24), 8)
+
+    def eventFilter(self, watched, event):
+        if watched is self.view and event.type() == QEvent.Resize:
+            self.place()
+        return False
+
+    def mousePressEvent(self, event):
+        self.hide()
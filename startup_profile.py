@@ -0,0 +1,95 @@
+import builtins
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+# Latest launch in full, plus one summary line per launch to spot regressions
+PROFILE_FILE = os.path.join('results', 'startup_profile.json')
+HISTORY_FILE = os.path.join('results', 'startup_history.jsonl')
+
+# Imports faster than this are left out of the profile
+MIN_IMPORT_TIME = 0.001
+
+
+class StartupProfile:
+    # Phase and import timings of one launch. start() hooks __import__ so that
+    # every module imported for the first time is timed, with the time spent
+    # in its own nested imports subtracted ('self') as well as included ('total').
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = []
+        self.imports = []
+        self.import_stack = []
+        self.original_import = None
+
+    def start(self):
+        if self.original_import is None:
+            self.original_import = builtins.__import__
+            builtins.__import__ = self.timed_import
+
+    def stop_import_timing(self):
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.import_stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter() - start
+            nested = self.import_stack.pop()
+            if self.import_stack:
+                self.import_stack[-1] += total
+            if total >= MIN_IMPORT_TIME:
+                self.imports.append({'module': name, 'total': total, 'self': total - nested,
+                                     'depth': len(self.import_stack)})
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({'phase': name, 'start': start - self.start_time,
+                                'duration': time.perf_counter() - start})
+
+    def mark(self, name):
+        # A point in time rather than a span, e.g. the first event loop iteration
+        self.phases.append({'phase': name, 'start': time.perf_counter() - self.start_time, 'duration': 0.0})
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def write(self, profile_file=PROFILE_FILE, history_file=HISTORY_FILE):
+        self.stop_import_timing()
+
+        total = self.elapsed()
+        profile = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'total': total,
+            'phases': self.phases,
+            'imports': sorted(self.imports, key=lambda entry: entry['total'], reverse=True)
+        }
+
+        os.makedirs(os.path.dirname(profile_file), exist_ok=True)
+        with open(profile_file, 'w') as f:
+            json.dump(profile, f, indent=4)
+
+        summary = {'time': profile['time'], 'total': round(total, 4)}
+        summary.update({phase['phase']: round(phase['duration'], 4) for phase in self.phases if phase['duration']})
+        with open(history_file, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+
+        return total
+
+
+# Started as early as possible by the application entry point
+profile = StartupProfile()
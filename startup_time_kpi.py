@@ -0,0 +1,105 @@
+import re
+import socket
+
+from event_capture import BootMarkers, TargetClock, timestamp
+
+
+# (configuration field, stage) in boot order; the last one decides the verdict
+STAGES = [
+    ('kernel_marker', 'Kernel up'),
+    ('services_marker', 'Services ready'),
+    ('application_marker', 'App ready'),
+]
+
+# Connect attempt length while waiting for the booting target's telnet port
+PORT_PROBE_TIMEOUT = 0.2
+
+
+def run(context):
+    config = context.config()
+
+    stages = []
+    for field, name in STAGES:
+        try:
+            stages.append((name, re.compile(config[field])))
+        except re.error as e:
+            raise ValueError(f"Invalid {name} marker: {e}")
+
+    boot_timeout = config['boot_timeout']
+    max_startup_time = config['max_startup_time']
+
+    # Power cycle first, IG ON is only meaningful from a switched off ECU. The
+    # relay schedules IG ON from the OFF edge, so the off time is exact.
+    ignition_off = context.switch_ignition(False)
+    ignition_on = context.switch_ignition(True, at=ignition_off + config['off_time'])
+    deadline = ignition_on + boot_timeout
+
+    port_open = wait_for_port(context, deadline)
+    if port_open is None:
+        context.log(f"Telnet port not open within {boot_timeout} sec")
+        return False
+    context.progress(30)
+
+    # Kernel and journal timestamps are read back once the target is up and
+    # mapped onto the host clock, so the boot itself is never timed over the network
+    with context.telnet_session() as session:
+        clock = TargetClock.measure(session)
+        if clock.boot_time + clock.uncertainty < ignition_on:
+            context.log("Target clock started before IG ON, the ECU was not power cycled")
+            return False
+
+        markers = BootMarkers(stages)
+        while True:
+            session.run_lines(config['boot_log_command'], markers.feed, timeout=30)
+            if markers.complete() or timestamp() >= deadline:
+                break
+            context.progress(30 + 60 * min(1.0, (timestamp() - ignition_on) / boot_timeout))
+            context.sleep(1)
+
+    # (stage, seconds from IG ON, uncertainty, log line)
+    events = [
+        ('Kernel start', clock.boot_time - ignition_on, clock.uncertainty, ''),
+        ('Telnet port open', port_open[0] - ignition_on, port_open[1], '')
+    ]
+    for name, (target_time, text) in markers.found.items():
+        events.append((name, clock.to_host(target_time) - ignition_on, clock.uncertainty, text))
+    events.sort(key=lambda event: event[1])
+
+    sheet = context.report_sheet(['stage', 'from IG ON (s)', 'since previous stage (s)', 'uncertainty (s)', 'log line'],
+                                 title=f"{context.ecu.name} Startup")
+    previous = 0.0
+    for name, latency, uncertainty, text in events:
+        context.log(f"{name}: {latency:.3f} sec after IG ON (+{latency - previous:.3f} sec, ±{uncertainty * 1000:.1f} ms)")
+        sheet.append([[name, round(latency, 6), round(latency - previous, 6), round(uncertainty, 6), text]])
+        previous = latency
+
+    for name, _ in stages:
+        if name not in markers.found:
+            context.log(f"{name} marker not found within {boot_timeout} sec")
+
+    context.progress(100)
+
+    final_stage = stages[-1][0]
+    if final_stage not in markers.found:
+        return False
+    startup_time = clock.to_host(markers.found[final_stage][0]) - ignition_on
+    context.log(f"Startup time {startup_time:.3f} sec, limit {max_startup_time:g} sec")
+    return startup_time <= max_startup_time
+
+
+def wait_for_port(context, deadline):
+    # Returns (time the telnet port first accepted, how long before that it
+    # may already have been open), or None at the deadline
+    last_refused = timestamp()
+    while timestamp() < deadline:
+        try:
+            connection = socket.create_connection((context.ecu.ip, context.telnet_port), timeout=PORT_PROBE_TIMEOUT)
+        except OSError:
+            last_refused = timestamp()
+            context.sleep(0.05)
+            continue
+
+        opened = timestamp()
+        connection.close()
+        return opened, opened - last_refused
+    return None
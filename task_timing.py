@@ -0,0 +1,116 @@
+import numpy as np
+
+from latency_histogram import LatencyHistogram
+
+
+# Trace records buffered before they are converted and recorded in one go
+BATCH_SIZE = 65536
+
+
+class TaskTimingAggregator:
+    # Periods and response times of cyclic tasks from trace lines of the form
+    #   <seconds> <task> <event> [...]
+    # where event is the start or end word of one activation. Lines are only
+    # split while they stream in; conversion, sorting and pairing run per batch
+    # in numpy and end in fixed-size histograms, so memory stays flat however
+    # long the trace is.
+    def __init__(self, start_event='start', end_event='end', batch_size=BATCH_SIZE):
+        self.start_event = start_event
+        self.end_event = end_event
+        self.batch_size = batch_size
+        self.times = []
+        self.tasks = []
+        self.events = []
+        self.periods = {}
+        self.responses = {}
+        # Per task: the last start (for the next period) and a start still waiting for its end
+        self.last_start = {}
+        self.open_start = {}
+        self.records = 0
+        self.ignored = 0
+
+    def feed(self, line):
+        parts = line.split(None, 3)
+        if len(parts) < 3 or parts[2] not in (self.start_event, self.end_event):
+            self.ignored += 1
+            return
+        self.times.append(parts[0])
+        self.tasks.append(parts[1])
+        self.events.append(parts[2])
+        if len(self.times) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.times:
+            return
+        times = self.convert_times()
+        task_names, task_ids = np.unique(np.array(self.tasks), return_inverse=True)
+        is_start = np.array(self.events) == self.start_event
+        self.times, self.tasks, self.events = [], [], []
+
+        valid = ~np.isnan(times)
+        self.ignored += int(np.count_nonzero(~valid))
+        times = np.rint(times[valid] * 1e9).astype(np.int64)
+        task_ids = task_ids[valid]
+        is_start = is_start[valid]
+        self.records += int(times.size)
+
+        # Group by task, in time order within each task
+        order = np.lexsort((times, task_ids))
+        times, task_ids, is_start = times[order], task_ids[order], is_start[order]
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(task_ids)) + 1, [times.size]))
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            if first < last:
+                self.add_task_batch(str(task_names[task_ids[first]]), times[first:last], is_start[first:last])
+
+    def convert_times(self):
+        try:
+            return np.array(self.times).astype(np.float64)
+        except ValueError:
+            # Rare: a line with a non-numeric time slipped in, drop just that one
+            times = np.empty(len(self.times))
+            for index, text in enumerate(self.times):
+                try:
+                    times[index] = float(text)
+                except ValueError:
+                    times[index] = np.nan
+            return times
+
+    def add_task_batch(self, task, times, is_start):
+        if task not in self.periods:
+            self.periods[task] = LatencyHistogram()
+            self.responses[task] = LatencyHistogram()
+
+        starts = times[is_start]
+        if task in self.last_start:
+            # The period across the batch boundary starts at the previous batch's last start
+            self.periods[task].record(np.diff(starts, prepend=self.last_start[task]))
+        else:
+            self.periods[task].record(np.diff(starts))
+        if starts.size:
+            self.last_start[task] = int(starts[-1])
+
+        # An end answers the start right before it; an end without one is dropped
+        if task in self.open_start:
+            times = np.concatenate(([self.open_start.pop(task)], times))
+            is_start = np.concatenate(([True], is_start))
+        ends = np.flatnonzero(~is_start[1:] & is_start[:-1]) + 1
+        self.responses[task].record(times[ends] - times[ends - 1])
+        if is_start[-1]:
+            self.open_start[task] = int(times[-1])
+
+    def merge(self, other):
+        # Histograms of another iteration or bench; the tasks are matched by name
+        for task in other.periods:
+            if task not in self.periods:
+                self.periods[task] = LatencyHistogram()
+                self.responses[task] = LatencyHistogram()
+            self.periods[task].merge(other.periods[task])
+            self.responses[task].merge(other.responses[task])
+        self.records += other.records
+        self.ignored += other.ignored
+        return self
+
+    def histograms(self):
+        return {task: {'period': self.periods[task].to_dict(), 'response': self.responses[task].to_dict()}
+                for task in sorted(self.periods)}
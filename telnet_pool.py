@@ -0,0 +1,391 @@
+import re
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+# Telnet protocol bytes (RFC 854)
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+
+TELNET_PORT = 23
+
+# Exit status and terminator that follow a sentinel marker
+sentinel_status_pattern = re.compile(rb"(\d+)__\r?\n")
+
+
+class TelnetError(Exception):
+    pass
+
+
+class TelnetTimeout(TelnetError):
+    pass
+
+
+class TelnetSession:
+    def __init__(self, host, username, password, port=TELNET_PORT, timeout=10,
+                 connect_retries=4, backoff_initial=0.5, backoff_max=8.0):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port
+        self.timeout = timeout
+        self.connect_retries = connect_retries
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self.sock = None
+        self.buffer = bytearray()
+        self.iac_state = None
+        self.sequence = 0
+        self.token = uuid.uuid4().hex[:12]
+        self.last_used = time.monotonic()
+        # Whether anything arrived since the last batch went out
+        self.answered = False
+
+    def is_connected(self):
+        return self.sock is not None
+
+    def connect(self):
+        self.close()
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        try:
+            self.read_until([b"login:"])
+            self.write(self.username + "\n")
+            self.read_until([b"assword:"])
+            self.write(self.password + "\n")
+
+            self.synchronize()
+        except Exception:
+            self.close()
+            raise
+
+        self.last_used = time.monotonic()
+
+    def synchronize(self):
+        # Turn off echo and prompts so everything read back is command output.
+        # The target may flush input typed ahead of the shell (login and stty both
+        # do), so repeat the setup until its sentinel comes back; this also drains
+        # the login banner.
+        deadline = time.monotonic() + self.timeout
+        while True:
+            self.sequence += 1
+            self.write("stty -echo 2>/dev/null; PS1=''; PS2=''; export PS1 PS2\n" + self.sentinel_command(self.sequence))
+            try:
+                self.read_sentinel(self.sequence, [b"incorrect", b"denied"], timeout=min(1.0, self.timeout))
+                return
+            except TelnetTimeout:
+                if time.monotonic() >= deadline:
+                    raise
+
+    def connect_with_backoff(self):
+        delay = self.backoff_initial
+        for attempt in range(self.connect_retries + 1):
+            try:
+                self.connect()
+                return
+            except (OSError, TelnetError) as e:
+                if attempt == self.connect_retries:
+                    raise TelnetError(f"Unable to connect to {self.host}:{self.port}: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.buffer = bytearray()
+        self.iac_state = None
+
+    def write(self, text):
+        data = text.encode() if isinstance(text, str) else text
+        self.sock.sendall(data.replace(bytes([IAC]), bytes([IAC, IAC])))
+
+    def sentinel_command(self, sequence):
+        # Printed with printf so the echoed command line can never match the pattern
+        return f"printf '\\n__PFV_%s_%d_%d__\\n' {self.token} {sequence} $?\n"
+
+    def run(self, command, timeout=None):
+        return self.run_batch([command], timeout)[0]
+
+    def run_batch(self, commands, timeout=None):
+        # Reconnect transparently once if the target dropped the session before
+        # answering (an idle pooled session). After a timeout or once output has
+        # arrived the commands may be running or done, so they are not sent again.
+        if self.sock is None:
+            self.connect_with_backoff()
+        self.answered = False
+        try:
+            return self.send_batch(commands, timeout)
+        except TelnetTimeout:
+            raise
+        except (OSError, TelnetError):
+            if self.answered:
+                raise
+            self.connect_with_backoff()
+            return self.send_batch(commands, timeout)
+
+    def run_lines(self, command, on_line, timeout=None):
+        # Like run(), but each output line goes to on_line as soon as it has
+        # arrived, so a large output is parsed while it streams in rather than
+        # collected first. The timeout applies to every read, not the whole command.
+        if self.sock is None:
+            self.connect_with_backoff()
+
+        self.sequence += 1
+        self.write(command.rstrip("\n") + "\n" + self.sentinel_command(self.sequence))
+
+        timeout = timeout if timeout is not None else self.timeout
+        marker = f"__PFV_{self.token}_{self.sequence}_".encode()
+        held_empty_line = False
+        while True:
+            start = 0
+            while True:
+                newline = self.buffer.find(b"\n", start)
+                if newline < 0:
+                    break
+                line = self.buffer[start:newline]
+                if line.startswith(marker):
+                    match = sentinel_status_pattern.match(self.buffer, start + len(marker))
+                    status = int(bytes(match.group(1)))
+                    del self.buffer[:match.end()]
+                    self.last_used = time.monotonic()
+                    return status
+                start = newline + 1
+
+                # The sentinel is printed after an empty line of its own, hold
+                # every empty line back until it is clear it is not that one
+                if held_empty_line:
+                    on_line("")
+                held_empty_line = not line.strip(b"\r")
+                if not held_empty_line:
+                    on_line(bytes(line).rstrip(b"\r").decode(errors='replace'))
+            del self.buffer[:start]
+
+            self.receive(time.monotonic() + timeout)
+
+    def send_batch(self, commands, timeout=None):
+        # All commands go out in a single write, each followed by a sentinel that
+        # carries its exit status, so the batch costs one round trip
+        sequences = []
+        payload = []
+        for command in commands:
+            self.sequence += 1
+            sequences.append(self.sequence)
+            payload.append(command.rstrip("\n") + "\n")
+            payload.append(self.sentinel_command(self.sequence))
+
+        self.write("".join(payload))
+
+        results = []
+        for sequence in sequences:
+            output, status = self.read_sentinel(sequence, timeout=timeout)
+            results.append((status, output))
+
+        self.last_used = time.monotonic()
+        return results
+
+    def read_sentinel(self, sequence, failures=(), timeout=None):
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        marker = f"__PFV_{self.token}_{sequence}_".encode()
+        search_from = 0
+        while True:
+            # Only scan the newly received tail, large outputs arrive in many reads
+            index = self.buffer.find(marker, search_from)
+            if index >= 0:
+                match = sentinel_status_pattern.match(self.buffer, index + len(marker))
+                if match:
+                    end = index - 1 if index > 0 and self.buffer[index - 1] == ord("\n") else index
+                    output = bytes(self.buffer[:end])
+                    status = int(bytes(match.group(1)))
+                    del self.buffer[:match.end()]
+                    return output.replace(b"\r", b"").decode(errors='replace'), status
+                search_from = index
+            else:
+                search_from = max(0, len(self.buffer) - len(marker))
+
+            for failure in failures:
+                if failure in self.buffer:
+                    raise TelnetError(f"Login to {self.host} failed")
+
+            self.receive(deadline)
+
+    def read_until(self, markers, timeout=None):
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        while True:
+            for marker in markers:
+                index = self.buffer.find(marker)
+                if index >= 0:
+                    data = bytes(self.buffer[:index + len(marker)])
+                    del self.buffer[:index + len(marker)]
+                    return data
+            self.receive(deadline)
+
+    def receive(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TelnetTimeout(f"Timed out waiting for {self.host}")
+
+        self.sock.settimeout(remaining)
+        try:
+            data = self.sock.recv(65536)
+        except socket.timeout:
+            raise TelnetTimeout(f"Timed out waiting for {self.host}")
+
+        if not data:
+            self.close()
+            raise TelnetError(f"Connection closed by {self.host}")
+
+        self.answered = True
+        self.buffer += self.filter_negotiation(data)
+
+    def filter_negotiation(self, data):
+        # Strip telnet commands out of the stream and refuse every option; the
+        # state survives across reads because a command can be split between them
+        if self.iac_state is None and IAC not in data:
+            return data
+
+        output = bytearray()
+        replies = bytearray()
+        state = self.iac_state
+
+        for byte in data:
+            if state is None:
+                if byte == IAC:
+                    state = IAC
+                else:
+                    output.append(byte)
+            elif state == IAC:
+                if byte == IAC:
+                    output.append(IAC)
+                    state = None
+                elif byte in (DO, DONT, WILL, WONT):
+                    state = byte
+                elif byte == SB:
+                    state = SB
+                else:
+                    state = None
+            elif state in (DO, DONT, WILL, WONT):
+                if state == DO:
+                    replies += bytes([IAC, WONT, byte])
+                elif state == WILL:
+                    replies += bytes([IAC, DONT, byte])
+                state = None
+            elif state == SB:
+                if byte == IAC:
+                    state = SE
+            elif state == SE:
+                state = None if byte == SE else SB
+
+        self.iac_state = state
+        if replies:
+            self.sock.sendall(bytes(replies))
+        return bytes(output)
+
+
+class TelnetPool:
+    # Authenticated sessions keyed by (IP, user). Concurrent KPIs on the same
+    # target each get their own session, up to max_sessions_per_target; idle
+    # sessions are kept alive in the background instead of logging in again.
+    def __init__(self, max_sessions_per_target=4, keepalive_interval=30, **session_options):
+        self.max_sessions_per_target = max_sessions_per_target
+        self.keepalive_interval = keepalive_interval
+        self.session_options = session_options
+
+        self.condition = threading.Condition()
+        self.idle = {}
+        self.in_use = {}
+        self.closed = False
+
+        self.keepalive_thread = threading.Thread(target=self.keepalive_loop, name="TelnetKeepalive", daemon=True)
+        self.keepalive_thread.start()
+
+    @contextmanager
+    def session(self, host, username, password, port=TELNET_PORT):
+        session = self.acquire(host, username, password, port)
+        try:
+            yield session
+        except Exception:
+            # The session state is unknown after an error, so don't hand it out again
+            session.close()
+            raise
+        finally:
+            self.release(session)
+
+    def acquire(self, host, username, password, port=TELNET_PORT):
+        key = (host, port, username)
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise TelnetError("Telnet pool is closed")
+                if self.idle.get(key):
+                    session = self.idle[key].pop()
+                    break
+                if self.in_use.get(key, 0) < self.max_sessions_per_target:
+                    session = None
+                    break
+                self.condition.wait()
+            self.in_use[key] = self.in_use.get(key, 0) + 1
+
+        if session is None:
+            session = TelnetSession(host, username, password, port, **self.session_options)
+            try:
+                session.connect_with_backoff()
+            except Exception:
+                self.release(session)
+                raise
+        return session
+
+    def release(self, session):
+        key = (session.host, session.port, session.username)
+        with self.condition:
+            self.in_use[key] -= 1
+            if session.is_connected() and not self.closed:
+                self.idle.setdefault(key, []).append(session)
+            else:
+                session.close()
+            self.condition.notify_all()
+
+    def keepalive_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait(self.keepalive_interval / 2)
+                if self.closed:
+                    return
+                now = time.monotonic()
+                due = []
+                for key, sessions in self.idle.items():
+                    for session in list(sessions):
+                        if now - session.last_used >= self.keepalive_interval:
+                            sessions.remove(session)
+                            self.in_use[key] = self.in_use.get(key, 0) + 1
+                            due.append(session)
+
+            for session in due:
+                try:
+                    session.send_batch([":"])
+                except (OSError, TelnetError):
+                    session.close()
+                self.release(session)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            for sessions in self.idle.values():
+                for session in sessions:
+                    session.close()
+            self.idle.clear()
+            self.condition.notify_all()
@@ -0,0 +1,121 @@
+import threading
+
+from traffic import ByteRateMeter, TcpSink, UdpSink, local_address_for, send_tcp
+
+
+# Commands run on the target (busybox netcat). Downloads are generated on the
+# target and counted by the host as they arrive; uploads are sent by the host
+# to a sink on the target and timed until the target closes the connection.
+DOWNLOAD_COMMANDS = {
+    'tcp': "dd if=/dev/zero bs=65536 count={blocks} 2>/dev/null | nc {host} {port}",
+    'udp': "dd if=/dev/zero bs=1024 count={blocks} 2>/dev/null | nc -u -w 1 {host} {port}",
+}
+DOWNLOAD_BLOCK_SIZES = {'tcp': 65536, 'udp': 1024}
+TCP_UPLOAD_COMMAND = "nc -l -p {port} > /dev/null 2>&1 & echo $!"
+
+PROTOCOLS = ('tcp', 'udp')
+DIRECTIONS = {'download': ['download'], 'upload': ['upload'], 'both': ['download', 'upload']}
+
+
+def run(context):
+    config = context.config()
+    protocol = config['protocol'].lower()
+    if protocol not in PROTOCOLS:
+        raise ValueError(f"Protocol must be tcp or udp, not {config['protocol']}")
+    directions = DIRECTIONS.get(config['direction'].lower())
+    if directions is None:
+        raise ValueError(f"Direction must be download, upload or both, not {config['direction']}")
+    if protocol == 'udp' and 'upload' in directions:
+        # Without a counting sink on the target an upload rate would only be the host's send rate
+        context.log("UDP is measured in the download direction only, upload skipped")
+        directions = [direction for direction in directions if direction != 'upload']
+
+    total_bytes = config['transfer_size'] << 20
+    interval = config['interval'] / 1000
+    min_throughput = config['min_throughput']
+
+    sheet = context.report_sheet(['test', 'time (s)', 'Mbit/s'], title=f"{context.ecu.name} Throughput")
+    passed = True
+    for number, direction in enumerate(directions):
+        test = f"{protocol.upper()} {direction}"
+        context.log(f"{test}: {config['transfer_size']} MiB")
+        if direction == 'download':
+            meter, extra = download(context, protocol, total_bytes, interval, config)
+        else:
+            meter, extra = upload(context, total_bytes, interval, config)
+
+        rate = meter.megabits_per_second()
+        interval_rates = meter.interval_rates()
+        sheet.append([[test, time_offset, round(interval_rate, 3)] for time_offset, interval_rate in interval_rates])
+        lowest = min((interval_rate for _, interval_rate in interval_rates), default=0)
+        highest = max((interval_rate for _, interval_rate in interval_rates), default=0)
+        context.log(f"{test}: {meter.total / (1 << 20):.1f} MiB in {meter.elapsed():.2f} s, goodput {rate:.1f} Mbit/s "
+                    f"(intervals {lowest:.1f}-{highest:.1f} Mbit/s){extra}, limit {min_throughput:g} Mbit/s")
+        passed = passed and rate >= min_throughput
+        context.progress(100 * (number + 1) / len(directions))
+
+    return passed
+
+
+def download(context, protocol, total_bytes, interval, config):
+    stop_event = threading.Event()
+    meter = ByteRateMeter(interval)
+    sink_class = TcpSink if protocol == 'tcp' else UdpSink
+    # The ECUs of a bench, and benches run by the scheduler, measure at the
+    # same time, so every sink gets a free port of its own
+    sink = sink_class(0, meter, stop_event, timeout=config['transfer_timeout'])
+    sink.start()
+
+    block_size = DOWNLOAD_BLOCK_SIZES[protocol]
+    command = DOWNLOAD_COMMANDS[protocol].format(blocks=-(-total_bytes // block_size), port=sink.port,
+                                                 host=local_address_for(context.ecu.ip))
+    try:
+        with context.telnet_session() as session:
+            status, output = session.run(command, timeout=config['transfer_timeout'])
+        if status != 0:
+            context.log(f"Traffic source on the target exited with status {status}: {output.strip()}")
+    except Exception:
+        stop_event.set()
+        raise
+    finally:
+        # A TCP stream ends by itself, the UDP sink once no datagram came for a while
+        sink.join(config['transfer_timeout'])
+        stop_event.set()
+        sink.join()
+    if sink.error is not None:
+        raise sink.error
+
+    extra = ""
+    if protocol == 'udp':
+        loss = 100.0 * (1 - meter.total / total_bytes)
+        extra = f", {meter.packets} datagrams, {loss:.2f}% lost"
+    return meter, extra
+
+
+def upload(context, total_bytes, interval, config):
+    stop_event = threading.Event()
+    meter = ByteRateMeter(interval)
+    port = ecu_port(context, config['port'])
+    with context.telnet_session() as session:
+        _, output = session.run(TCP_UPLOAD_COMMAND.format(port=port))
+    pid = output.strip().splitlines()[-1] if output.strip() else ''
+
+    try:
+        # Goodput runs until the target has read everything and closed its end
+        meter.mark_end(send_tcp(context.ecu.ip, port, total_bytes, meter, stop_event))
+    finally:
+        # The sink has exited after a complete transfer, not when the host side failed
+        if pid.isdigit():
+            try:
+                with context.telnet_session() as session:
+                    session.run(f"kill {pid} 2>/dev/null")
+            except Exception as e:
+                context.log(f"Could not stop the traffic sink on the target: {e}")
+    return meter, ""
+
+
+def ecu_port(context, port):
+    # One listening port per ECU of the bench, for targets that share an address
+    # (simulated ECUs); the sink on the target is not reachable through port 0
+    names = [ecu.name for ecu in context.bench.ecus]
+    return port + (names.index(context.ecu.name) if context.ecu.name in names else 0)
@@ -0,0 +1,237 @@
+import argparse
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+# Host-side traffic generator and sink for the throughput KPI. The payload and
+# receive buffers are allocated once and passed around as memoryviews, so
+# moving data costs no allocation or copy in Python; recv_into() fills the
+# same buffer on every call.
+RECEIVE_BUFFER_SIZE = 1 << 20
+SEND_BUFFER_SIZE = 1 << 18
+SOCKET_BUFFER_SIZE = 4 << 20
+
+# UDP payload that fits a 1500-byte Ethernet frame
+DATAGRAM_SIZE = 1472
+
+# A UDP sink considers the stream finished after this long without a datagram
+UDP_IDLE_TIMEOUT = 1.0
+
+
+class ByteRateMeter:
+    # Bytes per fixed interval, counted into a preallocated array: add() is one
+    # clock read and one index update, cheap enough to run on every recv
+    def __init__(self, interval=0.1, capacity=4096):
+        self.interval = interval
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.started = None
+        self.first = None
+        self.last = None
+        self.total = 0
+        self.packets = 0
+
+    def add(self, count):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        index = int((now - self.started) / self.interval)
+        if index >= self.counts.size:
+            self.counts = np.concatenate((self.counts, np.zeros(max(index + 1, self.counts.size), dtype=np.int64)))
+        self.counts[index] += count
+        self.total += count
+        self.packets += 1
+        if self.first is None:
+            self.first = now
+        self.last = now
+
+    def mark_end(self, end_time):
+        # For a sender: the data only counts as moved once the peer confirmed it
+        self.last = end_time
+
+    def elapsed(self):
+        # From the first to the last byte moved
+        return self.last - self.first if self.first is not None else 0.0
+
+    def megabits_per_second(self, elapsed=None):
+        elapsed = self.elapsed() if elapsed is None else elapsed
+        return self.total * 8 / elapsed / 1e6 if elapsed > 0 else 0.0
+
+    def interval_rates(self):
+        # [(seconds from start, Mbit/s)] for every interval up to the last byte
+        if self.last is None:
+            return []
+        used = int((self.last - self.started) / self.interval) + 1
+        return [(round(index * self.interval, 3), count * 8 / self.interval / 1e6)
+                for index, count in enumerate(self.counts[:used].tolist())]
+
+
+class TcpSink(threading.Thread):
+    # Accepts one connection and reads it to the end
+    def __init__(self, port, meter, stop_event, bind_address='', timeout=30):
+        super().__init__(name="TcpSink", daemon=True)
+        self.meter = meter
+        self.stop_event = stop_event
+        self.timeout = timeout
+        self.error = None
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+        self.listener.bind((bind_address, port))
+        # Port 0 binds a free port; the one bound is passed to the traffic source
+        self.port = self.listener.getsockname()[1]
+        self.listener.listen(1)
+        self.listener.settimeout(0.5)
+
+    def run(self):
+        buffer = memoryview(bytearray(RECEIVE_BUFFER_SIZE))
+        try:
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    connection, _ = self.listener.accept()
+                    break
+                except socket.timeout:
+                    if self.stop_event.is_set() or time.monotonic() >= deadline:
+                        raise socket.timeout("No connection from the traffic source")
+
+            with connection:
+                connection.settimeout(self.timeout)
+                while not self.stop_event.is_set():
+                    count = connection.recv_into(buffer)
+                    if not count:
+                        break
+                    self.meter.add(count)
+        except OSError as e:
+            self.error = e
+        finally:
+            self.listener.close()
+
+
+class UdpSink(threading.Thread):
+    # Counts datagrams until none arrived for UDP_IDLE_TIMEOUT after the first
+    def __init__(self, port, meter, stop_event, bind_address='', timeout=30):
+        super().__init__(name="UdpSink", daemon=True)
+        self.meter = meter
+        self.stop_event = stop_event
+        self.timeout = timeout
+        self.error = None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+        self.sock.bind((bind_address, port))
+        self.port = self.sock.getsockname()[1]
+
+    def run(self):
+        buffer = memoryview(bytearray(RECEIVE_BUFFER_SIZE))
+        deadline = time.monotonic() + self.timeout
+        try:
+            self.sock.settimeout(0.2)
+            while not self.stop_event.is_set():
+                try:
+                    count = self.sock.recv_into(buffer)
+                except socket.timeout:
+                    if self.meter.last is not None and time.perf_counter() - self.meter.last >= UDP_IDLE_TIMEOUT:
+                        break
+                    if self.meter.last is None and time.monotonic() >= deadline:
+                        break
+                    continue
+                self.meter.add(count)
+        except OSError as e:
+            self.error = e
+        finally:
+            self.sock.close()
+
+
+def send_tcp(host, port, total_bytes, meter, stop_event, connect_timeout=5):
+    # Sends total_bytes, then waits for the peer to close so the time covers
+    # delivery and not just the local socket buffer
+    payload = memoryview(bytearray(SEND_BUFFER_SIZE))
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            connection = socket.create_connection((host, port), timeout=5)
+            break
+        except OSError:
+            # The target's listener may not be up yet
+            if time.monotonic() >= deadline or stop_event.is_set():
+                raise
+            time.sleep(0.1)
+
+    with connection:
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+        connection.settimeout(30)
+        remaining = total_bytes
+        while remaining > 0 and not stop_event.is_set():
+            chunk = payload[:min(remaining, SEND_BUFFER_SIZE)]
+            connection.sendall(chunk)
+            meter.add(len(chunk))
+            remaining -= len(chunk)
+
+        connection.shutdown(socket.SHUT_WR)
+        while connection.recv(1024):
+            pass
+        return time.perf_counter()
+
+
+def send_udp(host, port, total_bytes, meter, stop_event, datagram_size=DATAGRAM_SIZE):
+    payload = memoryview(bytearray(datagram_size))
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+        remaining = total_bytes
+        while remaining > 0 and not stop_event.is_set():
+            count = sock.sendto(payload[:min(remaining, datagram_size)], (host, port))
+            meter.add(count)
+            remaining -= count
+
+
+def local_address_for(host):
+    # Address of the host interface that routes to host; no packet is sent
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.connect((host, 9))
+        return probe.getsockname()[0]
+
+
+def self_test(protocol, total_bytes, port, interval=0.1):
+    # Source and sink both on the loopback interface: the host-side ceiling,
+    # without a target or network in the way
+    stop_event = threading.Event()
+    received = ByteRateMeter(interval)
+    sent = ByteRateMeter(interval)
+    if protocol == 'tcp':
+        sink = TcpSink(port, received, stop_event, '127.0.0.1')
+        sink.start()
+        send_tcp('127.0.0.1', port, total_bytes, sent, stop_event)
+    else:
+        sink = UdpSink(port, received, stop_event, '127.0.0.1')
+        sink.start()
+        send_udp('127.0.0.1', port, total_bytes, sent, stop_event)
+    sink.join()
+    if sink.error is not None:
+        raise sink.error
+    return sent, received
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the host-side throughput ceiling over loopback.")
+    parser.add_argument('--protocol', choices=['tcp', 'udp'], action='append', help="Default: both")
+    parser.add_argument('--size', type=int, default=1024, help="MiB to transfer per test (default 1024)")
+    parser.add_argument('--port', type=int, default=5201)
+    arguments = parser.parse_args(argv)
+
+    for protocol in arguments.protocol or ['tcp', 'udp']:
+        sent, received = self_test(protocol, arguments.size << 20, arguments.port)
+        rates = [rate for _, rate in received.interval_rates()]
+        line = (f"{protocol.upper()}: {received.total / (1 << 20):.0f} MiB in {received.elapsed():.2f} s, "
+                f"{received.megabits_per_second():.0f} Mbit/s (intervals {min(rates, default=0):.0f}"
+                f"-{max(rates, default=0):.0f} Mbit/s)")
+        if protocol == 'udp':
+            line += f", {received.packets} of {sent.packets} datagrams received"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import threading
+import warnings
+
+import numpy as np
+from PyQt5.QtCore import Qt, QTimer, QPointF, QRectF
+from PyQt5.QtGui import QColor, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import (
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLabel,
+    QComboBox,
+    QCheckBox
+)
+
+from cpu_memory_sampler import COLUMNS
+
+
+SERIES = COLUMNS[1:]
+
+SERIES_COLORS = [
+    "#000000", "#0078D7", "#E81123", "#FF8C00", "#60A917", "#8E44AD",
+    "#00B7C3", "#C239B3", "#7A7574", "#B8860B"
+]
+
+
+class MinMaxEnvelope:
+    # Streaming min/max decimation into a fixed number of buckets. When every
+    # bucket is full, neighbours are merged pairwise and each bucket then covers
+    # twice as many samples, so memory and drawing cost stay the same whether
+    # the run lasted a minute or twelve hours.
+    def __init__(self, column_count, bucket_count=1024):
+        self.bucket_count = bucket_count
+        self.times = np.zeros(bucket_count)
+        self.minima = np.full((bucket_count, column_count), np.nan)
+        self.maxima = np.full((bucket_count, column_count), np.nan)
+        self.bucket_size = 1
+        self.filled = 0
+        self.partial = 0
+        self.lock = threading.Lock()
+
+    def add(self, times, values):
+        with self.lock:
+            position = 0
+            while position < len(values):
+                if self.partial == 0 and self.filled == self.bucket_count:
+                    self.merge()
+
+                index = self.filled
+                take = min(self.bucket_size - self.partial, len(values) - position)
+                chunk = values[position:position + take]
+
+                # All-NaN columns (cores the target does not have) stay NaN
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    chunk_min = np.nanmin(chunk, axis=0)
+                    chunk_max = np.nanmax(chunk, axis=0)
+
+                if self.partial == 0:
+                    self.times[index] = times[position]
+                    self.minima[index] = chunk_min
+                    self.maxima[index] = chunk_max
+                else:
+                    self.minima[index] = np.fmin(self.minima[index], chunk_min)
+                    self.maxima[index] = np.fmax(self.maxima[index], chunk_max)
+
+                self.partial += take
+                position += take
+                if self.partial == self.bucket_size:
+                    self.filled += 1
+                    self.partial = 0
+
+    def merge(self):
+        half = self.bucket_count // 2
+        self.times[:half] = self.times[0::2]
+        self.minima[:half] = np.fmin(self.minima[0::2], self.minima[1::2])
+        self.maxima[:half] = np.fmax(self.maxima[0::2], self.maxima[1::2])
+        self.minima[half:] = np.nan
+        self.maxima[half:] = np.nan
+        self.filled = half
+        self.bucket_size *= 2
+
+    def snapshot(self):
+        with self.lock:
+            count = self.filled + (1 if self.partial else 0)
+            return self.times[:count].copy(), self.minima[:count].copy(), self.maxima[:count].copy()
+
+
+class ChartCanvas(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.envelope = None
+        self.thresholds = None
+        self.visible_series = [True] * len(SERIES)
+        self.setMinimumHeight(400)
+        self.setAutoFillBackground(True)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+
+        plot = QRectF(50, 10, self.width() - 60, self.height() - 40)
+        self.draw_axes(painter, plot)
+
+        if self.envelope is None:
+            return
+
+        times, minima, maxima = self.envelope.snapshot()
+        if len(times) == 0:
+            return
+
+        t0 = times[0]
+        span = max(times[-1] - t0, 1.0)
+        x = plot.left() + (times - t0) / span * plot.width()
+
+        def y_of(values):
+            return plot.bottom() - np.clip(values, 0, 100) / 100.0 * plot.height()
+
+        painter.setRenderHint(QPainter.Antialiasing, False)
+
+        for i, name in enumerate(SERIES):
+            if not self.visible_series[i] or np.all(np.isnan(maxima[:, i])):
+                continue
+
+            color = QColor(SERIES_COLORS[i % len(SERIES_COLORS)])
+
+            # Each bucket contributes its min and its max, so short spikes
+            # survive decimation
+            ys = np.empty(2 * len(times))
+            ys[0::2] = y_of(minima[:, i])
+            ys[1::2] = y_of(maxima[:, i])
+            xs = np.repeat(x, 2)
+            valid = ~np.isnan(ys)
+
+            painter.setPen(QPen(color, 1))
+            painter.drawPolyline(QPolygonF([QPointF(px, py) for px, py in zip(xs[valid], ys[valid])]))
+
+            if self.thresholds is not None and not np.isnan(self.thresholds[i]):
+                threshold_y = y_of(self.thresholds[i])
+                painter.setPen(QPen(color, 1, Qt.DashLine))
+                painter.drawLine(QPointF(plot.left(), threshold_y), QPointF(plot.right(), threshold_y))
+
+        painter.setPen(Qt.black)
+        painter.drawText(QRectF(plot.left(), plot.bottom() + 5, plot.width(), 20), Qt.AlignRight,
+                         f"{span / 60:.1f} min, {self.envelope.bucket_size} samples per point")
+
+    def draw_axes(self, painter, plot):
+        painter.setPen(QPen(QColor("#D6D6D6"), 1))
+        for percent in range(0, 101, 20):
+            y = plot.bottom() - percent / 100.0 * plot.height()
+            painter.drawLine(QPointF(plot.left(), y), QPointF(plot.right(), y))
+
+        painter.setPen(Qt.black)
+        for percent in range(0, 101, 20):
+            y = plot.bottom() - percent / 100.0 * plot.height()
+            painter.drawText(QRectF(0, y - 8, 45, 16), Qt.AlignRight | Qt.AlignVCenter, f"{percent}%")
+        painter.drawRect(plot)
+
+
+class UtilizationChart(QWidget):
+    # Live CPU/memory chart for the CPU and Memory Utilization KPI. Samples
+    # arrive from the KPI worker threads through add_samples(); the canvas is
+    # repainted at a fixed frame rate, and only when something changed.
+    def __init__(self, frame_rate=10, parent=None):
+        super().__init__(parent)
+
+        self.envelopes = {}
+        self.dirty = False
+
+        self.create_layout()
+
+        self.frame_timer = QTimer(self)
+        self.frame_timer.timeout.connect(self.redraw)
+        self.frame_timer.start(1000 // frame_rate)
+
+    def create_layout(self):
+        layout = QVBoxLayout()
+
+        ecu_layout = QHBoxLayout()
+        self.ecu_selector = QComboBox()
+        self.ecu_selector.setMinimumWidth(180)
+        self.ecu_selector.currentTextChanged.connect(self.select_ecu)
+        ecu_layout.addWidget(QLabel('ECU'))
+        ecu_layout.addWidget(self.ecu_selector)
+        ecu_layout.addStretch()
+
+        series_layout = QHBoxLayout()
+        self.series_checkboxes = []
+        for i, name in enumerate(SERIES):
+            checkbox = QCheckBox(name)
+            checkbox.setChecked(True)
+            checkbox.setStyleSheet(f"color: {SERIES_COLORS[i % len(SERIES_COLORS)]};")
+            checkbox.stateChanged.connect(self.update_visible_series)
+            series_layout.addWidget(checkbox)
+            self.series_checkboxes.append(checkbox)
+        series_layout.addStretch()
+
+        self.canvas = ChartCanvas()
+
+        layout.addLayout(ecu_layout)
+        layout.addLayout(series_layout)
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+
+    def reset(self, ecu_names, thresholds):
+        # thresholds: one value per entry of SERIES
+        self.envelopes = {name: MinMaxEnvelope(len(SERIES)) for name in ecu_names}
+        self.canvas.thresholds = np.array(thresholds, dtype=float)
+
+        self.ecu_selector.blockSignals(True)
+        self.ecu_selector.clear()
+        self.ecu_selector.addItems(ecu_names)
+        self.ecu_selector.blockSignals(False)
+        self.select_ecu(self.ecu_selector.currentText())
+
+    def reset_from_config(self, ecu_names, config):
+        # config: the CPU and Memory Utilization KpiConfig
+        if config.valid:
+            thresholds = [config['cpu_usage'], config['memory_usage']] + config['cpu_usage_list']
+        else:
+            thresholds = [np.nan] * len(SERIES)
+        self.reset(ecu_names, thresholds)
+
+    def add_samples(self, ecu_name, rows):
+        # Called from worker threads
+        envelope = self.envelopes.get(ecu_name)
+        if envelope is not None:
+            envelope.add(rows[:, 0], rows[:, 1:])
+            self.dirty = True
+
+    def select_ecu(self, ecu_name):
+        self.canvas.envelope = self.envelopes.get(ecu_name)
+        self.canvas.update()
+
+    def update_visible_series(self):
+        self.canvas.visible_series = [checkbox.isChecked() for checkbox in self.series_checkboxes]
+        self.canvas.update()
+
+    def redraw(self):
+        if self.dirty and self.isVisible():
+            self.dirty = False
+            self.canvas.update()